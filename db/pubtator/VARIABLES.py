@@ -2,7 +2,7 @@ import os
 from contextlib import contextmanager
 
 from dotenv import load_dotenv
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
 from sqlalchemy.orm import sessionmaker
 
 load_dotenv()
@@ -11,26 +11,43 @@ generate_uri = (
     lambda user, password, host, port, dbname: f"postgresql+psycopg2://{user}:{password}@{host}:{port}/{dbname}"
 )
 
-_user = os.getenv("DB_USER", None)
-_password = os.getenv("DB_PASSWORD", None)
-_host = os.getenv("DB_HOST", None)
-_port = os.getenv("DB_PORT", None)
-_dbname = os.getenv("DB_NAME", None)
-INPUT_PREFIX_DIR = os.getenv("DB_INPUT_PREFIX_DIR", None)
-if not _user:
-    raise Exception("DB_USER is not set in env file")
-if not _password:
-    raise Exception("DB_PASSWORD is not set in env file")
-if not _host:
-    raise Exception("DB_HOST is not set in env file")
-if not _port:
-    raise Exception("DB_PORT is not set in env file")
-if not _dbname:
-    raise Exception("DB_NAME is not set in env file")
-if not INPUT_PREFIX_DIR:
-    raise Exception("DB_INPUT_PREFIX_DIR is not set in env file")
-
-DATABASE_URI = generate_uri(_user, _password, _host, _port, _dbname)
+# "postgres" (default) or "sqlite". DB_URL, when set, overrides both and can point
+# to any SQLAlchemy URL, e.g. a throwaway local Postgres.
+DB_BACKEND = os.getenv("DB_BACKEND", "postgres")
+DB_SQLITE_PATH = os.getenv("DB_SQLITE_PATH", "pubtator.sqlite")
+# input files are looked up in the working directory when unset
+INPUT_PREFIX_DIR = os.getenv("DB_INPUT_PREFIX_DIR", ".")
+
+
+def get_database_uri() -> str:
+    """
+    Build the database URL from the env file. Missing settings raise here, when a
+    database is first needed, instead of when the module is imported.
+    """
+    if os.getenv("DB_URL"):
+        return os.getenv("DB_URL")
+    if DB_BACKEND == "sqlite":
+        return f"sqlite:///{DB_SQLITE_PATH}"
+    if DB_BACKEND != "postgres":
+        raise Exception("DB_BACKEND must be one of: 'postgres', 'sqlite'")
+    for name in ("DB_USER", "DB_PASSWORD", "DB_HOST", "DB_PORT", "DB_NAME"):
+        if not os.getenv(name):
+            raise Exception(f"{name} is not set in env file")
+    return generate_uri(
+        os.getenv("DB_USER"),
+        os.getenv("DB_PASSWORD"),
+        os.getenv("DB_HOST"),
+        os.getenv("DB_PORT"),
+        os.getenv("DB_NAME"),
+    )
+
+
+def __getattr__(name):
+    # keeps `from ... import DATABASE_URI` working, resolved on first use
+    if name == "DATABASE_URI":
+        return get_database_uri()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
 
 SPECIES = os.path.join(INPUT_PREFIX_DIR, "species2pubtatorcentral")
 VARIANTS = os.path.join(INPUT_PREFIX_DIR, "mutation2pubtatorcentral")
@@ -42,10 +59,28 @@ INFO = os.path.join(INPUT_PREFIX_DIR, "Homo_sapiens.gene_info")
 HUMAN_PM_IDS = os.path.join(INPUT_PREFIX_DIR, "human_pm_ids")
 
 
+_engines = {}
+
+
+def get_engine(db_url=None):
+    """Return one shared engine per database URL (the configured one by default)."""
+    db_url = db_url or get_database_uri()
+    if db_url not in _engines:
+        engine = create_engine(db_url)
+        if engine.dialect.name == "sqlite":
+            # SQLite only enforces foreign keys (and ON DELETE CASCADE) when asked to
+            event.listen(
+                engine,
+                "connect",
+                lambda connection, _: connection.execute("PRAGMA foreign_keys=ON"),
+            )
+        _engines[db_url] = engine
+    return _engines[db_url]
+
+
 @contextmanager
-def get_session(db_url=DATABASE_URI):
-    engine = create_engine(db_url)
-    Session = sessionmaker(bind=engine)
+def get_session(db_url=None):
+    Session = sessionmaker(bind=get_engine(db_url))
     session = Session()
     try:
         yield session
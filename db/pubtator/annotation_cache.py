@@ -0,0 +1,163 @@
+import json
+import os
+import sqlite3
+from collections import OrderedDict
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Cached annotations are only valid for the PubTator release they were read from.
+# Bump PUBTATOR_RELEASE after loading a new release to invalidate the cache.
+PUBTATOR_RELEASE = os.getenv("PUBTATOR_RELEASE", "unversioned")
+# on-disk store, shared between runs; disabled when unset
+ANNOTATION_CACHE_PATH = os.getenv("ANNOTATION_CACHE_PATH", None)
+ANNOTATION_CACHE_SIZE = int(os.getenv("ANNOTATION_CACHE_SIZE", 10_000))
+
+
+class AnnotationCache:
+    """
+    Read-through cache in front of a loader returning the PubTator data of an article.
+
+    Lookups go to an in-process LRU first, then to the optional SQLite store at
+    `path`, and only then to `loader(pmc_id)`. Entries are keyed by
+    (release, pmc_id); opening the store with a new release drops the entries of
+    the old ones. Values are kept as JSON, so every caller gets its own copy.
+    Empty results are not cached: the article may be added to the database or
+    get its PMC ID later in the same release.
+    """
+
+    def __init__(
+        self,
+        loader,
+        release: str = PUBTATOR_RELEASE,
+        max_size: int = ANNOTATION_CACHE_SIZE,
+        path: str = None,
+    ):
+        self.loader = loader
+        self.release = release
+        self.max_size = max_size
+        self.memory = OrderedDict()
+        self.memory_hits = self.disk_hits = self.misses = 0
+        self.connection = None
+        if path:
+            self.connection = sqlite3.connect(path, isolation_level=None)
+            self.connection.execute("PRAGMA journal_mode=WAL")
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS annotations "
+                "(release TEXT, pmc_id TEXT, data TEXT, PRIMARY KEY (release, pmc_id))"
+            )
+            self.connection.execute(
+                "DELETE FROM annotations WHERE release != ?", (release,)
+            )
+
+    def get(self, pmc_id: str) -> dict:
+        key = (self.release, pmc_id)
+        if key in self.memory:
+            self.memory.move_to_end(key)
+            self.memory_hits += 1
+            return json.loads(self.memory[key])
+        data = None
+        if self.connection:
+            row = self.connection.execute(
+                "SELECT data FROM annotations WHERE release = ? AND pmc_id = ?", key
+            ).fetchone()
+            if row:
+                data = row[0]
+                self.disk_hits += 1
+        if data is None:
+            self.misses += 1
+            annotations = self.loader(pmc_id)
+            if not annotations:
+                return annotations
+            data = json.dumps(annotations)
+            if self.connection:
+                self.connection.execute(
+                    "INSERT OR REPLACE INTO annotations VALUES (?, ?, ?)", (*key, data)
+                )
+        self.memory[key] = data
+        if len(self.memory) > self.max_size:
+            self.memory.popitem(last=False)
+        return json.loads(data)
+
+    def invalidate(self, pmc_id: str = None):
+        """Drop one article, or everything when `pmc_id` is None."""
+        if pmc_id is None:
+            self.memory.clear()
+            if self.connection:
+                self.connection.execute("DELETE FROM annotations")
+            return
+        self.memory.pop((self.release, pmc_id), None)
+        if self.connection:
+            self.connection.execute(
+                "DELETE FROM annotations WHERE release = ? AND pmc_id = ?",
+                (self.release, pmc_id),
+            )
+
+    def invalidate_many(self, pmc_ids: list):
+        """Drop the given articles, e.g. the ones a refresh changed."""
+        for pmc_id in pmc_ids:
+            self.memory.pop((self.release, pmc_id), None)
+        if self.connection:
+            self.connection.executemany(
+                "DELETE FROM annotations WHERE release = ? AND pmc_id = ?",
+                ((self.release, pmc_id) for pmc_id in pmc_ids),
+            )
+
+    def set_release(self, release: str):
+        """Switch to a new PubTator release, dropping everything cached for older ones."""
+        self.release = release
+        self.memory.clear()
+        if self.connection:
+            self.connection.execute(
+                "DELETE FROM annotations WHERE release != ?", (release,)
+            )
+
+    @property
+    def lookups(self) -> int:
+        return self.memory_hits + self.disk_hits + self.misses
+
+    @property
+    def hit_rate(self) -> float:
+        return (self.memory_hits + self.disk_hits) / self.lookups if self.lookups else 0.0
+
+    def stats(self) -> str:
+        return (
+            f"Annotation cache ({self.release}): {self.lookups:_} lookups, "
+            f"hit rate {self.hit_rate:.1%} (memory {self.memory_hits:_}, "
+            f"disk {self.disk_hits:_}, misses {self.misses:_})"
+        )
+
+    def close(self):
+        if self.connection:
+            self.connection.close()
+            self.connection = None
+
+
+def load_article_annotations(pmc_id: str) -> dict:
+    # imported here, so incremental_refresh can invalidate entries without them
+    from db.pubtator.db_queries import get_full_related_data
+    from db.pubtator.VARIABLES import get_session
+
+    with get_session() as session:
+        return get_full_related_data(
+            session=session, entity_type="article", field="pmc_id", value=pmc_id
+        )
+
+
+_shared_cache = None
+
+
+def get_annotation_cache() -> AnnotationCache:
+    """Return the process wide cache, configured from the env file on first use."""
+    global _shared_cache
+    if _shared_cache is None:
+        _shared_cache = AnnotationCache(
+            load_article_annotations, path=ANNOTATION_CACHE_PATH
+        )
+    return _shared_cache
+
+
+def get_article_annotations(pmc_id: str) -> dict:
+    """Cached get_full_related_data for one article, by PMC ID."""
+    return get_annotation_cache().get(pmc_id)
@@ -0,0 +1,77 @@
+import sys
+import time
+
+from db.pubtator.db_migrations import add_secondary_indexes, drop_secondary_indexes
+from db.pubtator.synthetic_data import generate_dataset
+from sqlalchemy import create_engine, text
+
+BENCHMARK_QUERIES = {
+    "articles_for_gene": "SELECT article_id FROM article_genes WHERE gene_id = :entity_id",
+    "articles_for_disease": "SELECT article_id FROM article_diseases WHERE disease_id = :entity_id",
+    "articles_for_variant": "SELECT article_id FROM article_variants WHERE variant_id = :entity_id",
+    "next_pending_search": (
+        "SELECT article_id FROM article_processing_stages "
+        "WHERE current_stage = 'pending_search' ORDER BY article_id LIMIT 100"
+    ),
+    "stage_history_for_article": (
+        "SELECT stage, status, updated_at FROM processing_stage_history "
+        "WHERE article_id = :entity_id"
+    ),
+}
+
+
+def explain(connection, query: str, parameters: dict) -> str:
+    if connection.dialect.name == "postgresql":
+        prefix = "EXPLAIN (ANALYZE, BUFFERS) "
+    else:
+        prefix = "EXPLAIN QUERY PLAN "
+    rows = connection.execute(text(prefix + query), parameters).all()
+    return "\n".join(" ".join(str(column) for column in row) for row in rows)
+
+
+def time_query(connection, query: str, parameters: dict, repeat: int = 20) -> float:
+    start_time = time.perf_counter()
+    for _ in range(repeat):
+        connection.execute(text(query), parameters).all()
+    return (time.perf_counter() - start_time) / repeat
+
+
+def run_queries(engine, label: str) -> dict:
+    timings = {}
+    with engine.connect() as connection:
+        for name, query in BENCHMARK_QUERIES.items():
+            parameters = {"entity_id": 1} if ":entity_id" in query else {}
+            timings[name] = time_query(connection, query, parameters)
+            print(f"--- [{label}] {name}: {timings[name] * 1000:.3f} ms")
+            print(explain(connection, query, parameters))
+    return timings
+
+
+def benchmark_secondary_indexes(engine):
+    """
+    Print query plans and timings for the entity -> article and stage queries
+    without and with the secondary indexes from db_migrations.
+    """
+    drop_secondary_indexes(engine)
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as connection:
+        connection.execute(text("ANALYZE"))
+    before = run_queries(engine, "without indexes")
+    add_secondary_indexes(engine)
+    after = run_queries(engine, "with indexes")
+    print(f"\n{'query':<30}{'before (ms)':>14}{'after (ms)':>14}{'speedup':>10}")
+    for name in BENCHMARK_QUERIES:
+        print(
+            f"{name:<30}{before[name] * 1000:>14.3f}{after[name] * 1000:>14.3f}"
+            f"{before[name] / after[name]:>9.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    # python -m db.pubtator.db_benchmark <db_url> [number_of_articles]
+    # run against an empty, throwaway database
+    engine = create_engine(sys.argv[1])
+    if len(sys.argv) > 2:
+        generate_dataset(engine, number_of_articles=int(sys.argv[2]))
+    else:
+        generate_dataset(engine)
+    benchmark_secondary_indexes(engine)
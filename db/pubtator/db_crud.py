@@ -1,18 +1,34 @@
 # crud.py
 
-from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
 from db_models import Article, Gene, Disease, Variant, Base
-from VARIABLES import DATABASE_URI
+from VARIABLES import get_engine
 
 
+_session = None
 
-engine = create_engine(DATABASE_URI)
-Session = sessionmaker(bind=engine)
-session = Session()
+
+def _get_session():
+    # created on first use, so importing this module does not need a database
+    global _session
+    if _session is None:
+        _session = sessionmaker(bind=get_engine())()
+    return _session
+
+
+def __getattr__(name):
+    # keeps `engine`, `Session` and `session` importable as module attributes
+    if name == "engine":
+        return get_engine()
+    if name == "Session":
+        return sessionmaker(bind=get_engine())
+    if name == "session":
+        return _get_session()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 # CREATE
 def create_article_with_metadata(pm_id, gene_symbols=[], disease_names=[], variant_names=[]):
+    session = _get_session()
     # Try to fetch existing article
     article = session.query(Article).filter_by(pm_id=pm_id).first()
     
@@ -52,10 +68,12 @@ def create_article_with_metadata(pm_id, gene_symbols=[], disease_names=[], varia
 
 # READ
 def get_articles_by_gene(gene_symbol):
+    session = _get_session()
     return session.query(Article).join(Article.genes).filter_by(gene_symbol=gene_symbol).all()
 
 # UPDATE
 def update_article_title(article_id, new_title):
+    session = _get_session()
     article = session.get(Article, article_id)
     if article:
         article.title = new_title
@@ -63,6 +81,7 @@ def update_article_title(article_id, new_title):
 
 # DELETE
 def delete_article(article_id):
+    session = _get_session()
     article = session.get(Article, article_id)
     if article:
         session.delete(article)
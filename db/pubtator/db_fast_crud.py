@@ -1,17 +1,34 @@
 # fast_crud.py
 
 from db_models import Article, Disease, Gene, Variant
-from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
-from VARIABLES import DATABASE_URI
+from VARIABLES import get_engine
 
-engine = create_engine(DATABASE_URI)
-Session = sessionmaker(bind=engine)
-session = Session()
+_session = None
+
+
+def _get_session():
+    # created on first use, so importing this module does not need a database
+    global _session
+    if _session is None:
+        _session = sessionmaker(bind=get_engine())()
+    return _session
+
+
+def __getattr__(name):
+    # keeps `engine`, `Session` and `session` importable as module attributes
+    if name == "engine":
+        return get_engine()
+    if name == "Session":
+        return sessionmaker(bind=get_engine())
+    if name == "session":
+        return _get_session()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 
 # TODO: implement preload_lookup_table based on add or delete pm_ids, genes, diseases, variants
 def preload_lookup_tables():
+    session = _get_session()
     print("Preloading lookup tables...")
     genes_lookup = {g.ncbi_id: g for g in session.query(Gene).all()}
     diseases_lookup = {d.original_ontology: d for d in session.query(Disease).all()}
@@ -22,6 +39,7 @@ def preload_lookup_tables():
 
 
 def prepare_articles_for_commit(batch, lookup):
+    session = _get_session()
     genes_lookup, diseases_lookup, variants_lookup, articles_lookup = lookup
 
     new_genes = []
@@ -101,50 +119,172 @@ def chunked_iterator(iterator, batch_size):
         yield batch
 
 
-def populate_articles_with_pmc_ids():
-
-    csv_data = extract_columns_lazy("../PMC-ids.csv", "PMID", "PMCID")
-    batch_size = 100_000
-    for batch_num, batch in enumerate(chunked_iterator(csv_data, batch_size)):
-
-        pmid_to_pmcid = {pmid: pmcid for pmid, pmcid in batch}
-        pmids = list(pmid_to_pmcid.keys())
-        # Load matching articles
-        articles = session.query(Article).filter(Article.pm_id.in_(pmids)).all()
-
-        for article in articles:
-            pmcid = pmid_to_pmcid.get(article.pm_id)
-            if pmcid:
-                article.pmc_id = pmcid
+def report_progress(iterator, every=1_000_000, label="rows"):
+    count = 0
+    for item in iterator:
+        count += 1
+        if count % every == 0:
+            print(f"Read {count:_} {label}...", end="\r")
+        yield item
+
+
+def copy_rows_into_temp_table(cursor, table_name, columns, rows):
+    """
+    Create a temporary table (dropped on commit) and fill it with COPY.
+    Rows are spooled to a temporary file first, so any iterator can be used.
+    Returns the number of copied rows.
+    """
+    import csv
+    import tempfile
+
+    cursor.execute(f"CREATE TEMP TABLE {table_name} ({columns}) ON COMMIT DROP")
+    with tempfile.TemporaryFile("w+", newline="") as buffer:
+        writer = csv.writer(buffer)
+        count = 0
+        for row in rows:
+            writer.writerow(row)
+            count += 1
+        buffer.seek(0)
+        cursor.copy_expert(f"COPY {table_name} FROM STDIN WITH (FORMAT csv)", buffer)
+    cursor.execute(f"ANALYZE {table_name}")
+    return count
+
+
+def update_rows_in_batches(sql, rows, batch_size=10_000):
+    """
+    Fallback for backends without COPY (SQLite): run the UPDATE `sql` as an
+    executemany per batch of parameter dicts, in one transaction.
+    Returns the number of updated rows.
+    """
+    from sqlalchemy import text
 
-        print(f"Batch {batch_num + 1}: Updated {len(articles)} articles.")
-        session.commit()
-    session.close()
+    updated_count = 0
+    with get_engine().begin() as connection:
+        for batch in chunked_iterator(rows, batch_size):
+            updated_count += connection.execute(text(sql), batch).rowcount
+    return updated_count
+
+
+def populate_articles_with_pmc_ids(pmc_ids_csv_path="../PMC-ids.csv"):
+    """
+    Set articles.pmc_id from the PMC-ids.csv mapping with one set-based UPDATE.
+    Only rows whose pmc_id actually changes are written, so re-running is a no-op.
+    A PMID listed more than once gets the last of its PMC IDs on every backend.
+    """
+    import time
+
+    start_time = time.time()
+    csv_data = extract_columns_lazy(pmc_ids_csv_path, "PMID", "PMCID")
+    rows = ((pmid, pmcid) for pmid, pmcid in csv_data if pmid and pmcid)
+    if get_engine().dialect.name != "postgresql":
+        # the executemany applies the pairs in file order, so the last one stays
+        updated_count = update_rows_in_batches(
+            "UPDATE articles SET pmc_id = :pmc_id "
+            "WHERE pm_id = :pm_id AND (pmc_id IS NULL OR pmc_id <> :pmc_id)",
+            (
+                {"pm_id": pm_id, "pmc_id": pmc_id}
+                for pm_id, pmc_id in report_progress(rows, label="PMID-PMCID pairs")
+            ),
+        )
+        print(
+            f"Updated {updated_count:_} articles with PMC IDs in {time.time() - start_time:.2f} seconds."
+        )
+        return
+    connection = get_engine().raw_connection()
+    try:
+        cursor = connection.cursor()
+        loaded = copy_rows_into_temp_table(
+            cursor,
+            "pmid_to_pmcid",
+            "line bigint NOT NULL, pm_id text NOT NULL, pmc_id text NOT NULL",
+            (
+                (line, pm_id, pmc_id)
+                for line, (pm_id, pmc_id) in enumerate(
+                    report_progress(rows, label="PMID-PMCID pairs")
+                )
+            ),
+        )
+        print(f"Loaded {loaded:_} PMID-PMCID pairs in {time.time() - start_time:.2f} seconds.")
+        cursor.execute(
+            """
+            UPDATE articles AS a
+            SET pmc_id = m.pmc_id
+            FROM (
+                SELECT DISTINCT ON (pm_id) pm_id, pmc_id
+                FROM pmid_to_pmcid
+                ORDER BY pm_id, line DESC
+            ) AS m
+            WHERE a.pm_id = m.pm_id AND a.pmc_id IS DISTINCT FROM m.pmc_id
+            """
+        )
+        updated_count = cursor.rowcount
+        connection.commit()
+    except Exception:
+        connection.rollback()
+        raise
+    finally:
+        connection.close()
+    print(
+        f"Updated {updated_count:_} articles with PMC IDs in {time.time() - start_time:.2f} seconds."
+    )
 
 
 def only_update_diseases_with_mondo_ids(mesh_to_mondo_input_dict_path):
+    """
+    Set diseases.mondo_id from a {original_ontology: mondo_id} json with one set-based UPDATE.
+    Only rows whose mondo_id actually changes are written, so re-running is a no-op.
+    """
     import json
+    import time
 
+    start_time = time.time()
     with open(mesh_to_mondo_input_dict_path, "r") as f:
         mesh_to_mondo_input_dict = json.load(f)
 
-    # Query only diseases that have original_ontology present in the dict keys
-    mesh_ids = list(mesh_to_mondo_input_dict.keys())
-    diseases = (
-        session.query(Disease).filter(Disease.original_ontology.in_(mesh_ids)).all()
+    rows = (
+        (mesh_id, mondo_id)
+        for mesh_id, mondo_id in mesh_to_mondo_input_dict.items()
+        if mondo_id
+    )
+    if get_engine().dialect.name != "postgresql":
+        updated_count = update_rows_in_batches(
+            "UPDATE diseases SET mondo_id = :mondo_id WHERE original_ontology = :mesh_id "
+            "AND (mondo_id IS NULL OR mondo_id <> :mondo_id)",
+            ({"mesh_id": mesh_id, "mondo_id": mondo_id} for mesh_id, mondo_id in rows),
+        )
+        print(
+            f"Updated {updated_count:_} diseases with MONDO IDs in {time.time() - start_time:.2f} seconds."
+        )
+        return
+    connection = get_engine().raw_connection()
+    try:
+        cursor = connection.cursor()
+        loaded = copy_rows_into_temp_table(
+            cursor,
+            "mesh_to_mondo",
+            "original_ontology text PRIMARY KEY, mondo_id text NOT NULL",
+            rows,
+        )
+        print(f"Loaded {loaded:_} MESH-MONDO pairs in {time.time() - start_time:.2f} seconds.")
+        cursor.execute(
+            """
+            UPDATE diseases AS d
+            SET mondo_id = m.mondo_id
+            FROM mesh_to_mondo AS m
+            WHERE d.original_ontology = m.original_ontology
+                AND d.mondo_id IS DISTINCT FROM m.mondo_id
+            """
+        )
+        updated_count = cursor.rowcount
+        connection.commit()
+    except Exception:
+        connection.rollback()
+        raise
+    finally:
+        connection.close()
+    print(
+        f"Updated {updated_count:_} diseases with MONDO IDs in {time.time() - start_time:.2f} seconds."
     )
-
-    updated_count = 0
-    for disease in diseases:
-        mondo_id = mesh_to_mondo_input_dict.get(disease.original_ontology)
-        if mondo_id and disease.mondo_id != mondo_id:
-            disease.mondo_id = mondo_id
-            updated_count += 1
-
-    print(diseases[:5])
-    print(f"Updated {updated_count} diseases with MONDO IDs.")
-    session.commit()
-    session.close()
 
 
 def find_duplicate_values_in_input_json(mesh_to_mondo_input_dict_path):
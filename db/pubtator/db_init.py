@@ -1,11 +1,9 @@
-from sqlalchemy import create_engine
 from db_models import Base
-from VARIABLES import DATABASE_URI
+from VARIABLES import get_engine
 
 
-engine = create_engine(DATABASE_URI)
-
 def create_tables(drop_previous=False):
+    engine = get_engine()
     if drop_previous:
         Base.metadata.drop_all(engine)
     Base.metadata.create_all(engine, checkfirst=True)
@@ -0,0 +1,83 @@
+import time
+
+from db.pubtator.db_models import (
+    ArticleProcessingStage,
+    ProcessingStageHistory,
+    article_diseases,
+    article_genes,
+    article_variants,
+)
+from sqlalchemy import text
+
+# Secondary indexes declared in db_models that databases created before they
+# were added are missing. create_tables only creates missing tables, not indexes.
+SECONDARY_INDEXES = [
+    index
+    for table in (
+        article_genes,
+        article_diseases,
+        article_variants,
+        ArticleProcessingStage.__table__,
+        ProcessingStageHistory.__table__,
+    )
+    for index in sorted(table.indexes, key=lambda index: index.name)
+]
+
+
+def is_invalid_index(connection, index_name: str) -> bool:
+    """
+    True for an index left INVALID by an interrupted CREATE INDEX CONCURRENTLY.
+    Such an index is not used by queries, but IF NOT EXISTS still skips it.
+    """
+    return bool(
+        connection.execute(
+            text(
+                "SELECT 1 FROM pg_index JOIN pg_class ON pg_class.oid = pg_index.indexrelid "
+                "WHERE pg_class.relname = :name AND NOT pg_index.indisvalid"
+            ),
+            {"name": index_name},
+        ).first()
+    )
+
+
+def add_secondary_indexes(engine):
+    """
+    Create the secondary indexes that are missing in an existing database.
+    On PostgreSQL the indexes are built CONCURRENTLY, so the tables stay writable,
+    and invalid ones left by an interrupted build are dropped and built again.
+    Safe to run more than once.
+    """
+    postgresql = engine.dialect.name == "postgresql"
+    concurrently = "CONCURRENTLY " if postgresql else ""
+    # CREATE INDEX CONCURRENTLY can not run inside a transaction block
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as connection:
+        for index in SECONDARY_INDEXES:
+            start_time = time.time()
+            if postgresql and is_invalid_index(connection, index.name):
+                print(f"Index {index.name} is invalid, rebuilding it")
+                connection.execute(
+                    text(f"DROP INDEX CONCURRENTLY IF EXISTS {index.name}")
+                )
+            columns = ", ".join(column.name for column in index.columns)
+            connection.execute(
+                text(
+                    f"CREATE INDEX {concurrently}IF NOT EXISTS {index.name} "
+                    f"ON {index.table.name} ({columns})"
+                )
+            )
+            print(f"Index {index.name} ready in {time.time() - start_time:.2f} seconds")
+        connection.execute(text("ANALYZE"))
+
+
+def drop_secondary_indexes(engine):
+    """Drop the indexes created by add_secondary_indexes (used by db_benchmark)."""
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as connection:
+        for index in SECONDARY_INDEXES:
+            connection.execute(text(f"DROP INDEX IF EXISTS {index.name}"))
+
+
+if __name__ == "__main__":
+    # python -m db.pubtator.db_migrations
+    from db.pubtator.VARIABLES import get_engine
+
+    add_secondary_indexes(get_engine())
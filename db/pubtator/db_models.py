@@ -8,6 +8,7 @@ from sqlalchemy import (
     DateTime,
     Enum,
     ForeignKey,
+    Index,
     Integer,
     String,
     Table,
@@ -35,6 +36,7 @@ article_genes = Table(
     Column(
         "gene_id", Integer, ForeignKey("genes.id", ondelete="CASCADE"), primary_key=True
     ),
+    Index("ix_article_genes_gene_id_article_id", "gene_id", "article_id"),
 )
 
 article_diseases = Table(
@@ -52,6 +54,7 @@ article_diseases = Table(
         ForeignKey("diseases.id", ondelete="CASCADE"),
         primary_key=True,
     ),
+    Index("ix_article_diseases_disease_id_article_id", "disease_id", "article_id"),
 )
 
 article_variants = Table(
@@ -69,6 +72,7 @@ article_variants = Table(
         ForeignKey("variants.id", ondelete="CASCADE"),
         primary_key=True,
     ),
+    Index("ix_article_variants_variant_id_article_id", "variant_id", "article_id"),
 )
 
 
@@ -253,6 +257,14 @@ class SubmissionStatus(Base):
 
 class ArticleProcessingStage(Base):
     __tablename__ = "article_processing_stages"
+    __table_args__ = (
+        # "next N articles pending stage X" queries
+        Index(
+            "ix_article_processing_stages_current_stage_article_id",
+            "current_stage",
+            "article_id",
+        ),
+    )
 
     article_id = Column(
         Integer, ForeignKey("articles.id", ondelete="CASCADE"), primary_key=True
@@ -272,7 +284,9 @@ class ProcessingStageHistory(Base):
     __tablename__ = "processing_stage_history"
 
     id = Column(Integer, primary_key=True, autoincrement=True)
-    article_id = Column(Integer, ForeignKey("articles.id", ondelete="CASCADE"))
+    article_id = Column(
+        Integer, ForeignKey("articles.id", ondelete="CASCADE"), index=True
+    )
     stage = Column(Enum(ProcessingStageEnum), nullable=False)
     status = Column(String, nullable=False)  # 'success', 'error', 'skipped'
     error_message = Column(Text, nullable=True)
@@ -1,7 +1,8 @@
-from typing import List, Optional
+from typing import Iterator, List, Optional
 
-from db.pubtator.db_models import Article, Disease, Gene, Variant
+from db.pubtator.db_models import Article, Disease, Gene, Variant, article_genes
 from db.pubtator.VARIABLES import get_session
+from sqlalchemy import exists, select
 from sqlalchemy.orm import Session
 
 
@@ -82,6 +83,32 @@ def get_disease_by_unique_field(
     return session.query(Disease).filter_by(**filter_condition).first()
 
 
+def stream_articles_for_gene_symbols(
+    session: Session, gene_symbols: List[str], yield_per: int = 10_000
+) -> Iterator[tuple]:
+    """
+    Stream the distinct articles mentioning any of the given HGNC symbols.
+
+    Runs a single semi-join query (EXISTS over article_genes and genes), so every
+    article comes out once without a DISTINCT sort over the whole result, and reads
+    it through a server-side cursor `yield_per` rows at a time.
+    Yields:
+        tuple: (id, pm_id, pmc_id)
+    """
+    query = (
+        select(Article.id, Article.pm_id, Article.pmc_id)
+        .where(
+            exists()
+            .where(article_genes.c.article_id == Article.id)
+            .where(article_genes.c.gene_id == Gene.id)
+            .where(Gene.hgnc_symbol.in_(list(set(gene_symbols))))
+        )
+        .execution_options(yield_per=yield_per)
+    )
+    for row in session.execute(query):
+        yield tuple(row)
+
+
 def get_full_related_data(session: Session, entity_type: str, field: str, value: str):
     """
     Fetch all articles related to a gene/variant/disease, and return their full related content.
@@ -0,0 +1,110 @@
+import statistics
+import sys
+import time
+
+from db.pubtator import db_queries
+from db.pubtator.db_models import Article, Gene, Variant
+from db.pubtator.synthetic_data import generate_dataset
+from db.pubtator.VARIABLES import get_engine, get_session
+from sqlalchemy import func, select
+
+
+def benchmark_cases(session) -> dict:
+    """
+    db_queries calls to time, on a hub and on a long tail entity where it matters.
+    In synthetic_data low ids are the hubs and high ids the tail.
+    """
+    number_of_articles = session.execute(select(func.max(Article.id))).scalar()
+    number_of_genes = session.execute(select(func.max(Gene.id))).scalar()
+    number_of_variants = session.execute(select(func.max(Variant.id))).scalar()
+    article_id = number_of_articles // 2
+    mid_gene_id = min(50, number_of_genes)
+    top_genes = [f"GENE{i}" for i in range(1, min(100, number_of_genes) + 1)]
+    return {
+        "get_article_by_unique_field(pmc_id)": lambda: db_queries.get_article_by_unique_field(
+            session, "pmc_id", f"PMC{article_id}"
+        ),
+        "get_gene_by_unique_field(hgnc_symbol)": lambda: db_queries.get_gene_by_unique_field(
+            session, "hgnc_symbol", "GENE1"
+        ),
+        "get_gene_ids_for_article": lambda: db_queries.get_gene_ids_for_article(
+            session, article_id
+        ),
+        "get_article_ids_for_gene(hub)": lambda: db_queries.get_article_ids_for_gene(
+            session, 1
+        ),
+        "get_article_ids_for_gene(tail)": lambda: db_queries.get_article_ids_for_gene(
+            session, number_of_genes
+        ),
+        "get_article_ids_for_variant(tail)": lambda: db_queries.get_article_ids_for_variant(
+            session, number_of_variants
+        ),
+        "get_full_related_data(article)": lambda: db_queries.get_full_related_data(
+            session, "article", "pmc_id", f"PMC{article_id}"
+        ),
+        "get_full_related_data(gene, mid)": lambda: db_queries.get_full_related_data(
+            session, "gene", "id", str(mid_gene_id)
+        ),
+        "stream_articles_for_gene_symbols(top 100)": lambda: list(
+            db_queries.stream_articles_for_gene_symbols(session, top_genes)
+        ),
+    }
+
+
+def _result_size(result) -> int:
+    if isinstance(result, dict):
+        return len(result.get("articles", result))
+    if isinstance(result, list):
+        return len(result)
+    return int(result is not None)
+
+
+def run_benchmark(session, repeat: int = 5) -> dict:
+    """
+    Time every case `repeat` times. The session is emptied before each run so
+    objects loaded by a previous run do not hide queries.
+    Returns:
+        dict: {case: (mean seconds, min seconds, max seconds, result size)}
+    """
+    results = {}
+    for name, call in benchmark_cases(session).items():
+        timings = []
+        for _ in range(repeat):
+            session.expunge_all()
+            start_time = time.perf_counter()
+            result = call()
+            timings.append(time.perf_counter() - start_time)
+        results[name] = (
+            statistics.mean(timings),
+            min(timings),
+            max(timings),
+            _result_size(result),
+        )
+        print(f"{name:<45}{results[name][0] * 1000:>10.2f} ms")
+    return results
+
+
+def print_results(results: dict):
+    print(f"\n{'query':<45}{'mean (ms)':>11}{'min (ms)':>11}{'max (ms)':>11}{'rows':>10}")
+    for name, (mean, minimum, maximum, size) in results.items():
+        print(
+            f"{name:<45}{mean * 1000:>11.2f}{minimum * 1000:>11.2f}"
+            f"{maximum * 1000:>11.2f}{size:>10_}"
+        )
+
+
+if __name__ == "__main__":
+    # python -m db.pubtator.db_queries_benchmark [number_of_articles]
+    # runs against the database configured in VARIABLES, e.g. DB_BACKEND=sqlite,
+    # and fills it with synthetic data first when it has no articles
+    engine = get_engine()
+    with get_session() as session:
+        if not session.bind.dialect.has_table(session.connection(), "articles") or not (
+            session.execute(select(func.count()).select_from(Article)).scalar()
+        ):
+            session.rollback()
+            if len(sys.argv) > 1:
+                generate_dataset(engine, number_of_articles=int(sys.argv[1]))
+            else:
+                generate_dataset(engine)
+        print_results(run_benchmark(session))
@@ -0,0 +1,213 @@
+import json
+import os
+import sys
+import time
+
+from db.pubtator.db_models import (
+    Article,
+    Disease,
+    Gene,
+    Variant,
+    article_diseases,
+    article_genes,
+    article_variants,
+)
+from db.pubtator.VARIABLES import get_session
+from sqlalchemy import case, func, select
+
+ROWS_PER_SHARD = 1_000_000
+YIELD_PER = 10_000
+PARQUET_ROW_GROUP_SIZE = 50_000
+
+
+def _json_functions(dialect: str):
+    if dialect == "postgresql":
+        return func.json_agg, func.json_build_array
+    # SQLite JSON1
+    return func.json_group_array, func.json_array
+
+
+def _aggregate(session, model, link_table, link_column, value):
+    """Correlated subquery returning the search_format values of one article as a JSON array."""
+    json_agg, _ = _json_functions(session.bind.dialect.name)
+    return (
+        select(json_agg(value))
+        .select_from(link_table.join(model, link_table.c[link_column] == model.id))
+        .where(link_table.c.article_id == Article.id)
+        .scalar_subquery()
+    )
+
+
+def articles_export_query(session, only_with_pmc_id: bool = True):
+    """
+    One row per article with its genes, diseases and variants aggregated in SQL,
+    in the format of get_full_related_data(entity_type="article").
+    """
+    _, json_array = _json_functions(session.bind.dialect.name)
+    genes = _aggregate(
+        session, Gene, article_genes, "gene_id", json_array(Gene.ncbi_id, Gene.hgnc_symbol)
+    )
+    diseases = _aggregate(
+        session,
+        Disease,
+        article_diseases,
+        "disease_id",
+        case(
+            (Disease.mondo_id.is_(None), json_array(Disease.original_ontology)),
+            else_=json_array(Disease.original_ontology, Disease.mondo_id),
+        ),
+    )
+    variants = _aggregate(
+        session,
+        Variant,
+        article_variants,
+        "variant_id",
+        json_array(Variant.identified, Variant.exact_match),
+    )
+    query = select(
+        Article.pm_id,
+        Article.pmc_id,
+        genes.label("gene"),
+        diseases.label("disease"),
+        variants.label("variant"),
+    ).order_by(Article.id)
+    if only_with_pmc_id:
+        query = query.where(Article.pmc_id.is_not(None))
+    return query
+
+
+def stream_article_records(session, only_with_pmc_id: bool = True, yield_per: int = YIELD_PER):
+    """Yield export records one at a time, read through a server-side cursor."""
+    query = articles_export_query(session, only_with_pmc_id).execution_options(
+        yield_per=yield_per
+    )
+    for pm_id, pmc_id, genes, diseases, variants in session.execute(query):
+        yield {
+            "pm_id": pm_id,
+            "pmc_id": pmc_id,
+            # no links aggregate to NULL; SQLite returns the arrays as text
+            "gene": _as_list(genes),
+            "disease": _as_list(diseases),
+            "variant": _as_list(variants),
+        }
+
+
+def _as_list(value) -> list:
+    if value is None:
+        return []
+    if isinstance(value, str):
+        value = json.loads(value)
+    # SQLite JSON1 nests json_array results as strings
+    return [json.loads(item) if isinstance(item, str) else item for item in value]
+
+
+class JsonlShardWriter:
+    extension = "jsonl"
+
+    def __init__(self, path: str):
+        self.file = open(path, "w")
+
+    def write(self, record: dict):
+        self.file.write(json.dumps(record) + "\n")
+
+    def close(self):
+        self.file.close()
+
+
+class ParquetShardWriter:
+    extension = "parquet"
+
+    def __init__(self, path: str):
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise ImportError("pyarrow is required for the parquet export format")
+        pairs = pa.list_(pa.list_(pa.string()))
+        self.schema = pa.schema(
+            [
+                ("pm_id", pa.string()),
+                ("pmc_id", pa.string()),
+                ("gene", pairs),
+                ("disease", pairs),
+                ("variant", pairs),
+            ]
+        )
+        self.table_from_records = pa.Table.from_pylist
+        self.writer = pq.ParquetWriter(path, self.schema)
+        self.buffer = []
+
+    def write(self, record: dict):
+        self.buffer.append(record)
+        if len(self.buffer) >= PARQUET_ROW_GROUP_SIZE:
+            self._flush()
+
+    def _flush(self):
+        if self.buffer:
+            self.writer.write_table(self.table_from_records(self.buffer, schema=self.schema))
+            self.buffer = []
+
+    def close(self):
+        self._flush()
+        self.writer.close()
+
+
+SHARD_WRITERS = {"jsonl": JsonlShardWriter, "parquet": ParquetShardWriter}
+
+
+def export_articles(
+    output_dir: str,
+    output_format: str = "jsonl",
+    rows_per_shard: int = ROWS_PER_SHARD,
+    only_with_pmc_id: bool = True,
+) -> int:
+    """
+    Export all articles with their annotations to sharded files in `output_dir`
+    (articles-00000.jsonl, articles-00001.jsonl, ...). Memory use does not grow
+    with the number of articles.
+    Returns:
+        int: number of exported articles
+    """
+    if output_format not in SHARD_WRITERS:
+        raise ValueError(f"output_format must be one of: {', '.join(SHARD_WRITERS)}")
+    writer_class = SHARD_WRITERS[output_format]
+    os.makedirs(output_dir, exist_ok=True)
+    start_time = time.time()
+    number_of_articles = 0
+    writer = None
+    try:
+        with get_session() as session:
+            for record in stream_article_records(session, only_with_pmc_id):
+                if number_of_articles % rows_per_shard == 0:
+                    if writer:
+                        writer.close()
+                        writer = None
+                    shard = number_of_articles // rows_per_shard
+                    writer = writer_class(
+                        os.path.join(output_dir, f"articles-{shard:05d}.{writer_class.extension}")
+                    )
+                writer.write(record)
+                number_of_articles += 1
+                if number_of_articles % 100_000 == 0:
+                    print(
+                        f"Exported {number_of_articles:_} articles "
+                        f"({number_of_articles / (time.time() - start_time):_.0f}/s)"
+                    )
+    finally:
+        # also on failure, so the last shard is not left open
+        if writer:
+            writer.close()
+    print(
+        f"Exported {number_of_articles:_} articles to {output_dir} "
+        f"in {time.time() - start_time:.2f} seconds"
+    )
+    return number_of_articles
+
+
+if __name__ == "__main__":
+    # python -m db.pubtator.export_articles <output_dir> [jsonl|parquet] [rows_per_shard]
+    export_articles(
+        sys.argv[1],
+        output_format=sys.argv[2] if len(sys.argv) > 2 else "jsonl",
+        rows_per_shard=int(sys.argv[3]) if len(sys.argv) > 3 else ROWS_PER_SHARD,
+    )
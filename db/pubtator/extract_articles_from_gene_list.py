@@ -1,30 +1,49 @@
 import csv
+import sys
+import time
 
-from db.pubtator.db_models import Article, Gene
-from db.pubtator.db_queries import get_gene_by_unique_field
+from db.pubtator.db_queries import stream_articles_for_gene_symbols
 from db.pubtator.VARIABLES import get_session
-from sqlalchemy.orm import Session
 
-with open("/home/novak/Clingen/repo_to_send/test_outputs/clingen_gene_list", "r") as f:
-    gene_symbols = [line.strip() for line in f if line.strip()]
+GENE_LIST_PATH = "/home/novak/Clingen/repo_to_send/test_outputs/clingen_gene_list"
+OUTPUT_PATH = (
+    "/home/novak/Clingen/repo_to_send/test_outputs/articles_by_clingen_gene_list.csv"
+)
 
-with get_session() as session:
-    collected_articles = set()
 
-    len_gene_symbols = len(gene_symbols)
-    for i, symbol in enumerate(gene_symbols):
-        print(f"Processing gene {i + 1}/{len_gene_symbols}: {symbol}", end="\r")
-        gene = get_gene_by_unique_field(session, "hgnc_symbol", symbol)
-        if gene:
-            for article in gene.articles:
-                collected_articles.add(article)
+def extract_articles_from_gene_list(
+    gene_list_path: str = GENE_LIST_PATH, output_path: str = OUTPUT_PATH
+) -> int:
+    """
+    Write the articles mentioning any gene of a gene list to a CSV file.
+    Rows are written as they are streamed from the database.
+    Args:
+        gene_list_path (str): file with one HGNC symbol per line
+        output_path (str): CSV file with the columns id, pm_id, pmc_id
+    Returns:
+        int: number of articles written
+    """
+    with open(gene_list_path, "r") as f:
+        gene_symbols = [line.strip() for line in f if line.strip()]
+
+    start_time = time.time()
+    number_of_articles = 0
+    with get_session() as session, open(output_path, "w", newline="") as csvfile:
+        writer = csv.writer(csvfile)
+        writer.writerow(["id", "pm_id", "pmc_id"])  # zaglavlja
+        for row in stream_articles_for_gene_symbols(session, gene_symbols):
+            writer.writerow(row)
+            number_of_articles += 1
+            if number_of_articles % 100_000 == 0:
+                print(f"Written {number_of_articles:_} articles", end="\r")
+
+    print(
+        f"Written {number_of_articles:_} articles for {len(gene_symbols):_} genes "
+        f"in {time.time() - start_time:.2f} seconds"
+    )
+    return number_of_articles
 
-output_file = (
-    "/home/novak/Clingen/repo_to_send/test_outputs/articles_by_clingen_gene_list.csv"
-)
-with open(output_file, "w", newline="") as csvfile:
-    writer = csv.writer(csvfile)
-    writer.writerow(["id", "pm_id", "pmc_id"])  # zaglavlja
 
-    for article in collected_articles:
-        writer.writerow([article.id, article.pm_id, article.pmc_id])
+if __name__ == "__main__":
+    # python -m db.pubtator.extract_articles_from_gene_list [gene_list_path] [output_path]
+    extract_articles_from_gene_list(*sys.argv[1:3])
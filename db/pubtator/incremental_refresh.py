@@ -0,0 +1,370 @@
+import hashlib
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+from collections import defaultdict
+
+import process_input_files_into_db_entries as pifidb
+import VARIABLES as var
+from annotation_cache import get_annotation_cache
+from db_models import (
+    Article,
+    Disease,
+    Gene,
+    Variant,
+    article_diseases,
+    article_genes,
+    article_variants,
+)
+from pm_id_index import get_pm_id_index
+from sqlalchemy import delete, insert, select, tuple_
+
+NUMBER_OF_BUCKETS = 256
+IN_CLAUSE_SIZE = 10_000
+KINDS = ("gene", "disease", "variant")
+
+INPUT_FILES = {
+    "gene": var.GENES,
+    "disease": var.DISEASE,
+    "variant": var.VARIANTS,
+}
+
+# kind -> (entity model, unique key column, extra column, link table, link column)
+ASSOCIATIONS = {
+    "gene": (Gene, "ncbi_id", "hgnc_symbol", article_genes, "gene_id"),
+    "disease": (Disease, "original_ontology", None, article_diseases, "disease_id"),
+    "variant": (Variant, "exact_match", "identified", article_variants, "variant_id"),
+}
+
+
+def _row_to_association(kind: str, row: dict) -> tuple | None:
+    """
+    Convert a parsed dump row into (key, extra), where key is the unique field
+    of the entity and extra the additional column stored with it.
+    """
+    if kind == "gene":
+        return row["ncbi_id"], row["hgnc_symbol"]
+    if kind == "disease":
+        return row["original_ontology"], ""
+    identified, exact_match = row["variant_data"]
+    if not identified:
+        # same rule as db_fast_crud.prepare_articles_for_commit
+        return None
+    return exact_match, identified
+
+
+def _iter_associations(kind: str, path: str):
+    pm_ids = get_pm_id_index()
+    gene_symbols = pifidb.get_human_gene_symbols() if kind == "gene" else None
+    with open(path, "r") as file:
+        for line in file:
+            if kind == "gene":
+                row = pifidb.parse_gene_line(line, pm_ids, gene_symbols)
+            elif kind == "disease":
+                row = pifidb.parse_disease_line(line, pm_ids)
+            else:
+                row = pifidb.parse_variant_line(line, pm_ids)
+            if row and (association := _row_to_association(kind, row)):
+                yield row["pm_id"], association
+
+
+def partition_dumps(
+    work_dir: str, input_files: dict = None, number_of_buckets: int = NUMBER_OF_BUCKETS
+):
+    """
+    Split the filtered gene, disease and variant dumps into buckets by PMID,
+    so every PMID of a release ends up in the same bucket and each bucket fits in memory.
+    Files are written as work_dir/{kind}/{bucket:03d}.tsv with lines "pm_id\tkey\textra".
+    """
+    input_files = input_files or INPUT_FILES
+    for kind in KINDS:
+        start_time = time.time()
+        kind_dir = os.path.join(work_dir, kind)
+        os.makedirs(kind_dir, exist_ok=True)
+        buckets = [
+            open(os.path.join(kind_dir, f"{bucket:03d}.tsv"), "w")
+            for bucket in range(number_of_buckets)
+        ]
+        try:
+            count = 0
+            for pm_id, (key, extra) in _iter_associations(kind, input_files[kind]):
+                buckets[int(pm_id) % number_of_buckets].write(f"{pm_id}\t{key}\t{extra}\n")
+                count += 1
+        finally:
+            for bucket in buckets:
+                bucket.close()
+        print(f"Partitioned {count:_} {kind} associations in {time.time() - start_time:.2f} seconds")
+
+
+def load_bucket(work_dir: str, bucket: int) -> dict:
+    """
+    Returns:
+        dict: pm_id -> kind -> {key: extra}
+    """
+    associations = defaultdict(lambda: {kind: {} for kind in KINDS})
+    for kind in KINDS:
+        with open(os.path.join(work_dir, kind, f"{bucket:03d}.tsv"), "r") as file:
+            for line in file:
+                pm_id, key, extra = line.rstrip("\n").split("\t")
+                associations[pm_id][kind][key] = extra
+    return associations
+
+
+def fingerprint_associations(associations: dict) -> dict:
+    """
+    Hash the sorted gene, disease and variant sets of every PMID.
+    Returns:
+        dict: pm_id -> (gene hash, disease hash, variant hash)
+    """
+    fingerprint = {}
+    for pm_id, kinds in associations.items():
+        fingerprint[pm_id] = tuple(
+            hashlib.sha1(
+                "\n".join(f"{k}\t{v}" for k, v in sorted(kinds[kind].items())).encode()
+            ).hexdigest()
+            if kinds[kind]
+            else ""
+            for kind in KINDS
+        )
+    return fingerprint
+
+
+def save_fingerprint(fingerprint: dict, path: str):
+    with open(path, "w") as file:
+        for pm_id in sorted(fingerprint, key=int):
+            file.write("\t".join((pm_id, *fingerprint[pm_id])) + "\n")
+
+
+def load_fingerprint(path: str) -> dict:
+    fingerprint = {}
+    if not os.path.exists(path):
+        return fingerprint
+    with open(path, "r") as file:
+        for line in file:
+            pm_id, *hashes = line.rstrip("\n").split("\t")
+            fingerprint[pm_id] = tuple(hashes)
+    return fingerprint
+
+
+def _chunks(items: list, size: int = IN_CLAUSE_SIZE):
+    for i in range(0, len(items), size):
+        yield items[i : i + size]
+
+
+def _get_or_create_article_ids(session, pm_ids: list) -> dict:
+    article_ids = {}
+    for chunk in _chunks(pm_ids):
+        article_ids.update(
+            session.execute(
+                select(Article.pm_id, Article.id).where(Article.pm_id.in_(chunk))
+            ).all()
+        )
+    if missing := [pm_id for pm_id in pm_ids if pm_id not in article_ids]:
+        session.execute(insert(Article), [{"pm_id": pm_id} for pm_id in missing])
+        for chunk in _chunks(missing):
+            article_ids.update(
+                session.execute(
+                    select(Article.pm_id, Article.id).where(Article.pm_id.in_(chunk))
+                ).all()
+            )
+    return article_ids
+
+
+def _get_or_create_entity_ids(session, kind: str, entities: dict) -> dict:
+    model, key_column, extra_column, _, _ = ASSOCIATIONS[kind]
+    key = getattr(model, key_column)
+    keys = list(entities)
+    entity_ids = {}
+    for chunk in _chunks(keys):
+        entity_ids.update(session.execute(select(key, model.id).where(key.in_(chunk))).all())
+    if missing := [k for k in keys if k not in entity_ids]:
+        values = [
+            {key_column: k, **({extra_column: entities[k]} if extra_column else {})}
+            for k in missing
+        ]
+        session.execute(insert(model), values)
+        for chunk in _chunks(missing):
+            entity_ids.update(
+                session.execute(select(key, model.id).where(key.in_(chunk))).all()
+            )
+    return entity_ids
+
+
+def apply_changes(session, kind: str, desired: dict) -> tuple[int, int]:
+    """
+    Make the associations of `kind` in the database match `desired` for the given PMIDs.
+    Args:
+        desired (dict): pm_id -> {key: extra} for every changed PMID, empty when
+            the PMID lost all associations of this kind.
+    Returns:
+        tuple: (number of inserted associations, number of deleted associations)
+    """
+    model, key_column, _, link_table, link_column = ASSOCIATIONS[kind]
+    key = getattr(model, key_column)
+    link_article_id = link_table.c.article_id
+    link_entity_id = link_table.c[link_column]
+    pm_ids = list(desired)
+
+    current = set()
+    for chunk in _chunks(pm_ids):
+        current.update(
+            session.execute(
+                select(Article.pm_id, key)
+                .join(link_table, link_article_id == Article.id)
+                .join(model, model.id == link_entity_id)
+                .where(Article.pm_id.in_(chunk))
+            ).all()
+        )
+    wanted = {(pm_id, k) for pm_id, entities in desired.items() for k in entities}
+    to_insert = wanted - current
+    to_delete = current - wanted
+    if not to_insert and not to_delete:
+        return 0, 0
+
+    article_ids = _get_or_create_article_ids(
+        session, sorted({pm_id for pm_id, _ in to_insert | to_delete})
+    )
+    entity_ids = _get_or_create_entity_ids(
+        session,
+        kind,
+        {k: "" for _, k in to_delete}
+        | {k: desired[pm_id][k] for pm_id, k in to_insert},
+    )
+    delete_pairs = [(article_ids[pm_id], entity_ids[k]) for pm_id, k in to_delete]
+    for chunk in _chunks(delete_pairs):
+        session.execute(
+            delete(link_table).where(tuple_(link_article_id, link_entity_id).in_(chunk))
+        )
+    if to_insert:
+        session.execute(
+            insert(link_table),
+            [
+                {"article_id": article_ids[pm_id], link_column: entity_ids[k]}
+                for pm_id, k in to_insert
+            ],
+        )
+    return len(to_insert), len(delete_pairs)
+
+
+def _get_pmc_ids(session, pm_ids: list) -> list:
+    pmc_ids = []
+    for chunk in _chunks(pm_ids):
+        pmc_ids.extend(
+            pmc_id
+            for (pmc_id,) in session.execute(
+                select(Article.pmc_id).where(
+                    Article.pm_id.in_(chunk), Article.pmc_id.is_not(None)
+                )
+            )
+        )
+    return pmc_ids
+
+
+def build_fingerprint(
+    fingerprint_dir: str,
+    input_files: dict = None,
+    number_of_buckets: int = NUMBER_OF_BUCKETS,
+):
+    """
+    Fingerprint a release that is already loaded (e.g. after a full reload),
+    without touching the database. Used as the baseline for the next refresh.
+    """
+    work_dir = tempfile.mkdtemp(dir=os.path.dirname(os.path.abspath(fingerprint_dir)))
+    new_fingerprint_dir = work_dir + "_fingerprint"
+    try:
+        partition_dumps(work_dir, input_files, number_of_buckets)
+        os.makedirs(new_fingerprint_dir)
+        for bucket in range(number_of_buckets):
+            save_fingerprint(
+                fingerprint_associations(load_bucket(work_dir, bucket)),
+                os.path.join(new_fingerprint_dir, f"{bucket:03d}.tsv"),
+            )
+        with open(os.path.join(new_fingerprint_dir, "meta.json"), "w") as file:
+            json.dump({"number_of_buckets": number_of_buckets}, file)
+        shutil.rmtree(fingerprint_dir, ignore_errors=True)
+        os.rename(new_fingerprint_dir, fingerprint_dir)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+        shutil.rmtree(new_fingerprint_dir, ignore_errors=True)
+
+
+def refresh(fingerprint_dir: str, changed_pmc_ids_path: str, input_files: dict = None):
+    """
+    Apply a new PubTator release to the database by changing only the associations
+    of PMIDs whose gene, disease or variant set differs from the previous release.
+
+    The previous release is represented by its fingerprint in `fingerprint_dir`
+    (see build_fingerprint). Dumps are partitioned into PMID buckets on disk and
+    processed one bucket at a time, so memory stays bounded on full-size files.
+    Each bucket is applied in its own transaction. The PMC ids of changed articles
+    are written to `changed_pmc_ids_path`, one per line, so later stages can
+    reprocess only those articles, and dropped from the annotation cache. The
+    fingerprint is replaced once all buckets are applied.
+    """
+    with open(os.path.join(fingerprint_dir, "meta.json"), "r") as file:
+        number_of_buckets = json.load(file)["number_of_buckets"]
+
+    start_time = time.time()
+    work_dir = tempfile.mkdtemp(dir=os.path.dirname(os.path.abspath(fingerprint_dir)))
+    new_fingerprint_dir = work_dir + "_fingerprint"
+    totals = {"changed": 0, "inserted": 0, "deleted": 0, "pmc_ids": 0}
+    try:
+        partition_dumps(work_dir, input_files, number_of_buckets)
+        os.makedirs(new_fingerprint_dir)
+        with var.get_session() as session, open(changed_pmc_ids_path, "w") as changed_file:
+            for bucket in range(number_of_buckets):
+                bucket_file = f"{bucket:03d}.tsv"
+                associations = load_bucket(work_dir, bucket)
+                new_fingerprint = fingerprint_associations(associations)
+                old_fingerprint = load_fingerprint(
+                    os.path.join(fingerprint_dir, bucket_file)
+                )
+                empty = ("",) * len(KINDS)
+                changed_pm_ids = set()
+                for i, kind in enumerate(KINDS):
+                    desired = {
+                        pm_id: associations[pm_id][kind] if pm_id in associations else {}
+                        for pm_id in new_fingerprint.keys() | old_fingerprint.keys()
+                        if new_fingerprint.get(pm_id, empty)[i]
+                        != old_fingerprint.get(pm_id, empty)[i]
+                    }
+                    if desired:
+                        inserted, deleted = apply_changes(session, kind, desired)
+                        totals["inserted"] += inserted
+                        totals["deleted"] += deleted
+                        changed_pm_ids.update(desired)
+                pmc_ids = _get_pmc_ids(session, sorted(changed_pm_ids))
+                session.commit()
+                get_annotation_cache().invalidate_many(pmc_ids)
+                changed_file.writelines(f"{pmc_id}\n" for pmc_id in pmc_ids)
+                save_fingerprint(
+                    new_fingerprint, os.path.join(new_fingerprint_dir, bucket_file)
+                )
+                totals["changed"] += len(changed_pm_ids)
+                totals["pmc_ids"] += len(pmc_ids)
+                print(
+                    f"Bucket {bucket + 1}/{number_of_buckets}: {len(changed_pm_ids):_} changed pm_ids. "
+                    f"Totals: {totals}",
+                    end="\r",
+                )
+        with open(os.path.join(new_fingerprint_dir, "meta.json"), "w") as file:
+            json.dump({"number_of_buckets": number_of_buckets}, file)
+        shutil.rmtree(fingerprint_dir)
+        os.rename(new_fingerprint_dir, fingerprint_dir)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+        shutil.rmtree(new_fingerprint_dir, ignore_errors=True)
+    print(f"\nRefresh done in {time.time() - start_time:.2f} seconds. {totals}")
+    return totals
+
+
+if __name__ == "__main__":
+    # python incremental_refresh.py fingerprint <fingerprint_dir>
+    # python incremental_refresh.py refresh <fingerprint_dir> <changed_pmc_ids_path>
+    if sys.argv[1] == "fingerprint":
+        build_fingerprint(sys.argv[2])
+    elif sys.argv[1] == "refresh":
+        refresh(sys.argv[2], sys.argv[3])
@@ -0,0 +1,113 @@
+import sys
+import time
+
+import numpy as np
+
+import VARIABLES as var
+
+
+class PmIdIndex:
+    """
+    Compact membership structure for PubMed ids.
+
+    PMIDs are dense positive integers (roughly 0 - 40M), so the set of human
+    PMIDs is stored as a bitmap over the PMID space: one bit per possible id,
+    around 5 MB in total, instead of tens of millions of python strings.
+    Lookups accept the raw string column from the PubTator dumps.
+    """
+
+    def __init__(self, pm_ids: np.ndarray):
+        pm_ids = np.unique(np.asarray(pm_ids, dtype=np.int64))
+        pm_ids = pm_ids[pm_ids >= 0]
+        self.count = len(pm_ids)
+        self.max_pm_id = int(pm_ids[-1]) if self.count else -1
+        bitmap = np.zeros(self.max_pm_id // 8 + 1, dtype=np.uint8)
+        np.bitwise_or.at(
+            bitmap, pm_ids >> 3, np.left_shift(1, pm_ids & 7).astype(np.uint8)
+        )
+        # bytes indexing is a plain C lookup, much cheaper than numpy scalar access
+        self._bitmap = bitmap.tobytes()
+
+    def __contains__(self, pm_id) -> bool:
+        try:
+            pm_id = int(pm_id)
+        except (TypeError, ValueError):
+            return False
+        if pm_id < 0 or pm_id > self.max_pm_id:
+            return False
+        return bool(self._bitmap[pm_id >> 3] & (1 << (pm_id & 7)))
+
+    def __len__(self) -> int:
+        return self.count
+
+    def contains_many(self, pm_ids) -> np.ndarray:
+        """Vectorized membership check, returns a boolean mask for `pm_ids`."""
+        pm_ids = np.asarray(pm_ids, dtype=np.int64)
+        in_range = (pm_ids >= 0) & (pm_ids <= self.max_pm_id)
+        result = np.zeros(len(pm_ids), dtype=bool)
+        valid = pm_ids[in_range]
+        bitmap = np.frombuffer(self._bitmap, dtype=np.uint8)
+        result[in_range] = (bitmap[valid >> 3] >> (valid & 7)) & 1 == 1
+        return result
+
+    @property
+    def nbytes(self) -> int:
+        return len(self._bitmap)
+
+
+def read_pm_ids_as_array(path: str = None) -> np.ndarray:
+    path = path or var.HUMAN_PM_IDS
+    with open(path, "r") as file:
+        return np.fromiter(
+            (int(line) for line in file if line.strip().isdigit()), dtype=np.int64
+        )
+
+
+_shared_index = None
+
+
+def get_pm_id_index(path: str = None) -> PmIdIndex:
+    """
+    Build the PMID index once per process and share it across all extractors.
+    """
+    global _shared_index
+    if _shared_index is None:
+        print("Loading pm_ids index from file...")
+        start_time = time.time()
+        _shared_index = PmIdIndex(read_pm_ids_as_array(path))
+        print(
+            f"Loaded {len(_shared_index):_} pm_ids into {_shared_index.nbytes / 2**20:.1f} MB "
+            f"in {time.time() - start_time:.2f} seconds"
+        )
+    return _shared_index
+
+
+def report_pm_id_index(path: str = None, number_of_lookups: int = 1_000_000):
+    """
+    Print memory footprint and lookup speed of the index compared to a python set.
+    """
+    pm_ids = read_pm_ids_as_array(path)
+    index = PmIdIndex(pm_ids)
+    pm_id_strings = [str(x) for x in pm_ids]
+    pm_id_set = set(pm_id_strings)
+    set_bytes = sys.getsizeof(pm_id_set) + sum(map(sys.getsizeof, pm_id_strings))
+
+    rng = np.random.default_rng(0)
+    probes = [str(x) for x in rng.integers(0, index.max_pm_id + 1, number_of_lookups)]
+
+    start_time = time.time()
+    index_hits = sum(1 for x in probes if x in index)
+    index_time = time.time() - start_time
+
+    start_time = time.time()
+    set_hits = sum(1 for x in probes if x in pm_id_set)
+    set_time = time.time() - start_time
+
+    assert index_hits == set_hits
+    print(f"pm_ids: {len(index):_}")
+    print(f"set of str:  {set_bytes / 2**20:10.1f} MB, {set_time / number_of_lookups * 1e9:6.0f} ns/lookup")
+    print(f"PmIdIndex:   {index.nbytes / 2**20:10.1f} MB, {index_time / number_of_lookups * 1e9:6.0f} ns/lookup")
+
+
+if __name__ == "__main__":
+    report_pm_id_index(sys.argv[1] if len(sys.argv) > 1 else None)
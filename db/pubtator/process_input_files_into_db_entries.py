@@ -1,6 +1,7 @@
 import re
 
 import VARIABLES as var
+from pm_id_index import get_pm_id_index
 
 
 def validate_variant(data: str) -> bool:
@@ -78,11 +79,18 @@ def get_human_pm_ids():
                 yield {"pm_id": columns[0]}
 
 
-def get_gene_ncbi_ids(skip=None):
+GENE_SYMBOL_COLUMN = "Symbol_from_nomenclature_authority"
+
+
+def get_human_gene_symbols() -> dict:
+    """
+    Map human NCBI gene ids to their nomenclature symbols.
+    Returns:
+        dict: NCBI gene id (str) -> symbol, for every gene of tax id 9606.
+    """
     # human genes file is around 40 MB
     import pandas as pd
 
-    GENE_SYMBOL_COLUMN = "Symbol_from_nomenclature_authority"
     hg_df = pd.read_csv(var.HUMAN_GENES, sep="\t")
     hg_df = hg_df[hg_df["#tax_id"] == 9606][["#tax_id", "GeneID", GENE_SYMBOL_COLUMN]]
     # print(len(hg_df), len(hg_df[GENE_SYMBOL_COLUMN].unique()))
@@ -98,44 +106,62 @@ def get_gene_ncbi_ids(skip=None):
     # non_unique_symbols = hg_df[hg_df[GENE_SYMBOL_COLUMN].duplicated(keep=False)]
     # print(non_unique_symbols)
     # non_unique_symbols.to_csv("non_unique_symbols.csv", index=False)
-    pm_ids = set(get_pm_ids())
-    valid_gene_ids = set(hg_df["GeneID"].astype(str))
+    hg_df = hg_df.drop_duplicates(subset="GeneID", keep="first")
+    return dict(zip(hg_df["GeneID"].astype(str), hg_df[GENE_SYMBOL_COLUMN]))
+
+
+def parse_gene_line(line: str, pm_ids, gene_symbols: dict) -> dict | None:
+    columns = line.strip().split("\t")
+    pm_id, ncbi_id = columns[0], columns[2]
+    if pm_id not in pm_ids:
+        return None
+    hgnc_symbol = gene_symbols.get(ncbi_id)
+    if not isinstance(hgnc_symbol, str) or hgnc_symbol == "-":
+        return None
+    return {"pm_id": pm_id, "ncbi_id": ncbi_id, "hgnc_symbol": hgnc_symbol}
+
+
+def parse_disease_line(line: str, pm_ids) -> dict | None:
+    columns = line.strip().split("\t")
+    if columns[0] not in pm_ids:
+        return None
+    return {"pm_id": columns[0], "original_ontology": columns[2]}
+
+
+def parse_variant_line(line: str, pm_ids) -> dict | None:
+    columns = line.strip().split("\t")
+    if columns[0] not in pm_ids or not validate_variant(columns[3]):
+        return None
+    return {"pm_id": columns[0], "variant_data": (columns[2], columns[3])}
+
+
+def get_gene_ncbi_ids(skip=None):
+    pm_ids = get_pm_id_index()
+    gene_symbols = get_human_gene_symbols()
     print("Skip to:", skip)
     with open(var.GENES, "r") as file:
         for i, line in enumerate(file):
             if skip and i < skip:
                 print(f"Skipping line {i}", end="\r")
                 continue
-            columns = line.strip().split("\t")
-            pm_id, ncbi_id = columns[0], columns[2]
-            if pm_id in pm_ids and ncbi_id in valid_gene_ids:
-                symbol_row = hg_df[hg_df["GeneID"].astype(str) == ncbi_id]
-                hgnc_symbol = (
-                    symbol_row[GENE_SYMBOL_COLUMN].values[0]
-                    if not symbol_row.empty
-                    else None
-                )
-                if not hgnc_symbol or hgnc_symbol == "-":
-                    continue
-                yield {"pm_id": pm_id, "ncbi_id": ncbi_id, "hgnc_symbol": hgnc_symbol}
+            if row := parse_gene_line(line, pm_ids, gene_symbols):
+                yield row
 
 
 def get_disease_original_ontology():
-    pm_ids = set(get_pm_ids())
+    pm_ids = get_pm_id_index()
     with open(var.DISEASE, "r") as file:
         for line in file:
-            columns = line.strip().split("\t")
-            if columns[0] in pm_ids:
-                yield {"pm_id": columns[0], "original_ontology": columns[2]}
+            if row := parse_disease_line(line, pm_ids):
+                yield row
 
 
 def get_variants_data():
-    pm_ids = set(get_pm_ids())
+    pm_ids = get_pm_id_index()
     with open(var.VARIANTS, "r") as file:
         for line in file:
-            columns = line.strip().split("\t")
-            if columns[0] in pm_ids and validate_variant(columns[3]):
-                yield {"pm_id": columns[0], "variant_data": (columns[2], columns[3])}
+            if row := parse_variant_line(line, pm_ids):
+                yield row
 
 
 # species_generator = get_human_pm_ids()
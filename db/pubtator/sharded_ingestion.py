@@ -0,0 +1,181 @@
+import os
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+import process_input_files_into_db_entries as pifidb
+import VARIABLES as var
+from pm_id_index import get_pm_id_index
+
+CHUNK_SIZE = 64 * 2**20  # 64 MB
+WRITE_BATCH_SIZE = 500_000
+
+INPUT_FILES = {
+    "gene": var.GENES,
+    "disease": var.DISEASE,
+    "variant": var.VARIANTS,
+}
+
+# lookups the workers use; filled by ingest_sharded before forking, so workers
+# inherit them, and by _init_worker for what a worker did not inherit
+_worker_state = {}
+
+
+def split_file_into_chunks(path: str, chunk_size: int = CHUNK_SIZE) -> list:
+    """
+    Split a file into byte ranges of roughly `chunk_size` bytes.
+    Every range starts at the beginning of a line and ends right after a newline
+    (or at the end of the file), so no line is split between two chunks.
+    Returns:
+        list: (start, end) byte offsets, end exclusive.
+    """
+    file_size = os.path.getsize(path)
+    chunks = []
+    with open(path, "rb") as file:
+        start = 0
+        while start < file_size:
+            file.seek(min(start + chunk_size, file_size))
+            file.readline()
+            end = min(file.tell(), file_size)
+            chunks.append((start, end))
+            start = end
+    return chunks
+
+
+def _init_worker(kind: str):
+    # with the fork start method the lookups built in the parent are inherited
+    if "pm_ids" not in _worker_state:
+        _worker_state["pm_ids"] = get_pm_id_index()
+    if kind == "gene" and "gene_symbols" not in _worker_state:
+        _worker_state["gene_symbols"] = pifidb.get_human_gene_symbols()
+
+
+def _parse_line(kind: str, line: str) -> dict | None:
+    pm_ids = _worker_state["pm_ids"]
+    if kind == "gene":
+        return pifidb.parse_gene_line(line, pm_ids, _worker_state["gene_symbols"])
+    if kind == "disease":
+        return pifidb.parse_disease_line(line, pm_ids)
+    if kind == "variant":
+        return pifidb.parse_variant_line(line, pm_ids)
+    raise ValueError("kind must be one of: 'gene', 'disease', 'variant'")
+
+
+def filter_chunk(kind: str, path: str, start: int, end: int) -> tuple[list, int]:
+    """
+    Read one byte range of a PubTator dump, filter and validate its lines.
+    Returns:
+        tuple: (list of unique rows in the format of process_input_files_into_db_entries, number of lines read)
+    """
+    with open(path, "rb") as file:
+        file.seek(start)
+        data = file.read(end - start)
+    unique_rows = {}
+    number_of_lines = 0
+    for line in data.decode("utf-8", errors="replace").splitlines():
+        number_of_lines += 1
+        if not line:
+            continue
+        if row := _parse_line(kind, line):
+            unique_rows.setdefault(tuple(row.items()), row)
+    return list(unique_rows.values()), number_of_lines
+
+
+def _write_batch(batch: list, lookup) -> int:
+    from db_fast_crud import prepare_articles_for_commit
+
+    session, new_count = prepare_articles_for_commit(batch, lookup)
+    session.commit()
+    return new_count
+
+
+def ingest_sharded(
+    kind: str,
+    path: str = None,
+    max_workers: int = None,
+    chunk_size: int = CHUNK_SIZE,
+    batch_size: int = WRITE_BATCH_SIZE,
+):
+    """
+    Filter one PubTator dump in parallel and write it to the database.
+
+    The file is split into newline aligned byte ranges which are filtered and
+    validated in a process pool. The parent process is the only writer: it merges
+    the per chunk results and commits them in batches through db_fast_crud.
+    Rows repeated across chunks are left to the writer, which skips associations
+    that already exist.
+    """
+    from db_fast_crud import preload_lookup_tables
+
+    path = path or INPUT_FILES[kind]
+    max_workers = max_workers or os.cpu_count()
+    chunks = split_file_into_chunks(path, chunk_size)
+    print(f"Ingesting {kind} from {path}: {len(chunks)} chunks, {max_workers} workers")
+
+    # build shared lookups before forking, so workers inherit them
+    _worker_state["pm_ids"] = get_pm_id_index()
+    if kind == "gene" and "gene_symbols" not in _worker_state:
+        _worker_state["gene_symbols"] = pifidb.get_human_gene_symbols()
+    lookup = preload_lookup_tables()
+
+    start_time = time.time()
+    lines_read = rows_kept = rows_written = chunks_done = 0
+    pending_rows = []
+    remaining_chunks = iter(chunks)
+    with ProcessPoolExecutor(
+        max_workers=max_workers, initializer=_init_worker, initargs=(kind,)
+    ) as executor:
+        # keep a bounded number of chunks in flight so finished results
+        # do not pile up in memory while the writer is busy
+        in_flight = set()
+        for start, end in remaining_chunks:
+            in_flight.add(executor.submit(filter_chunk, kind, path, start, end))
+            if len(in_flight) >= max_workers * 2:
+                break
+        while in_flight:
+            done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in done:
+                rows, number_of_lines = future.result()
+                chunks_done += 1
+                lines_read += number_of_lines
+                rows_kept += len(rows)
+                pending_rows.extend(rows)
+                next_chunk = next(remaining_chunks, None)
+                if next_chunk:
+                    in_flight.add(executor.submit(filter_chunk, kind, path, *next_chunk))
+            elapsed = time.time() - start_time
+            print(
+                f"Chunks {chunks_done}/{len(chunks)}. Lines read: {lines_read:_} "
+                f"({lines_read / elapsed:_.0f} lines/s). Rows kept: {rows_kept:_}"
+            )
+            while len(pending_rows) >= batch_size:
+                batch, pending_rows = pending_rows[:batch_size], pending_rows[batch_size:]
+                rows_written += _report_write(batch, lookup, start_time, rows_written)
+        if pending_rows:
+            rows_written += _report_write(pending_rows, lookup, start_time, rows_written)
+
+    elapsed = time.time() - start_time
+    print(
+        f"Done {kind}: {lines_read:_} lines read, {rows_written:_} rows written "
+        f"in {elapsed:.2f} seconds ({rows_written / elapsed:_.0f} rows/s)"
+    )
+
+
+def _report_write(batch: list, lookup, start_time: float, rows_written: int) -> int:
+    batch_start_time = time.time()
+    new_count = _write_batch(batch, lookup)
+    batch_time = time.time() - batch_start_time
+    total = rows_written + len(batch)
+    print(
+        f"Committed {len(batch):_} rows ({new_count:_} new articles) in {batch_time:.2f} seconds "
+        f"({len(batch) / batch_time:_.0f} rows/s). Total so far: {total:_}. "
+        f"Overall: {total / (time.time() - start_time):_.0f} rows/s"
+    )
+    return len(batch)
+
+
+if __name__ == "__main__":
+    # python sharded_ingestion.py gene|disease|variant [max_workers]
+    kind = sys.argv[1]
+    max_workers = int(sys.argv[2]) if len(sys.argv) > 2 else None
+    ingest_sharded(kind, max_workers=max_workers)
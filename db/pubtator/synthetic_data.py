@@ -0,0 +1,160 @@
+import random
+import sys
+import time
+from itertools import accumulate
+
+from db.pubtator.db_models import (
+    Article,
+    ArticleProcessingStage,
+    Base,
+    Disease,
+    Gene,
+    ProcessingStageHistory,
+    Variant,
+    article_diseases,
+    article_genes,
+    article_variants,
+)
+from db.utils.enum_and_constants import ProcessingStageEnum
+from sqlalchemy import insert
+
+INSERT_BATCH_SIZE = 50_000
+
+# Zipf exponents: entity i is picked with weight 1 / i**skew, so low ids are the
+# hubs (e.g. gene 1 plays TP53) and high ids the long tail. 0 is uniform.
+GENE_SKEW = 1.1
+DISEASE_SKEW = 1.0
+VARIANT_SKEW = 0.6
+
+
+def _insert_in_batches(connection, table, rows):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= INSERT_BATCH_SIZE:
+            connection.execute(insert(table), batch)
+            batch = []
+    if batch:
+        connection.execute(insert(table), batch)
+
+
+def zipf_cum_weights(number_of_entities: int, skew: float) -> list:
+    return list(accumulate(1 / i**skew for i in range(1, number_of_entities + 1)))
+
+
+def _links(rng, column, number_of_articles, number_of_entities, mean_links, skew):
+    entity_ids = range(1, number_of_entities + 1)
+    cum_weights = zipf_cum_weights(number_of_entities, skew)
+    for article_id in range(1, number_of_articles + 1):
+        # at least one link, with a tail of articles mentioning many entities
+        k = 1 + int(rng.expovariate(1 / mean_links))
+        for entity_id in set(rng.choices(entity_ids, cum_weights=cum_weights, k=k)):
+            yield {"article_id": article_id, column: entity_id}
+
+
+def generate_dataset(
+    engine,
+    number_of_articles: int = 200_000,
+    number_of_genes: int = 5_000,
+    number_of_diseases: int = 2_000,
+    number_of_variants: int = 50_000,
+    links_per_article: int = 3,
+    seed: int = 0,
+    gene_skew: float = GENE_SKEW,
+    disease_skew: float = DISEASE_SKEW,
+    variant_skew: float = VARIANT_SKEW,
+):
+    """
+    Fill an empty database with synthetic articles, entities, links and stage rows.
+
+    Links follow Zipf distributions, so a few hub genes and diseases are linked to a
+    large share of the articles while most variants appear in one or two articles.
+    `links_per_article` is the mean number of links per article and entity type.
+    """
+    rng = random.Random(seed)
+    stages = list(ProcessingStageEnum)
+    Base.metadata.create_all(engine)
+    start_time = time.time()
+    with engine.begin() as connection:
+        _insert_in_batches(
+            connection,
+            Article.__table__,
+            (
+                {"id": i, "pm_id": str(i), "pmc_id": f"PMC{i}"}
+                for i in range(1, number_of_articles + 1)
+            ),
+        )
+        _insert_in_batches(
+            connection,
+            Gene.__table__,
+            (
+                {"id": i, "ncbi_id": str(i), "hgnc_symbol": f"GENE{i}"}
+                for i in range(1, number_of_genes + 1)
+            ),
+        )
+        _insert_in_batches(
+            connection,
+            Disease.__table__,
+            (
+                {"id": i, "original_ontology": f"MESH:D{i:06d}"}
+                for i in range(1, number_of_diseases + 1)
+            ),
+        )
+        _insert_in_batches(
+            connection,
+            Variant.__table__,
+            (
+                {"id": i, "exact_match": f"rs{i}", "identified": f"rs{i}"}
+                for i in range(1, number_of_variants + 1)
+            ),
+        )
+        for table, column, number_of_entities, skew in (
+            (article_genes, "gene_id", number_of_genes, gene_skew),
+            (article_diseases, "disease_id", number_of_diseases, disease_skew),
+            (article_variants, "variant_id", number_of_variants, variant_skew),
+        ):
+            _insert_in_batches(
+                connection,
+                table,
+                _links(
+                    rng,
+                    column,
+                    number_of_articles,
+                    number_of_entities,
+                    links_per_article,
+                    skew,
+                ),
+            )
+        _insert_in_batches(
+            connection,
+            ArticleProcessingStage.__table__,
+            (
+                {"article_id": article_id, "current_stage": rng.choice(stages).name}
+                for article_id in range(1, number_of_articles + 1)
+            ),
+        )
+        _insert_in_batches(
+            connection,
+            ProcessingStageHistory.__table__,
+            (
+                {
+                    "article_id": article_id,
+                    "stage": stage.name,
+                    "status": "success",
+                }
+                for article_id in range(1, number_of_articles + 1)
+                for stage in stages[: rng.randint(1, len(stages))]
+            ),
+        )
+    print(f"Generated dataset in {time.time() - start_time:.2f} seconds")
+
+
+if __name__ == "__main__":
+    # python -m db.pubtator.synthetic_data [number_of_articles]
+    # fills the database configured in VARIABLES, e.g. DB_BACKEND=sqlite
+    from db.pubtator.VARIABLES import get_engine
+
+    if len(sys.argv) > 1:
+        generate_dataset(get_engine(), number_of_articles=int(sys.argv[1]))
+    else:
+        generate_dataset(get_engine())
@@ -1,9 +1,11 @@
 from .enum_and_constants import ProcessingStageEnum, ArticleProcessingStatusEnum
 from .model import ArticleProcessingStage, ProcessingStageHistory
-import .model as model
+from . import model
 from datetime import datetime, timezone
 from functools import wraps
 
+from sqlalchemy import insert, select, update
+
 
 STAGE_ORDER = list(ProcessingStageEnum)
 
@@ -16,9 +18,10 @@ def next_stage(current: ProcessingStageEnum):
 
 
 class InvalidProcessingStageError(Exception):
-    def __init__(self, current, expected):
+    def __init__(self, current, expected, message=None):
         super().__init__(
-            f"Invalid stage: expected '{expected.name}', but current is '{current.name}'"
+            message
+            or f"Invalid stage: expected '{expected.name}', but current is '{current.name if current else None}'"
         )
 
 
@@ -91,7 +94,7 @@ def advance_stage(
         ProcessingStageHistory(
             article_id=article.id,
             stage=new_stage,
-            status=status,
+            status=status.value,
             error_message=error,
             updated_at=now,
         )
@@ -100,6 +103,101 @@ def advance_stage(
     session.commit()
 
 
+IN_CLAUSE_SIZE = 10_000
+
+
+def advance_stages(session, transitions, commit=True):
+    """
+    Batched version of advance_stage.
+
+    Applies many (article, new_stage, status, error) transitions with one bulk
+    UPDATE of article_processing_stages and one bulk INSERT of processing_stage_history
+    rows, in a single transaction. `article` can be an Article or an article id.
+
+    Validation follows requires_stage_and_advance: every article must already have a
+    processing stage and `new_stage` must be the stage that follows it, otherwise
+    InvalidProcessingStageError is raised before anything is written. Transitions
+    into the first stage, which articles only start in, and transitions to the
+    stage an article is already in (e.g. complete -> complete) are rejected.
+    """
+    now = datetime.now(timezone.utc)
+    transitions = [
+        (getattr(article, "id", article), new_stage, status, error)
+        for article, new_stage, status, error in transitions
+    ]
+    article_ids = [article_id for article_id, _, _, _ in transitions]
+    if len(set(article_ids)) != len(article_ids):
+        raise ValueError("each article can only have one transition per batch")
+    for _, new_stage, status, _ in transitions:
+        if not isinstance(new_stage, ProcessingStageEnum):
+            raise ValueError("new_stage must be an instance of ProcessingStageEnum")
+        if not isinstance(status, ArticleProcessingStatusEnum):
+            raise ValueError(
+                "status must be an instance of ArticleProcessingStatusEnum"
+            )
+        if new_stage == STAGE_ORDER[0]:
+            raise ValueError(
+                f"no stage precedes '{new_stage.name}', articles can not advance to it"
+            )
+
+    current_stages = {}
+    for i in range(0, len(article_ids), IN_CLAUSE_SIZE):
+        current_stages.update(
+            session.execute(
+                select(
+                    ArticleProcessingStage.article_id,
+                    ArticleProcessingStage.current_stage,
+                )
+                .where(
+                    ArticleProcessingStage.article_id.in_(
+                        article_ids[i : i + IN_CLAUSE_SIZE]
+                    )
+                )
+                .with_for_update()
+            ).all()
+        )
+    for article_id, new_stage, _, _ in transitions:
+        current = current_stages.get(article_id)
+        if current == new_stage:
+            raise InvalidProcessingStageError(
+                current,
+                new_stage,
+                f"Invalid stage: article {article_id} is already in '{current.name}'",
+            )
+        if current is None or next_stage(current) != new_stage:
+            expected = STAGE_ORDER[STAGE_ORDER.index(new_stage) - 1]
+            raise InvalidProcessingStageError(current, expected)
+
+    if transitions:
+        session.execute(
+            update(ArticleProcessingStage),
+            [
+                {
+                    "article_id": article_id,
+                    "current_stage": new_stage,
+                    "updated_at": now,
+                    "last_error": error,
+                }
+                for article_id, new_stage, _, error in transitions
+            ],
+        )
+        session.execute(
+            insert(ProcessingStageHistory),
+            [
+                {
+                    "article_id": article_id,
+                    "stage": new_stage,
+                    "status": status.value,
+                    "error_message": error,
+                    "updated_at": now,
+                }
+                for article_id, new_stage, status, error in transitions
+            ],
+        )
+    if commit:
+        session.commit()
+
+
 @requires_stage_and_advance(ProcessingStageEnum.pending_download)
 def mark_downloaded(article, session):
     article.download_status = model.DownloadStatus(is_downloaded=True, downloaded_date=datetime.now(timezone.utc))
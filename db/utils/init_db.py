@@ -1,20 +1,20 @@
 from sqlalchemy import create_engine
 from model import Base
-from enum_and_constants import DATABASE_URI
+from enum_and_constants import get_database_uri
 from sqlalchemy.orm import sessionmaker
 from contextlib import contextmanager
 
 
-def create_tables(drop_previous=False, db_url=DATABASE_URI):
-    engine = create_engine(db_url)
+def create_tables(drop_previous=False, db_url=None):
+    engine = create_engine(db_url or get_database_uri())
     if drop_previous:
         Base.metadata.drop_all(engine)
     Base.metadata.create_all(engine, checkfirst=True)
 
 
 @contextmanager
-def get_session(db_url=DATABASE_URI):
-    engine = create_engine(db_url)
+def get_session(db_url=None):
+    engine = create_engine(db_url or get_database_uri())
     Session = sessionmaker(bind=engine)
     session = Session()
     try:
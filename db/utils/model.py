@@ -8,11 +8,12 @@ from sqlalchemy import (
     Boolean,
     Text,
     Enum,
+    Index,
     create_engine,
 )
 from sqlalchemy.orm import relationship, declarative_base
 from datetime import datetime, timezone
-from enum_and_constants import ProcessingStageEnum
+from db.utils.enum_and_constants import ProcessingStageEnum
 import enum
 
 POSTGRESQL_FALSE = "false"
@@ -34,6 +35,7 @@ article_genes = Table(
     Column(
         "gene_id", Integer, ForeignKey("genes.id", ondelete="CASCADE"), primary_key=True
     ),
+    Index("ix_article_genes_gene_id_article_id", "gene_id", "article_id"),
 )
 
 article_diseases = Table(
@@ -51,6 +53,7 @@ article_diseases = Table(
         ForeignKey("diseases.id", ondelete="CASCADE"),
         primary_key=True,
     ),
+    Index("ix_article_diseases_disease_id_article_id", "disease_id", "article_id"),
 )
 
 article_variants = Table(
@@ -68,6 +71,7 @@ article_variants = Table(
         ForeignKey("variants.id", ondelete="CASCADE"),
         primary_key=True,
     ),
+    Index("ix_article_variants_variant_id_article_id", "variant_id", "article_id"),
 )
 
 
@@ -233,6 +237,14 @@ class SubmissionStatus(Base):
 
 class ArticleProcessingStage(Base):
     __tablename__ = "article_processing_stages"
+    __table_args__ = (
+        # "next N articles pending stage X" queries
+        Index(
+            "ix_article_processing_stages_current_stage_article_id",
+            "current_stage",
+            "article_id",
+        ),
+    )
 
     article_id = Column(
         Integer, ForeignKey("articles.id", ondelete="CASCADE"), primary_key=True
@@ -252,7 +264,9 @@ class ProcessingStageHistory(Base):
     __tablename__ = "processing_stage_history"
 
     id = Column(Integer, primary_key=True, autoincrement=True)
-    article_id = Column(Integer, ForeignKey("articles.id", ondelete="CASCADE"))
+    article_id = Column(
+        Integer, ForeignKey("articles.id", ondelete="CASCADE"), index=True
+    )
     stage = Column(Enum(ProcessingStageEnum), nullable=False)
     status = Column(String, nullable=False)  # 'success', 'error', 'skipped'
     error_message = Column(Text, nullable=True)
@@ -263,3 +277,33 @@ class ProcessingStageHistory(Base):
     )
 
     article = relationship("Article", backref="stage_history")
+
+
+# Summary tables kept up to date by progress_report.refresh_progress_report
+
+
+class StageHistoryRollup(Base):
+    __tablename__ = "stage_history_rollup"
+
+    # number of processing_stage_history rows per stage, status and hour
+    stage = Column(Enum(ProcessingStageEnum), primary_key=True)
+    status = Column(String, primary_key=True)
+    hour = Column(DateTime, primary_key=True)
+    count = Column(Integer, nullable=False, default=0)
+
+
+class ProgressCount(Base):
+    __tablename__ = "progress_counts"
+
+    # e.g. "stage.pending_search" or "download_statuses.is_downloaded"
+    name = Column(String, primary_key=True)
+    count = Column(Integer, nullable=False, default=0)
+    refreshed_at = Column(DateTime, nullable=False)
+
+
+class ReportWatermark(Base):
+    __tablename__ = "report_watermarks"
+
+    name = Column(String, primary_key=True)
+    last_id = Column(Integer, nullable=False, default=0)
+    refreshed_at = Column(DateTime, nullable=True)
@@ -0,0 +1,318 @@
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import delete, func, select
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from .article_status import STAGE_ORDER
+from .enum_and_constants import ArticleProcessingStatusEnum, ProcessingStageEnum
+from .model import (
+    DownloadStatus,
+    ProcessingStageHistory,
+    ProgressCount,
+    ReportWatermark,
+    SearchStatus,
+    StageHistoryRollup,
+    SubmissionStatus,
+    SupplementaryParseStatus,
+    TextParseStatus,
+    W3CStatus,
+)
+
+ROLLUP_WATERMARK = "stage_history_rollup"
+# history rows younger than this are left for the next refresh, so rows written by
+# transactions that were still open during a refresh are not skipped by the watermark
+SETTLE_DELAY = timedelta(minutes=5)
+ROLLUP_BATCH_SIZE = 1_000_000  # history ids per aggregation query
+
+# the stage a successful transition enters once the flag is set, see the
+# mark_* functions in article_status
+STATUS_FLAGS = {
+    DownloadStatus.is_downloaded: ProcessingStageEnum.pending_parse_text,
+    TextParseStatus.is_parsed: ProcessingStageEnum.pending_parse_supplementary,
+    SupplementaryParseStatus.is_parsed: ProcessingStageEnum.pending_search,
+    SearchStatus.is_searched: ProcessingStageEnum.pending_w3c,
+    W3CStatus.is_w3c: ProcessingStageEnum.pending_submission,
+    SubmissionStatus.is_submitted: ProcessingStageEnum.complete,
+}
+
+
+def _utc_now() -> datetime:
+    # DateTime columns are timezone naive and hold UTC
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def _hour_bucket(session, column):
+    if session.bind.dialect.name == "postgresql":
+        return func.date_trunc("hour", column)
+    return func.strftime("%Y-%m-%d %H:00:00", column)
+
+
+def _insert(session, table):
+    if session.bind.dialect.name == "postgresql":
+        return postgresql_insert(table)
+    return sqlite_insert(table)
+
+
+def _upsert(session, table, rows: list, index_elements: list, set_):
+    statement = _insert(session, table)
+    statement = statement.on_conflict_do_update(
+        index_elements=index_elements, set_=set_(statement.excluded)
+    )
+    session.execute(statement, rows)
+
+
+def _lock_watermark(session) -> ReportWatermark:
+    """
+    Read the rollup watermark with SELECT ... FOR UPDATE, so it stays locked until
+    the session commits. An overlapping refresh waits here and then reads the
+    watermark the first one stored, so no history window is applied twice.
+    """
+    session.execute(
+        _insert(session, ReportWatermark)
+        .values(name=ROLLUP_WATERMARK, last_id=0)
+        .on_conflict_do_nothing(index_elements=["name"])
+    )
+    return session.get(
+        ReportWatermark, ROLLUP_WATERMARK, with_for_update=True, populate_existing=True
+    )
+
+
+def refresh_stage_history_rollup(session) -> dict:
+    """
+    Add the processing_stage_history rows written since the last refresh to
+    stage_history_rollup. Only rows past the stored watermark are read, so a
+    refresh costs as much as the history written since the previous one.
+    The watermark stays locked until the caller commits.
+    Returns:
+        dict: {(stage, status): number of history rows rolled up}
+    """
+    watermark = _lock_watermark(session)
+    # stop right before the first recent row, so the watermark never passes
+    # rows that may still have lower ids in flight
+    first_recent_id = session.execute(
+        select(func.min(ProcessingStageHistory.id)).where(
+            ProcessingStageHistory.id > watermark.last_id,
+            ProcessingStageHistory.updated_at >= _utc_now() - SETTLE_DELAY,
+        )
+    ).scalar()
+    if first_recent_id is not None:
+        last_id = first_recent_id - 1
+    else:
+        last_id = session.execute(
+            select(func.max(ProcessingStageHistory.id)).where(
+                ProcessingStageHistory.id > watermark.last_id
+            )
+        ).scalar()
+    rolled_up = {}
+    start_id = watermark.last_id
+    while last_id is not None and start_id < last_id:
+        end_id = min(start_id + ROLLUP_BATCH_SIZE, last_id)
+        hour = _hour_bucket(session, ProcessingStageHistory.updated_at)
+        rows = session.execute(
+            select(
+                ProcessingStageHistory.stage,
+                ProcessingStageHistory.status,
+                hour,
+                func.count(),
+            )
+            .where(
+                ProcessingStageHistory.id > start_id,
+                ProcessingStageHistory.id <= end_id,
+            )
+            .group_by(ProcessingStageHistory.stage, ProcessingStageHistory.status, hour)
+        ).all()
+        if rows:
+            _upsert(
+                session,
+                StageHistoryRollup,
+                [
+                    {
+                        "stage": stage,
+                        "status": status,
+                        "hour": (
+                            datetime.fromisoformat(bucket)
+                            if isinstance(bucket, str)
+                            else bucket
+                        ),
+                        "count": count,
+                    }
+                    for stage, status, bucket, count in rows
+                ],
+                ["stage", "status", "hour"],
+                lambda excluded: {"count": StageHistoryRollup.count + excluded.count},
+            )
+        for stage, status, _, count in rows:
+            rolled_up[stage, status] = rolled_up.get((stage, status), 0) + count
+        start_id = end_id
+    if last_id is not None and last_id > watermark.last_id:
+        watermark.last_id = last_id
+    watermark.refreshed_at = _utc_now()
+    return rolled_up
+
+
+def progress_count_deltas(rolled_up: dict) -> dict:
+    """
+    Turn rolled up transitions into changes of the progress_counts.
+
+    Articles only advance one stage at a time (see article_status), so a
+    transition into a stage also leaves the stage before it, and a transition
+    into the first stage is an article entering the pipeline. A successful
+    transition into a stage of STATUS_FLAGS means its flag was set.
+    Returns:
+        dict: {progress_counts name: change}
+    """
+    deltas = {f"stage.{stage.name}": 0 for stage in ProcessingStageEnum}
+    deltas.update((f"{flag.table.name}.{flag.name}", 0) for flag in STATUS_FLAGS)
+    for (stage, status), count in rolled_up.items():
+        deltas[f"stage.{stage.name}"] += count
+        if index := STAGE_ORDER.index(stage):
+            deltas[f"stage.{STAGE_ORDER[index - 1].name}"] -= count
+        if status == ArticleProcessingStatusEnum.success.value:
+            for flag, flag_stage in STATUS_FLAGS.items():
+                if flag_stage == stage:
+                    deltas[f"{flag.table.name}.{flag.name}"] += count
+    return deltas
+
+
+def refresh_progress_counts(session, rolled_up: dict):
+    """
+    Apply the transitions returned by refresh_stage_history_rollup to the
+    articles per current stage and the set flags in progress_counts. Only the
+    changes are written; the stage and *_statuses tables are not read.
+    """
+    now = _utc_now()
+    _upsert(
+        session,
+        ProgressCount,
+        [
+            {"name": name, "count": delta, "refreshed_at": now}
+            for name, delta in progress_count_deltas(rolled_up).items()
+        ],
+        ["name"],
+        lambda excluded: {
+            "count": ProgressCount.count + excluded.count,
+            "refreshed_at": excluded.refreshed_at,
+        },
+    )
+
+
+def refresh_progress_report(session):
+    """Refresh all summary tables and commit. Meant to run periodically, e.g. from cron."""
+    start_time = time.time()
+    rolled_up = refresh_stage_history_rollup(session)
+    refresh_progress_counts(session, rolled_up)
+    session.commit()
+    print(
+        f"Rolled up {sum(rolled_up.values()):_} history rows and refreshed counts "
+        f"in {time.time() - start_time:.2f} seconds"
+    )
+
+
+def rebuild_progress_report(session):
+    """
+    Empty the summary tables and roll up the whole history again, e.g. after
+    history rows were written outside article_status. Commits.
+    """
+    _lock_watermark(session).last_id = 0
+    session.execute(delete(StageHistoryRollup))
+    session.execute(delete(ProgressCount))
+    refresh_progress_report(session)
+
+
+def get_progress_report(session, hours: int = 24) -> dict:
+    """
+    Read the progress report from the summary tables only.
+    Returns:
+        dict: {
+            "counts": {name: count},
+            "refreshed_at": datetime of the last refresh,
+            "stages": {stage: {status: count}} over the last `hours` hours,
+            "hourly": {hour: {status: count}} over the last `hours` hours,
+        }
+    """
+    since = _utc_now().replace(minute=0, second=0, microsecond=0) - timedelta(
+        hours=hours
+    )
+    counts = session.execute(select(ProgressCount.name, ProgressCount.count)).all()
+    watermark = session.get(ReportWatermark, ROLLUP_WATERMARK)
+    stages = {}
+    hourly = {}
+    for stage, status, hour, count in session.execute(
+        select(
+            StageHistoryRollup.stage,
+            StageHistoryRollup.status,
+            StageHistoryRollup.hour,
+            StageHistoryRollup.count,
+        ).where(StageHistoryRollup.hour >= since)
+    ):
+        by_status = stages.setdefault(stage, {})
+        by_status[status] = by_status.get(status, 0) + count
+        by_status = hourly.setdefault(hour, {})
+        by_status[status] = by_status.get(status, 0) + count
+    return {
+        "counts": dict(counts),
+        "refreshed_at": watermark.refreshed_at if watermark else None,
+        "stages": stages,
+        "hourly": dict(sorted(hourly.items())),
+    }
+
+
+def _error_rate(by_status: dict) -> float:
+    total = sum(by_status.values())
+    return by_status.get(ArticleProcessingStatusEnum.error.value, 0) / total if total else 0.0
+
+
+def print_progress_report(report: dict, hours: int):
+    print(f"Summary tables refreshed at {report['refreshed_at']} (UTC)\n")
+    print(f"{'stage':<30}{'articles':>12}{f'done {hours}h':>12}{'per hour':>10}{'errors':>9}")
+    for stage in ProcessingStageEnum:
+        by_status = report["stages"].get(stage, {})
+        done = sum(by_status.values())
+        print(
+            f"{stage.name:<30}{report['counts'].get(f'stage.{stage.name}', 0):>12_}"
+            f"{done:>12_}{done / hours:>10.1f}{_error_rate(by_status):>9.1%}"
+        )
+    print(f"\n{'status flag':<45}{'set':>12}")
+    for name, count in sorted(report["counts"].items()):
+        if not name.startswith("stage."):
+            print(f"{name:<45}{count:>12_}")
+    print(f"\n{'hour':<22}{'transitions':>12}{'errors':>9}")
+    for hour, by_status in report["hourly"].items():
+        print(f"{str(hour):<22}{sum(by_status.values()):>12_}{_error_rate(by_status):>9.1%}")
+
+
+if __name__ == "__main__":
+    # python -m db.utils.progress_report refresh|rebuild
+    # python -m db.utils.progress_report show [hours]
+    from sqlalchemy import create_engine
+    from sqlalchemy.orm import Session
+
+    from .enum_and_constants import get_database_uri
+    from .model import Base
+
+    engine = create_engine(get_database_uri())
+    command = sys.argv[1] if len(sys.argv) > 1 else "show"
+    with Session(engine) as session:
+        if command in ("refresh", "rebuild"):
+            Base.metadata.create_all(
+                engine,
+                tables=[
+                    StageHistoryRollup.__table__,
+                    ProgressCount.__table__,
+                    ReportWatermark.__table__,
+                ],
+            )
+            if command == "rebuild":
+                rebuild_progress_report(session)
+            else:
+                refresh_progress_report(session)
+        elif command == "show":
+            hours = int(sys.argv[2]) if len(sys.argv) > 2 else 24
+            start_time = time.time()
+            print_progress_report(get_progress_report(session, hours), hours)
+            print(f"\nRead in {(time.time() - start_time) * 1000:.0f} ms")
+        else:
+            print("Usage: python -m db.utils.progress_report refresh|rebuild|show [hours]")
@@ -0,0 +1,147 @@
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from .article_status import advance_stages, next_stage
+from .enum_and_constants import ArticleProcessingStatusEnum, ProcessingStageEnum
+from .model import ArticleProcessingStage
+
+DEFAULT_BATCH_SIZE = 100
+DEFAULT_POLL_INTERVAL = 10  # seconds
+
+
+def claim_batch(
+    session, stage: ProcessingStageEnum, batch_size: int = DEFAULT_BATCH_SIZE
+) -> list[ArticleProcessingStage]:
+    """
+    Lock up to `batch_size` articles that are pending `stage`.
+
+    Rows are taken with SELECT ... FOR UPDATE SKIP LOCKED, so concurrent workers,
+    on the same or on different machines, never get the same article. The locks are
+    held until the session commits or rolls back; if a worker dies mid batch its
+    transaction is rolled back and the articles become claimable again.
+    """
+    return (
+        session.query(ArticleProcessingStage)
+        .filter(ArticleProcessingStage.current_stage == stage)
+        .order_by(ArticleProcessingStage.article_id)
+        .limit(batch_size)
+        .with_for_update(skip_locked=True)
+        .all()
+    )
+
+
+def advance_claimed(session, claimed: list, stage: ProcessingStageEnum, errors: dict):
+    """
+    Move a claimed batch to the stage after `stage` in bulk. Like
+    requires_stage_and_advance, failed articles advance too, with status 'error'
+    and the error message recorded. Does not commit.
+    """
+    advance_stages(
+        session,
+        [
+            (
+                row.article_id,
+                next_stage(stage),
+                (
+                    ArticleProcessingStatusEnum.error
+                    if row.article_id in errors
+                    else ArticleProcessingStatusEnum.success
+                ),
+                errors.get(row.article_id),
+            )
+            for row in claimed
+        ],
+        commit=False,
+    )
+
+
+def process_batch(session, stage: ProcessingStageEnum, handler, batch_size: int) -> int:
+    """
+    Claim one batch, run `handler(article, session)` for every article and advance
+    the whole batch in the same transaction.
+    Returns the number of processed articles, 0 when nothing was pending.
+    """
+    claimed = claim_batch(session, stage, batch_size)
+    if not claimed:
+        session.rollback()
+        return 0
+    errors = {}
+    for row in claimed:
+        # a savepoint per article, so one failure does not abort the whole batch
+        savepoint = session.begin_nested()
+        try:
+            handler(row.article, session)
+            savepoint.commit()
+        except Exception as e:
+            savepoint.rollback()
+            errors[row.article_id] = str(e)
+    advance_claimed(session, claimed, stage, errors)
+    session.commit()
+    return len(claimed)
+
+
+def run_stage_worker(
+    session_factory,
+    stage: ProcessingStageEnum,
+    handler,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    poll_interval: float = DEFAULT_POLL_INTERVAL,
+    stop_when_empty: bool = True,
+) -> int:
+    """
+    Keep claiming and processing batches of articles pending `stage`.
+
+    Args:
+        session_factory: context manager factory returning a session, e.g. init_db.get_session
+        stage (ProcessingStageEnum): stage to work on
+        handler: function(article, session) doing the work of the stage,
+            raising an exception when the article failed
+        batch_size (int): number of articles claimed per transaction
+        poll_interval (float): seconds to wait when nothing is pending and stop_when_empty is False
+        stop_when_empty (bool): return once no article is pending
+    Returns:
+        int: number of processed articles
+    """
+    if not isinstance(stage, ProcessingStageEnum):
+        raise ValueError("stage must be an instance of ProcessingStageEnum")
+    if stage == ProcessingStageEnum.complete:
+        raise ValueError("complete is the last stage, there is nothing to process")
+    total = 0
+    start_time = time.time()
+    while True:
+        with session_factory() as session:
+            processed = process_batch(session, stage, handler, batch_size)
+        total += processed
+        if processed:
+            print(
+                f"[{os.getpid()}] {stage.name}: {total:_} articles "
+                f"({total / (time.time() - start_time):.1f}/s)"
+            )
+            continue
+        if stop_when_empty:
+            return total
+        time.sleep(poll_interval)
+
+
+def run_stage_workers(
+    session_factory,
+    stage: ProcessingStageEnum,
+    handler,
+    number_of_workers: int = None,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+) -> int:
+    """
+    Run `number_of_workers` local worker processes on `stage` until nothing is pending.
+    `session_factory` and `handler` must be picklable (module level functions).
+    Workers on other machines can run run_stage_worker against the same database.
+    """
+    number_of_workers = number_of_workers or os.cpu_count()
+    with ProcessPoolExecutor(max_workers=number_of_workers) as executor:
+        futures = [
+            executor.submit(
+                run_stage_worker, session_factory, stage, handler, batch_size
+            )
+            for _ in range(number_of_workers)
+        ]
+        return sum(future.result() for future in futures)
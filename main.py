@@ -3,8 +3,7 @@ import os
 from parser.combined_parsing import combine_xml_and_txt_no_save
 
 import pandas as pd
-from db.pubtator.db_queries import get_full_related_data
-from db.pubtator.VARIABLES import get_session
+from db.pubtator.annotation_cache import get_annotation_cache, get_article_annotations
 from dotenv import load_dotenv
 from supplementary.tests.pipeline_preprocessing import parse_supplementary_for_pmc_id
 from utils.logging.logging_setup import main_error_logger, main_info_logger
@@ -50,10 +49,7 @@ def do_one_article(pmc_id: str, submission_out_dir: str):
 
     supplementary_parsing_results = parse_supplementary_for_pmc_id(pmc_id)
     # supplementary_parsing_results = {}
-    with get_session() as session:
-        pubtator_data = get_full_related_data(
-            session=session, entity_type="article", field="pmc_id", value=pmc_id
-        )
+    pubtator_data = get_article_annotations(pmc_id)
     searched_data = do_one_article_w_diseases_automation(
         pmc_id=pmc_id,
         article_data=text_parsing_result,
@@ -118,3 +114,4 @@ if __name__ == "__main__":
             do_one_article(pmc_id=pmc_id, submission_out_dir=OUTPUT_DIR)
         except Exception as e:
             main_error_logger.error(f"ID: {pmc_id}\tINDEX: {index}\t Exception: {e}")
+    main_info_logger.info(get_annotation_cache().stats())
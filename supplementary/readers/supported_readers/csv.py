@@ -1,4 +1,8 @@
+import codecs
+import csv
 import io
+import os
+import re
 
 import pandas as pd
 
@@ -11,7 +15,72 @@ from supplementary.utils.data_fetching import (
 )
 from supplementary.utils.result_saver import get_output_type, save
 
-from utils.logging.logging_setup import supplementary_error_logger
+from utils.logging.logging_setup import (
+    supplementary_error_logger,
+    supplementary_info_logger,
+)
+from variant_search.search import SUPPLEMENTARY_PATTERNS
+
+
+CSV_CHUNK_ROWS = int(os.getenv("CSV_CHUNK_ROWS", 50_000))
+SNIFF_BYTES = 64 * 1024  # sample used to detect the encoding and the dialect
+CSV_SEPARATORS = ",\t;|"
+
+
+def sniff_csv(byte_contents: bytes) -> tuple:
+    """
+    Detect the encoding and the dialect once, from the start of the file.
+    Returns:
+        tuple: (encoding, separator, quote character)
+    """
+    sample = byte_contents[:SNIFF_BYTES]
+    encoding = "utf-8-sig" if sample.startswith(codecs.BOM_UTF8) else "utf-8"
+    try:
+        # the sample may end inside a multi-byte character
+        text = codecs.getincrementaldecoder(encoding)().decode(sample, final=False)
+    except UnicodeDecodeError:
+        encoding = "latin-1"
+        text = sample.decode(encoding)
+    try:
+        dialect = csv.Sniffer().sniff(text, delimiters=CSV_SEPARATORS)
+        return encoding, dialect.delimiter, dialect.quotechar
+    except csv.Error:
+        return encoding, infer_csv_separator_bytes(io.BytesIO(sample)), '"'
+
+
+def iter_csv_chunks(byte_contents: bytes, source: str = "", chunk_rows: int = CSV_CHUNK_ROWS):
+    """Yield the table as DataFrames of at most `chunk_rows` rows, cells read as text."""
+    encoding, separator, quotechar = sniff_csv(byte_contents)
+    supplementary_info_logger.info(
+        "%s | reading as %s, separator %r", source, encoding, separator
+    )
+    yield from pd.read_csv(
+        io.BytesIO(byte_contents),
+        sep=separator,
+        quotechar=quotechar,
+        encoding=encoding,
+        dtype=str,
+        keep_default_na=False,
+        chunksize=chunk_rows,
+    )
+
+
+def iter_csv_records(byte_contents: bytes, source: str = "", chunk_rows: int = CSV_CHUNK_ROWS):
+    """Yield the rows of the table one at a time, as in transform_table."""
+    for chunk in iter_csv_chunks(byte_contents, source, chunk_rows):
+        yield from transform_table(chunk)
+
+
+# Row prefilter: the variant search patterns as one alternation, searched in
+# every cell on its own as check_contents_table does, so "^" anchors at the
+# start of the cell and a row is kept exactly when the search matches a cell.
+ROW_PATTERN = re.compile(
+    "|".join(f"(?:{pattern.pattern})" for pattern in SUPPLEMENTARY_PATTERNS)
+)
+
+
+def has_variant_pattern(record: dict) -> bool:
+    return any(ROW_PATTERN.search(str(value)) for value in record.values())
 
 
 class CSVFormatReader(FormatReader):
@@ -23,47 +92,32 @@ class CSVFormatReader(FormatReader):
     ):
         if not byte_contents:
             return
-        csv_file = io.BytesIO(byte_contents)
-        return self.read(csv_file, type, source)
+        return self.read(byte_contents, type, source)
 
     # def read_from_path(self, path, type=INPUT_TYPE.PATH):
     #     return self.read(path, type)
     #     pass
 
-    def read(self, csv_file, type: INPUT_TYPE, source: str = ""):
+    def read(self, byte_contents: bytes, type: INPUT_TYPE, source: str = ""):
+        """
+        Stream the table in chunks and keep only the rows the variant search can
+        match, plus the first row so the column headers are still searched.
+        """
+        to_save = []
+        number_of_rows = 0
         try:
-            df = pd.read_csv(csv_file)
-        # TODO transform data into a desirable output
-        except UnicodeDecodeError as e:
+            for record in iter_csv_records(byte_contents, source):
+                number_of_rows += 1
+                if number_of_rows == 1 or has_variant_pattern(record):
+                    to_save.append(record)
+        # UnicodeDecodeError: bytes past the sniffed sample in another encoding
+        except (UnicodeDecodeError, pd.errors.ParserError, pd.errors.EmptyDataError) as e:
             supplementary_error_logger.error("%s | %s", source, str(e), exc_info=True)
             return None
-        except pd.errors.ParserError as e:
-            if "Buffer overflow caught" in str(e):
-                supplementary_error_logger.error(
-                    "%s | %s", source, str(e), exc_info=True
-                )
-                return None
-            # if not Buffer overflow error, then try to use a different separator
-            if type == INPUT_TYPE.BYTES:
-                separator = infer_csv_separator_bytes(csv_file)
-                print(e, f"\n{separator=}")
-                try:
-                    df = pd.read_csv(csv_file, sep=separator)
-                except pd.errors.EmptyDataError as e:
-                    supplementary_error_logger.error(
-                        "%s | %s", source, str(e), exc_info=True
-                    )
-                    return None
-                # TODO
-                # what happens if we try read_csv(csv_file, sep = separator)?
-                # catch pandas.errors.EmptyDataError: No columns to parse from file
-            else:
-                supplementary_error_logger.error(
-                    "%s | %s", source, str(e), exc_info=True
-                )
-                return None
-
-        to_save = transform_table(df)
+        supplementary_info_logger.info(
+            "%s | %d of %d rows kept", source, len(to_save), number_of_rows
+        )
+
         if self.save:
             save(
                 get_pmcid(source),
@@ -75,8 +129,6 @@ class CSVFormatReader(FormatReader):
 
 
 def infer_csv_separator_bytes(bytes_contents):
-    CSV_SEPARATORS = [",", "\t", ";", "|"]
-
     # Convert the io.BytesIO object to bytes data
     bytes_data = bytes_contents.getvalue()
 
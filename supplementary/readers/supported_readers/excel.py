@@ -1,86 +1,107 @@
-import io
+import os
 from io import BytesIO
 
 import openpyxl
-import pandas as pd
 import xlrd
 from supplementary.readers.reader_interface import INPUT_TYPE, FormatReader
+from supplementary.readers.supported_readers.csv import ROW_PATTERN
 from supplementary.utils.data_fetching import (
     get_extension,
     get_material_name,
     get_pmcid,
 )
 from supplementary.utils.result_saver import get_output_type, save
-from utils.logging.logging_setup import supplementary_error_logger
+from utils.logging.logging_setup import (
+    supplementary_error_logger,
+    supplementary_info_logger,
+)
 
 MAX_FILE_SIZE = 25000000  # 25 MB
 
-# def check_xlsx(file_bytes):
-#      # Load the workbook from the BytesIO object
-#     workbook = openpyxl.load_workbook(file_bytes, read_only=True)
-#     # Iterate through each sheet
-#     for sheet_name in workbook.sheetnames:
-#         sheet = workbook[sheet_name]
-
-#         # Get the first two rows (header and first data row)
-#         header_row = list(sheet.iter_rows(max_row=1, values_only=True))[0]
-#         first_data_row = list(
-#             sheet.iter_rows(min_row=2, max_row=2, values_only=True)
-#         )[0]
-#         # Compare the number of columns
-#         if len(first_data_row) > len(header_row) or len(first_data_row) > 15_000:
-#             return True  # Problematic file
-#     return False  # File is okay
-
-
-def extract_rows_from_xlsx(file_bytes: bytes):
-    if not hasattr(file_bytes, "read"):  # it's raw bytes
-        file_bytes = BytesIO(file_bytes)
-    workbook = openpyxl.load_workbook(file_bytes, read_only=True)
-    for sheet_name in workbook.sheetnames:
-        sheet = workbook[sheet_name]
-        if sheet.max_row < 2:
-            continue
-        header_row = list(sheet.iter_rows(max_row=1, values_only=True))[0]
-        first_data_row = list(sheet.iter_rows(min_row=2, max_row=2, values_only=True))[
-            0
-        ]
-        yield header_row, first_data_row
-
-
-def extract_rows_from_xls(file_bytes: bytes):
-    if hasattr(file_bytes, "read"):  # i.e. it's a BytesIO or similar
-        file_bytes = file_bytes.read()
-    book = xlrd.open_workbook(file_contents=file_bytes)
-    for sheet in book.sheets():
-        if sheet.nrows < 2:
-            continue
-        header_row = sheet.row_values(0)
-        first_data_row = sheet.row_values(1)
-        yield header_row, first_data_row
-
-
-def check_rows(header_row, first_data_row) -> bool:
-    return len(first_data_row) > len(header_row) or len(first_data_row) > 15_000
-
-
-def is_problematic_file(file_bytes, source):
+# caps on what is read from one workbook, see iter_workbook_rows
+EXCEL_MAX_ROWS = int(os.getenv("EXCEL_MAX_ROWS", 200_000))  # per sheet
+EXCEL_MAX_COLUMNS = int(os.getenv("EXCEL_MAX_COLUMNS", 1_000))  # per row
+EXCEL_MAX_CELLS = int(os.getenv("EXCEL_MAX_CELLS", 5_000_000))  # per workbook
+
+
+def format_cell(value) -> str:
+    if value is None:
+        return ""
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value)
+
+
+def iter_xlsx_sheets(file_bytes: bytes):
+    """Yield (sheet name, rows) with the rows read lazily as tuples of values."""
+    workbook = openpyxl.load_workbook(
+        BytesIO(file_bytes), read_only=True, data_only=True
+    )
+    try:
+        for sheet in workbook.worksheets:
+            # rows are otherwise padded to the stored sheet dimensions, which
+            # some writers set to the full 16384 columns
+            sheet.reset_dimensions()
+            yield sheet.title, sheet.iter_rows(max_row=EXCEL_MAX_ROWS, values_only=True)
+    finally:
+        workbook.close()
+
+
+def iter_xls_sheets(file_bytes: bytes):
+    """Yield (sheet name, rows), loading one sheet at a time."""
+    book = xlrd.open_workbook(file_contents=file_bytes, on_demand=True)
     try:
-        ext = source.split(".")[-1]
-        if ext == "xlsx":
-            data_to_compare = extract_rows_from_xlsx(file_bytes)
-        if ext == "xls":
-            data_to_compare = extract_rows_from_xls(file_bytes)
-        for header_row, first_data_row in data_to_compare:
-            if check_rows(header_row, first_data_row):
-                return True
-        return False
-    except Exception as e:
-        error_message = "Excel file is problematic, to many columns to read."
-        supplementary_error_logger.error(
-            "%s | %s | %s", source, error_message, str(e), exc_info=True
+        for index in range(book.nsheets):
+            sheet = book.sheet_by_index(index)
+            yield sheet.name, _xls_rows(sheet, book.datemode)
+            book.unload_sheet(index)
+    finally:
+        book.release_resources()
+
+
+def _xls_rows(sheet, datemode: int):
+    for row_number in range(min(sheet.nrows, EXCEL_MAX_ROWS)):
+        yield tuple(
+            xlrd.xldate_as_datetime(cell.value, datemode)
+            if cell.ctype == xlrd.XL_CELL_DATE
+            else cell.value
+            for cell in sheet.row_slice(row_number, 0, EXCEL_MAX_COLUMNS)
         )
-        return True  # Treat as problematic if an error occurs
+
+
+def iter_workbook_rows(file_bytes: bytes, source: str):
+    """
+    Stream an .xlsx or .xls workbook as (sheet name, row text) pairs, with the
+    cells of a row joined by tabs and empty rows left out. Reading stops at
+    EXCEL_MAX_ROWS rows per sheet, EXCEL_MAX_COLUMNS cells per row and
+    EXCEL_MAX_CELLS cells per workbook.
+    """
+    sheets = (
+        iter_xls_sheets(file_bytes)
+        if get_extension(source) == "xls"
+        else iter_xlsx_sheets(file_bytes)
+    )
+    cells = 0
+    for sheet_name, rows in sheets:
+        number_of_rows = 0
+        for row in rows:
+            number_of_rows += 1
+            values = [format_cell(value) for value in row[:EXCEL_MAX_COLUMNS]]
+            while values and not values[-1]:
+                values.pop()
+            if not values:
+                continue
+            cells += len(values)
+            yield sheet_name, "\t".join(values)
+            if cells >= EXCEL_MAX_CELLS:
+                supplementary_info_logger.info(
+                    "%s | stopped at %s, %d cells read", source, sheet_name, cells
+                )
+                return
+        if number_of_rows >= EXCEL_MAX_ROWS:
+            supplementary_info_logger.info(
+                "%s | %s: only the first %d rows read", source, sheet_name, EXCEL_MAX_ROWS
+            )
 
 
 class EXCELFormatReader(FormatReader):
@@ -106,33 +127,44 @@ class EXCELFormatReader(FormatReader):
         file_size = len(byte_contents)
         if file_size > MAX_FILE_SIZE:
             error_message = f"FILE TO LARGE -> {file_size=:_}\t {MAX_FILE_SIZE=:_}"
-            supplementary_error_logger.error(
-                "%s | %s | %s", source, error_message, str(e), exc_info=True
-            )
+            supplementary_error_logger.error("%s | %s", source, error_message)
             return None
-        xlsx_file = io.BytesIO(byte_contents)
-        return self.process(xlsx_file, input_type, source)
+        return self.process(byte_contents, input_type, source)
 
     # def read_from_path(self, path, type=INPUT_TYPE.PATH):
     #     # TODO: Implement
     #     # return self.process(doc, type)
     #     pass
 
-    def process(self, excel_file, type: INPUT_TYPE, source: str = ""):
+    def process(self, excel_file: bytes, type: INPUT_TYPE, source: str = ""):
+        """
+        Scan the rows of every sheet as they stream and keep the first row and the
+        rows the variant search can match. No pattern spans a new line, so the
+        kept rows give the search the same matches as the whole sheet.
+        """
         to_save = {}
-        if is_problematic_file(excel_file, source):
-            print(f"Skipping problematic file: {source}")
-            return None
+        number_of_rows = 0
         try:
-            df = pd.read_excel(excel_file, sheet_name=None)
+            for sheet_name, row in iter_workbook_rows(excel_file, source):
+                number_of_rows += 1
+                if sheet_name not in to_save:
+                    to_save[sheet_name] = [row]
+                # in the sheet text every other row follows a new line
+                elif ROW_PATTERN.search("\n" + row):
+                    to_save[sheet_name].append(row)
         except Exception as e:
             error_message = "Error reading the excel file."
             supplementary_error_logger.error(
                 "%s | %s | %s", source, error_message, str(e), exc_info=True
             )
             return None
-        for sheet_name, sheet in df.items():
-            to_save[sheet_name] = sheet.to_string()
+        supplementary_info_logger.info(
+            "%s | %d of %d rows kept",
+            source,
+            sum(len(rows) for rows in to_save.values()),
+            number_of_rows,
+        )
+        to_save = {sheet_name: "\n".join(rows) for sheet_name, rows in to_save.items()}
 
         if self.save:
             save(
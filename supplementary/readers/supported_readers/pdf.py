@@ -1,10 +1,15 @@
 import io
-import multiprocessing
+import os
+import sys
+import threading
+import time
 from tempfile import TemporaryDirectory
 
 import fitz  # imports the pymupdf library
-import pytesseract
-from utils.logging.logging_setup import supplementary_error_logger
+from utils.logging.logging_setup import (
+    supplementary_error_logger,
+    supplementary_info_logger,
+)
 from fitz.fitz import FileDataError
 from PIL import Image
 from supplementary.readers.reader_interface import INPUT_TYPE, FormatReader
@@ -13,9 +18,80 @@ from supplementary.utils.data_fetching import (
     get_material_name,
     get_pmcid,
 )
+from supplementary.utils.ocr_service import image_to_string, ocr_images
+from supplementary.utils.pdf_text_pool import TIMEOUT_TEXT, get_pdf_text_pool
 from supplementary.utils.result_saver import get_output_type, save
 
 
+OCR_DPI = int(os.getenv("PDF_OCR_DPI", 72))  # 72 is the get_pixmap default
+OCR_GRAYSCALE = os.getenv("PDF_OCR_GRAYSCALE", "true").lower() == "true"
+
+# OCR decision policy, see needs_ocr
+# points; images covering less than a square of this side are icons, logos and rules
+OCR_MIN_IMAGE_SIDE = 100
+OCR_TEXT_LAYER_CHARS = 200  # a page with this much text has a real text layer
+OCR_MIN_COVERAGE_WITH_TEXT = 0.3  # share of the page area covered by images
+
+
+class OcrPolicy:
+    """
+    Applies needs_ocr to the pages of documents and keeps running totals of its
+    decisions, for reporting. The files a process reads share one, see
+    get_ocr_policy.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.ocr = 0
+        self.skipped = 0
+        self.ocr_seconds = 0.0
+
+    def select_pages(self, pages, output: dict) -> tuple:
+        """
+        Returns:
+            tuple: ([pages with images to OCR], number of pages with images skipped)
+        """
+        pages_with_images = [page for page in pages if page.get_images()]
+        selected = [
+            page for page in pages_with_images if needs_ocr(page, output[page.number])
+        ]
+        skipped = len(pages_with_images) - len(selected)
+        with self.lock:
+            self.skipped += skipped
+        return selected, skipped
+
+    def add_ocr_time(self, pages: int, seconds: float):
+        with self.lock:
+            self.ocr += pages
+            self.ocr_seconds += seconds
+
+    def average_ocr_seconds(self) -> float:
+        with self.lock:
+            return self.ocr_seconds / self.ocr if self.ocr else 0.0
+
+
+_shared_policy = None
+_shared_policy_lock = threading.Lock()
+
+
+def get_ocr_policy() -> OcrPolicy:
+    global _shared_policy
+    with _shared_policy_lock:
+        if _shared_policy is None:
+            _shared_policy = OcrPolicy()
+        return _shared_policy
+
+
+def _forget_inherited_policy():
+    # the parent's totals stay with the parent
+    global _shared_policy, _shared_policy_lock
+    _shared_policy = None
+    _shared_policy_lock = threading.Lock()
+
+
+os.register_at_fork(after_in_child=_forget_inherited_policy)
+
+
 class PDFFormatReader(FormatReader):
     def read_bytes(
         self,
@@ -34,15 +110,15 @@ class PDFFormatReader(FormatReader):
         except Exception as e:
             supplementary_error_logger.error("%s | %s", source, str(e), exc_info=True)
             return None
-        return self.process(doc, input_type, source)
+        return self.process(doc, input_type, source, doc_bytes=byte_contents)
 
     # def read_from_path(self, path, type=INPUT_TYPE.PATH):
     #     doc = fitz.open(path, filetype="pdf")
     #     return self.process(doc, type)
     #     pass
 
-    def process(self, pdf_file, type: INPUT_TYPE, source: str = ""):
-        to_save = process_pdf(pdf_file, source)
+    def process(self, pdf_file, type: INPUT_TYPE, source: str = "", doc_bytes=None):
+        to_save = process_pdf(pdf_file, source, doc_bytes)
 
         if self.save:
             save(
@@ -54,55 +130,153 @@ class PDFFormatReader(FormatReader):
         return to_save
 
 
-def extract_text(page):
-    return page.get_text()
-
-
-def process_pdf(doc: fitz.fitz.Document, source: str):
-    num_pages = doc.page_count
+def process_pdf(
+    doc: fitz.fitz.Document,
+    source: str,
+    doc_bytes: bytes = None,
+    ocr_policy: OcrPolicy = None,
+):
     pages = doc
-    output = {}
-    timeout_seconds = 15
-
-    for i in range(num_pages):
-        page = doc.load_page(i)
-        text = apply_function_with_timeout(
-            extract_text, page, timeout=timeout_seconds, source=source
-        )
-        output[i] = text
-    if pages_with_images := list(filter(lambda page: page.get_images(), pages)):
+    ocr_policy = ocr_policy or get_ocr_policy()
+    # page text is extracted in the persistent worker pool, which enforces the
+    # per page and per document timeouts
+    if doc_bytes is None:
+        doc_bytes = doc.tobytes()
+    output = get_pdf_text_pool().extract_pages(doc_bytes, doc.page_count, source)
+    pages_with_images, skipped = ocr_policy.select_pages(pages, output)
+    if pages_with_images:
         # print("Pages with images: ", pages_with_images)
-        with TemporaryDirectory() as tempdir:
-            for page in pages_with_images:
-                image_file = f"{tempdir}/page-{page.number}.png"
-                page.get_pixmap().save(image_file)
-                text = str(pytesseract.image_to_string(Image.open(image_file)))
-                text = text.replace("-\n", "")
-                output[page.number] += "\n" + text
+        start_time = time.perf_counter()
+        # pages are rendered as the OCR service asks for them
+        texts = ocr_images(
+            (render_page_image(page) for page in pages_with_images), source
+        )
+        for page, text in zip(pages_with_images, texts):
+            output[page.number] += "\n" + text.replace("-\n", "")
+        ocr_policy.add_ocr_time(len(pages_with_images), time.perf_counter() - start_time)
+        supplementary_info_logger.info(
+            "%s | OCR of %d pages: %.3f seconds per page",
+            source,
+            len(pages_with_images),
+            (time.perf_counter() - start_time) / len(pages_with_images),
+        )
+    if skipped:
+        supplementary_info_logger.info(
+            "%s | OCR skipped on %d pages with images, about %.1f seconds saved",
+            source,
+            skipped,
+            skipped * ocr_policy.average_ocr_seconds(),
+        )
     return output
 
 
-def apply_function_with_timeout(func, page, timeout, source):
-    def target(queue, page):
-        queue.put(func(page))
+def image_coverage(page) -> float:
+    """
+    Share of the page area covered by images. The size filter applies to all of
+    them together, so a page scanned as thin strips counts in full while icons,
+    logos and rules covering less than an OCR_MIN_IMAGE_SIDE square count as none.
+    """
+    page_area = abs(page.rect)
+    if not page_area:
+        return 0.0
+    covered = sum(
+        abs(fitz.Rect(image["bbox"]) & page.rect) for image in page.get_image_info()
+    )
+    if covered < OCR_MIN_IMAGE_SIDE**2:
+        return 0.0
+    return min(covered / page_area, 1.0)
+
 
-    queue = multiprocessing.Queue()
-    process = multiprocessing.Process(target=target, args=(queue, page))
-    process.start()
+def needs_ocr(page, text: str) -> bool:
+    """
+    OCR a page with images only where it can add text: pages without a text layer
+    (scans) that show a real image, and pages with text where images cover a large
+    part of the page (figures and tables embedded as pictures).
+    """
+    coverage = image_coverage(page)
+    if not coverage:
+        return False
+    if text == TIMEOUT_TEXT or len(text.strip()) < OCR_TEXT_LAYER_CHARS:
+        return True
+    return coverage >= OCR_MIN_COVERAGE_WITH_TEXT
 
-    process.join(timeout)
-    if process.is_alive():
-        process.terminate()
-        process.join()
-        supplementary_error_logger.error(
-            f"PDF - {source} | Function - {func.__name__} | Timeout occurred for page {page.number} after {timeout} seconds"
+
+def render_page_image(page, dpi: int = OCR_DPI, grayscale: bool = OCR_GRAYSCALE):
+    """Render a page straight into a PIL image, without encoding it to a file."""
+    pixmap = page.get_pixmap(
+        dpi=dpi, colorspace=fitz.csGRAY if grayscale else fitz.csRGB, alpha=False
+    )
+    return Image.frombytes(
+        "L" if grayscale else "RGB", (pixmap.width, pixmap.height), pixmap.samples
+    )
+
+
+def benchmark_page_ocr(path: str, run_ocr: bool = True):
+    """
+    Compare the time per page of the previous temporary PNG path with
+    render_page_image, on the pages of `path` that have images.
+    """
+    doc = fitz.open(path)
+    pages = [page for page in doc if page.get_images()]
+    if not pages:
+        print("No pages with images")
+        return
+
+    def through_png_file(page):
+        with TemporaryDirectory() as tempdir:
+            image_file = f"{tempdir}/page-{page.number}.png"
+            page.get_pixmap(dpi=OCR_DPI).save(image_file)
+            image = Image.open(image_file)
+            return image_to_string(image) if run_ocr else image.load()
+
+    def in_memory(page):
+        image = render_page_image(page)
+        return image_to_string(image) if run_ocr else image
+
+    for name, function in (("temporary PNG", through_png_file), ("in memory", in_memory)):
+        start_time = time.perf_counter()
+        for page in pages:
+            function(page)
+        print(
+            f"{name:<15}{(time.perf_counter() - start_time) / len(pages) * 1000:>10.1f} ms per page "
+            f"({len(pages)} pages, dpi {OCR_DPI}, ocr {run_ocr})"
         )
-        # print(
-        #     f"PDF - {source} | Function - {func.__name__} | Timeout occurred for page {page.number} after {timeout} seconds"
-        # )
-        return "ERROR - TIMEOUT"
-    return queue.get()
+
+
+def evaluate_ocr_policy(paths: list):
+    """
+    OCR every page with images of the given PDFs and report what needs_ocr would
+    skip: the number of pages, the OCR time saved and the OCR text given up.
+    """
+    totals = {"pages": 0, "skipped": 0, "seconds": 0.0, "skipped_seconds": 0.0}
+    skipped_chars = 0
+    for path in paths:
+        doc = fitz.open(path)
+        for page in doc:
+            if not page.get_images():
+                continue
+            start_time = time.perf_counter()
+            ocr_text = image_to_string(render_page_image(page))
+            seconds = time.perf_counter() - start_time
+            totals["pages"] += 1
+            totals["seconds"] += seconds
+            if not needs_ocr(page, page.get_text()):
+                totals["skipped"] += 1
+                totals["skipped_seconds"] += seconds
+                skipped_chars += len(ocr_text.strip())
+    print(
+        f"{len(paths)} PDFs, {totals['pages']} pages with images, "
+        f"{totals['skipped']} skipped by the policy\n"
+        f"OCR time: {totals['seconds']:.1f} s, saved: {totals['skipped_seconds']:.1f} s "
+        f"({totals['skipped_seconds'] / (totals['seconds'] or 1):.0%})\n"
+        f"OCR characters on skipped pages: {skipped_chars:_}"
+    )
 
 
 if __name__ == "__main__":
-    ...
+    # python -m supplementary.readers.supported_readers.pdf <pdf_path> [--no-ocr]
+    # python -m supplementary.readers.supported_readers.pdf policy <pdf_path> ...
+    if sys.argv[1] == "policy":
+        evaluate_ocr_policy(sys.argv[2:])
+    else:
+        benchmark_page_ocr(sys.argv[1], run_ocr="--no-ocr" not in sys.argv)
@@ -1,8 +1,7 @@
 import io
-import os
-from tempfile import TemporaryDirectory
+from collections import defaultdict
 
-import pytesseract
+import utils.logging.error_templates as error_templates
 from PIL import Image
 from pptx import Presentation
 from pptx.enum.shapes import MSO_SHAPE_TYPE
@@ -14,6 +13,12 @@ from supplementary.utils.data_fetching import (
     get_pmcid,
 )
 from utils.logging.logging_setup import supplementary_error_logger
+from supplementary.utils.libreoffice_service import (
+    ConversionError,
+    ConversionTimeout,
+    get_libreoffice_service,
+)
+from supplementary.utils.ocr_service import ocr_images
 from supplementary.utils.result_saver import get_output_type, save
 
 
@@ -38,25 +43,26 @@ class PPTXFormatReader(FormatReader):
             return None
 
         file_name = "_".join(source.split("/")[-2:])  # PMCid_materialName
-        if (extension := get_extension(source)) == "ppt":
-            with TemporaryDirectory() as tempdir:
-                ppt_file = f"{tempdir}/{file_name}"
-                file_name_no_extension = ppt_file[: -len(extension)]
-                pptx_file = f"{tempdir}/{file_name_no_extension}.pptx"
-                with open(ppt_file, "wb") as f:
-                    f.write(byte_contents)
-                try:
-                    os.system(
-                        f"cd {tempdir} ; libreoffice --headless --convert-to pptx {file_name}"
-                    )
-                    with open(pptx_file, "rb") as f:
-                        pptx_file = io.BytesIO(f.read())
-                except Exception as e:
-                    # TODO: Implement error handling
-                    supplementary_error_logger.error(
-                        "%s | %s", source, str(e), exc_info=True
-                    )
-                    return None
+        if get_extension(source) == "ppt":
+            try:
+                pptx_file = io.BytesIO(
+                    get_libreoffice_service().convert(byte_contents, file_name, "pptx")
+                )
+            except ConversionTimeout:
+                supplementary_error_logger.error(
+                    error_templates.libreoffice_conversion_timeout(source)
+                )
+                return None
+            except ConversionError:
+                supplementary_error_logger.error(
+                    error_templates.libreoffice_conversion_error(source)
+                )
+                return None
+            except Exception as e:
+                supplementary_error_logger.error(
+                    "%s | %s", source, str(e), exc_info=True
+                )
+                return None
         return self.read(pptx_file, type, source)
 
     # def read_from_path(self, path, type=INPUT_TYPE.PATH):
@@ -90,11 +96,25 @@ class PPTXFormatReader(FormatReader):
 
 def process_pptx(presentation: Presentation, source):
     result = {}
+    # images of all slides go to the OCR service as one batch
+    image_slide_numbers = []
+
+    def slide_images():
+        for slide_number, slide in enumerate(presentation.slides):
+            for image in extract_slide_images(slide, source):
+                image_slide_numbers.append(slide_number)
+                yield image
+
+    texts = ocr_images(slide_images(), source)
+    image_texts = defaultdict(str)
+    for slide_number, text in zip(image_slide_numbers, texts):
+        image_texts[slide_number] += "\n" + text.replace("\n", "")
+
     for slide_number, slide in enumerate(presentation.slides):
         result[slide_number] = ""
         # print(f"Slide {slide_number + 1}")
         slide_text = extract_text_from_slide(slide)
-        slide_image_text = extract_text_from_slide_images(slide, source)
+        slide_image_text = image_texts[slide_number]
         slide_table_text = extract_text_from_slide_tables(slide)
         result[slide_number] += (
             slide_text + "\n" + slide_image_text + "\n" + slide_table_text
@@ -123,38 +143,23 @@ def extract_text_from_slide(slide) -> str:
     return result
 
 
-import traceback
-from tempfile import TemporaryDirectory
-
-import pytesseract
-from PIL import Image
-
-
-def extract_text_from_slide_images(slide, source) -> str:
-    result = ""
+def extract_slide_images(slide, source) -> list:
+    """Decoded images of a slide, in the formats tesseract reads."""
+    images = []
+    supported_formats = {"jpeg", "png", "tiff"}
     for slide_shape in slide.shapes:
         try:
             if img := slide_shape._element.xpath(".//p:blipFill/a:blip/@r:embed"):
-                with TemporaryDirectory() as tempdir:
-                    supported_formats = {"jpeg", "png", "tiff"}
-                    img_part = slide_shape.part.related_part(img[0])
-                    image_bytes = img_part.blob
-                    image_format = img_part.content_type.split("/")[-1]
-                    if image_format not in supported_formats:
-                        continue
-                    image_filename = f"{tempdir}/extracted_image.{image_format}"
-                    with open(image_filename, "wb") as img_file:
-                        img_file.write(image_bytes)
-                    # Convert image to a more stable format if necessary
-                    with Image.open(image_filename) as img:
-                        converted_filename = f"{tempdir}/converted_image.png"
-                        img.save(converted_filename)
-                    result += "\n" + str(
-                        pytesseract.image_to_string(Image.open(converted_filename))
-                    ).replace("\n", "")
+                img_part = slide_shape.part.related_part(img[0])
+                image_format = img_part.content_type.split("/")[-1]
+                if image_format not in supported_formats:
+                    continue
+                image = Image.open(io.BytesIO(img_part.blob))
+                image.load()
+                images.append(image)
         except Exception as e:
             supplementary_error_logger.error("%s | %s", source, str(e), exc_info=True)
-    return result
+    return images
 
 
 if __name__ == "__main__":
@@ -1,10 +1,9 @@
 import json
 import utils.logging.error_templates as error_templates
 from .test_interface import Test
-from utils.logging.logging_setup import (
-    supplementary_error_logger,
-    supplementary_info_logger,
-)
+from ..readers.readers import get_reader
+from ..utils.article_executor import ArticleExecutor
+from utils.logging.logging_setup import supplementary_info_logger
 from .tests import (
     CSVTest,
     DOCTest,
@@ -46,14 +45,18 @@ def SUPPORTED_TESTS():
 
 
 def run_on_all_from_dict(pmc_id: str, pmc_dict: dict[str, list[str]], output_dir: str):
-    info_message = error_templates.started_info(pmc_id)
-    supplementary_info_logger.info(info_message)
+    run_on_all_from_dict_and_return(pmc_id, pmc_dict, output_dir)
+
+
+def run_on_all_from_dict_and_return(
+    pmc_id: str, pmc_dict: dict[str, list[str]], output_dir: str | None = None
+) -> dict[str, dict[str, str | list[str]]]:
     # filter out the keys that are not supported
     pmc_dict = {
         k: v for k, v in pmc_dict.items() if k.upper() in SUPPORTED_TESTS().keys()
     }
-    saved_files = []
-    not_saved_files = []
+    # every file is one job of the article executor, keyed as in the results
+    jobs = {}
     for extension, files in pmc_dict.items():
         current_test = Test(
             f"{pmc_id}_{extension}",
@@ -62,68 +65,54 @@ def run_on_all_from_dict(pmc_id: str, pmc_dict: dict[str, list[str]], output_dir
         )
         for file in files:
             filename = file.split("/")[-1][: -len(extension) - 1]
-            # print("Running test on\t", filename)
-            try:
-                result = current_test.run_test([file])
-            except Exception as e:
-                source = f"{pmc_id}_{filename}_{extension}"
-                supplementary_error_logger.error(
-                    "%s | %s", source, str(e), exc_info=True
-                )
-            if result:
-                saved_files.append(f"{pmc_id}_{filename}_{extension}")
-                with open(
-                    f"{output_dir}/{pmc_id}_{filename}_{extension}.json", "w"
-                ) as f:
-                    json.dump(result, f)
-            else:
-                not_saved_files.append(f"{pmc_id}_{filename}_{extension}")
-    info_message = error_templates.ended_info(pmc_id)
-    supplementary_info_logger.info(info_message)
-    info_message = error_templates.saved_vs_not_saved_info(
-        pmc_id, saved_files, not_saved_files
-    )
-    supplementary_info_logger.info(info_message)
+            jobs[f"{pmc_id}_{filename}_{extension}"] = (current_test.run_test, ([file],))
+    return run_jobs_and_return(pmc_id, jobs, output_dir)
 
 
-def run_on_all_from_dict_and_return(
-    pmc_id: str, pmc_dict: dict[str, list[str]], output_dir: str | None = None
+def run_on_all_from_bytes_and_return(
+    pmc_id: str,
+    pmc_dict: dict[str, list[tuple[str, bytes]]],
+    output_dir: str | None = None,
 ) -> dict[str, dict[str, str | list[str]]]:
-    info_message = error_templates.started_info(pmc_id)
-    supplementary_info_logger.info(info_message)
-    # filter out the keys that are not supported
+    """
+    As run_on_all_from_dict_and_return, for files already in memory, e.g. read
+    from a streamed package: {extension: [(file name, contents), ...]}
+    """
     pmc_dict = {
         k: v for k, v in pmc_dict.items() if k.upper() in SUPPORTED_TESTS().keys()
     }
+    jobs = {}
+    for extension, files in pmc_dict.items():
+        reader = get_reader(extension)
+        for name, contents in files:
+            filename = name[: -len(extension) - 1]
+            jobs[f"{pmc_id}_{filename}_{extension}"] = (
+                reader.read_bytes,
+                (contents, f"{pmc_id}/{name}"),
+            )
+    return run_jobs_and_return(pmc_id, jobs, output_dir)
+
+
+def run_jobs_and_return(
+    pmc_id: str, jobs: dict, output_dir: str | None = None
+) -> dict[str, dict[str, str | list[str]]]:
+    info_message = error_templates.started_info(pmc_id)
+    supplementary_info_logger.info(info_message)
+    results = ArticleExecutor().run(jobs, pmc_id)
+
     saved_files = []
     not_saved_files = []
     result_dict = {}
-    for extension, files in pmc_dict.items():
-        current_test = Test(
-            f"{pmc_id}_{extension}",
-            extension=extension,
-            is_pipeline_preprocessing=True,
-        )
-        for file in files:
-            filename = file.split("/")[-1][: -len(extension) - 1]
-            # print("Running test on\t", filename)
-            try:
-                result = current_test.run_test([file])
-            except Exception as e:
-                source = f"{pmc_id}_{filename}_{extension}"
-                supplementary_error_logger.error(
-                    "%s | %s", source, str(e), exc_info=True
-                )
-            if result:
-                result_dict[f"{pmc_id}_{filename}_{extension}"] = result
-                saved_files.append(f"{pmc_id}_{filename}_{extension}")
-                if output_dir:
-                    with open(
-                        f"{output_dir}/{pmc_id}_{filename}_{extension}.json", "w"
-                    ) as f:
-                        json.dump(result, f)
-            else:
-                not_saved_files.append(f"{pmc_id}_{filename}_{extension}")
+    for key in jobs:
+        result = results.get(key)
+        if result:
+            result_dict[key] = result
+            saved_files.append(key)
+            if output_dir:
+                with open(f"{output_dir}/{key}.json", "w") as f:
+                    json.dump(result, f)
+        else:
+            not_saved_files.append(key)
     info_message = error_templates.ended_info(pmc_id)
     supplementary_info_logger.info(info_message)
     info_message = error_templates.saved_vs_not_saved_info(
@@ -6,55 +6,67 @@ import sys
 import tarfile
 import tempfile
 import traceback
-import urllib.request
-import xml.etree.ElementTree as ET
 from collections import defaultdict
 
 import requests
-from requests.adapters import HTTPAdapter
-from requests.packages.urllib3.util.retry import Retry
 
-from .dynamic_test import run_on_all_from_dict, run_on_all_from_dict_and_return
-
-
-def group_files(directory: str) -> dict[str, list[str]]:
-    def find_matching_files(file_list) -> list[str]:
-        base_names = {}
-        for file in file_list:
-            base_name = ".".join(file.split(".")[:-1])
-            ext = file.split(".")[-1]
-            if base_name in base_names:
-                base_names[base_name].append(ext)
-            else:
-                base_names[base_name] = [ext]
+from utils.oa_downloader import get_oa_downloader
+from utils.oa_links import get_oa_link_resolver
+
+from .dynamic_test import (
+    SUPPORTED_TESTS,
+    run_on_all_from_bytes_and_return,
+    run_on_all_from_dict,
+    run_on_all_from_dict_and_return,
+)
+
+# read OA packages as a stream instead of downloading and unpacking them
+STREAMING = os.getenv("SUPPLEMENTARY_STREAMING", "true").lower() == "true"
+
+
+def find_article_files(file_list) -> list[str]:
+    """
+    The article itself (its .pdf and .nxml) among the files of an OA package,
+    which are not supplementary material.
+    """
+    base_names = {}
+    for file in file_list:
+        base_name = ".".join(file.split(".")[:-1])
+        ext = file.split(".")[-1]
+        if base_name in base_names:
+            base_names[base_name].append(ext)
+        else:
+            base_names[base_name] = [ext]
+    try:
+        matching_files = {
+            k: v for k, v in base_names.items() if "nxml" in v and "pdf" in v
+        }
+        file_base_name = list(matching_files.keys())[0]
+        return [
+            file_base_name + ".pdf",
+            file_base_name + ".nxml",
+        ]
+    except IndexError:
+        """
+        No matching pdf and nxml found (one or more is missing)
+        """
         try:
-            matching_files = {
-                k: v for k, v in base_names.items() if "nxml" in v and "pdf" in v
-            }
-            file_base_name = list(matching_files.keys())[0]
-            return [
-                file_base_name + ".pdf",
-                file_base_name + ".nxml",
-            ]
+            matching_file = {k: v for k, v in base_names.items() if "nxml" in v}
+            file_base_name = list(matching_file.keys())[0]
+            return [file_base_name + ".nxml"]
         except IndexError:
             """
-            No matching pdf and nxml found (one or more is missing)
+            No nxml found
             """
-            try:
-                matching_file = {k: v for k, v in base_names.items() if "nxml" in v}
-                file_base_name = list(matching_file.keys())[0]
-                return [file_base_name + ".nxml"]
-            except IndexError:
-                """
-                No nxml found
-                """
-
-                matching_file = {k: v for k, v in base_names.items() if "pdf" in v}
-                file_base_name = list(matching_file.keys())[0]
-                return [file_base_name + ".pdf"]
 
+            matching_file = {k: v for k, v in base_names.items() if "pdf" in v}
+            file_base_name = list(matching_file.keys())[0]
+            return [file_base_name + ".pdf"]
+
+
+def group_files(directory: str) -> dict[str, list[str]]:
     file_list = os.listdir(directory)
-    files_to_exclude = find_matching_files(file_list)
+    files_to_exclude = find_article_files(file_list)
     for file in files_to_exclude:
         file_list.remove(file)
     grouped_files = defaultdict(list)
@@ -63,51 +75,77 @@ def group_files(directory: str) -> dict[str, list[str]]:
     return grouped_files
 
 
-def download_supplementary_tar_gz(pmc_id: str, directory: str) -> bool:
-    NUMBER_OF_RETRIES = 5
-    DELAY = 120  # seconds
-    session = requests.Session()
-    retries = Retry(
-        total=NUMBER_OF_RETRIES,
-        backoff_factor=DELAY,
-        status_forcelist=[500, 502, 503, 504],
-    )
-    session.mount("https://", HTTPAdapter(max_retries=retries))
-
-    url = f"https://www.ncbi.nlm.nih.gov/pmc/utils/oa/oa.fcgi?id={pmc_id}"
-    response = session.get(url, timeout=60)
-    if response.status_code != 200:
-        print(f"Failed to download {pmc_id} - {response.status_code}")
-        return False
-    root = ET.fromstring(response.text)
-    link_element = root.find(".//link[@format='tgz']")
+def stream_supplementary_tar_gz(pmc_id: str) -> dict[str, list[tuple[str, bytes]]] | None:
+    """
+    Read the OA package of an article as a stream, without writing it to disk.
+    Only members with a supported extension directly in the package's folder are
+    read, the files group_files sees. The article's own pdf and nxml are left
+    out as in group_files: a pdf named like an nxml seen before it is never read,
+    and one read before its nxml is dropped when the nxml arrives.
+
+    Returns
+    -------
+    dict[str, list[tuple[str, bytes]]] | None
+        {extension: [(file name, contents), ...]}, None if there is no package
+    """
+    tgz_link = get_tgz_link(pmc_id)
+    if not tgz_link:
+        return None
+    supported = {extension.lower() for extension in SUPPORTED_TESTS()}
+    file_list = []
+    nxml_base_names = set()
+    members = []
+    pdfs = defaultdict(list)  # {base name: [(file name, contents), ...]}
+    with get_oa_downloader().stream(tgz_link) as response:
+        try:
+            response.raise_for_status()
+        except requests.HTTPError:
+            # e.g. a package moved since its link was cached
+            get_oa_link_resolver().invalidate(pmc_id)
+            raise
+        with tarfile.open(fileobj=response.raw, mode="r|gz") as tar:
+            for member in tar:
+                folder, _, name = member.name.partition("/")
+                if not member.isfile() or folder != pmc_id or "/" in name:
+                    continue
+                file_list.append(name)
+                base_name, _, extension = name.rpartition(".")
+                extension = extension.lower()
+                if extension == "nxml":
+                    nxml_base_names.add(base_name)
+                    pdfs.pop(base_name, None)  # the article's own pdf
+                elif extension == "pdf":
+                    if base_name not in nxml_base_names:
+                        pdfs[base_name].append((name, tar.extractfile(member).read()))
+                # unsupported members are skipped, never extracted
+                elif extension in supported:
+                    members.append((name, tar.extractfile(member).read()))
+    for read_pdfs in pdfs.values():
+        members.extend(read_pdfs)
     try:
-        tgz_link = link_element.get("href").replace("ftp://", "https://")
-    except AttributeError:
-        print(f"Failed to download {pmc_id} - No link found")
-        return False
-    file_path = os.path.join(directory, f"{pmc_id}.tar.gz")
-    urllib.request.urlretrieve(tgz_link, file_path)
-    return True
+        files_to_exclude = find_article_files(file_list)
+    except IndexError:
+        files_to_exclude = []
+    grouped_files = defaultdict(list)
+    for name, contents in members:
+        if name not in files_to_exclude:
+            grouped_files[name.split(".")[-1].lower()].append((name, contents))
+    return grouped_files
 
 
-def download_supplementary_tar_gz_no_retries(pmc_id: str, directory: str) -> bool:
-    api_url = f"https://www.ncbi.nlm.nih.gov/pmc/utils/oa/oa.fcgi?id={pmc_id}"
-    response = requests.get(api_url)
-    if response.status_code != 200:
-        print(f"Failed to download {pmc_id} - {response.status_code}")
+def get_tgz_link(pmc_id: str) -> str | None:
+    return get_oa_link_resolver().resolve(pmc_id)
 
-        return False
-    root = ET.fromstring(response.text)
-    link_element = root.find(".//link[@format='tgz']")
-    try:
-        tgz_link = link_element.get("href").replace("ftp://", "https://")
-    except AttributeError:
-        print(f"Failed to download {pmc_id} - No link found")
+
+def download_supplementary_tar_gz(pmc_id: str, directory: str) -> bool:
+    tgz_link = get_tgz_link(pmc_id)
+    if not tgz_link:
         return False
     file_path = os.path.join(directory, f"{pmc_id}.tar.gz")
-    urllib.request.urlretrieve(tgz_link, file_path)
-    return True
+    if get_oa_downloader().download(tgz_link, file_path):
+        return True
+    get_oa_link_resolver().invalidate(pmc_id)
+    return False
 
 
 def unpack_tar_gz(file_path: str, directory: str) -> None:
@@ -116,26 +154,41 @@ def unpack_tar_gz(file_path: str, directory: str) -> None:
 
 
 def parse_and_save_supplementary_for_pmc_id(
-    pmc_id: str, output_directory_root: str
+    pmc_id: str, output_directory_root: str, streaming: bool = STREAMING
 ) -> None:
     with tempfile.TemporaryDirectory() as directory:
-        if download_supplementary_tar_gz(pmc_id, directory):
-            # unpack tar.gz
-            # tempfile_save_directory = f"{directory}/{pmc_id}/parsed_supplementary/"
-            tempfile_save_directory = os.path.join(
-                directory, pmc_id, "parsed_supplementary"
+        # tempfile_save_directory = f"{directory}/{pmc_id}/parsed_supplementary/"
+        tempfile_save_directory = os.path.join(
+            directory, pmc_id, "parsed_supplementary"
+        )
+        output_directory = os.path.join(output_directory_root, pmc_id)
+        if streaming:
+            grouped_files = stream_supplementary_tar_gz(pmc_id)
+            if grouped_files is None:
+                return
+            os.makedirs(tempfile_save_directory, exist_ok=True)
+            run_on_all_from_bytes_and_return(
+                pmc_id, grouped_files, tempfile_save_directory
             )
-            output_directory = os.path.join(output_directory_root, pmc_id)
+        elif download_supplementary_tar_gz(pmc_id, directory):
+            # unpack tar.gz
             unpack_tar_gz(f"{directory}/{pmc_id}.tar.gz", f"{directory}/{pmc_id}")
             grouped_files = group_files(f"{directory}/{pmc_id}/{pmc_id}/")
             os.makedirs(tempfile_save_directory, exist_ok=True)
             run_on_all_from_dict(pmc_id, grouped_files, tempfile_save_directory)
-            print(os.listdir(tempfile_save_directory))
-            os.makedirs(output_directory_root, exist_ok=True)
-            shutil.copytree(tempfile_save_directory, output_directory)
+        else:
+            return
+        print(os.listdir(tempfile_save_directory))
+        os.makedirs(output_directory_root, exist_ok=True)
+        shutil.copytree(tempfile_save_directory, output_directory)
 
 
-def parse_supplementary_for_pmc_id(pmc_id: str) -> None:
+def parse_supplementary_for_pmc_id(pmc_id: str, streaming: bool = STREAMING) -> None:
+    if streaming:
+        grouped_files = stream_supplementary_tar_gz(pmc_id)
+        if grouped_files is not None:
+            return run_on_all_from_bytes_and_return(pmc_id, grouped_files)
+        return
     with tempfile.TemporaryDirectory() as directory:
         if download_supplementary_tar_gz(pmc_id, directory):
             unpack_tar_gz(f"{directory}/{pmc_id}.tar.gz", f"{directory}/{pmc_id}")
@@ -347,6 +400,10 @@ def run_on_pmc_list_from_var_gen_dis_file(
                 pass
 
     # pmc_list = [pmc_list[0]]
+    # one batched lookup per OA_LOOKUP_BATCH_SIZE IDs instead of one per article
+    resolver = get_oa_link_resolver()
+    resolver.resolve_many(pmc_list)
+    print(resolver.stats())
     with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
         executor.map(
             wrapper,
@@ -0,0 +1,277 @@
+import atexit
+import multiprocessing
+import os
+import queue
+import resource
+import signal
+import threading
+import time
+import traceback
+from multiprocessing.connection import wait
+
+from supplementary.utils.libreoffice_service import close_libreoffice_service
+from supplementary.utils.ocr_service import close_ocr_service
+from utils.logging.logging_setup import (
+    supplementary_error_logger,
+    supplementary_info_logger,
+)
+
+# file worker processes shared by all articles of a process
+FILE_WORKERS = int(
+    os.getenv("SUPPLEMENTARY_FILE_WORKERS", min(4, os.cpu_count() or 1))
+)
+FILE_TIMEOUT = int(os.getenv("SUPPLEMENTARY_FILE_TIMEOUT", 60 * 10))  # seconds
+ARTICLE_TIMEOUT = int(os.getenv("SUPPLEMENTARY_ARTICLE_TIMEOUT", 60 * 30))  # seconds
+# address space of every process a file worker starts (RLIMIT_AS), 0 for no limit
+FILE_MEMORY_LIMIT = int(os.getenv("SUPPLEMENTARY_FILE_MEMORY_LIMIT", 8 * 1024**3))
+KILL_GRACE = 5  # seconds a killed worker gets to stop its LibreOffice processes
+
+
+def _stop(signum, frame):
+    # unwinds the worker, so the finally block below stops LibreOffice
+    raise SystemExit(128 + signum)
+
+
+def _default_stop():
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+
+
+def _worker_loop(connection, memory_limit: int):
+    # own process group, so a killed worker takes everything it started along
+    os.setpgrp()
+    signal.signal(signal.SIGTERM, _stop)
+    # processes the jobs start, e.g. PDF text workers, keep the default
+    os.register_at_fork(after_in_child=_default_stop)
+    if memory_limit:
+        resource.setrlimit(resource.RLIMIT_AS, (memory_limit, memory_limit))
+    try:
+        while True:
+            request = connection.recv()
+            if request is None:
+                return
+            function, args = request
+            try:
+                connection.send(("result", function(*args)))
+            except MemoryError:
+                connection.send(("memory", f"memory limit of {memory_limit:_} bytes exceeded"))
+            except Exception:
+                connection.send(("error", traceback.format_exc()))
+    finally:
+        # LibreOffice runs in its own sessions, outside the process group
+        close_libreoffice_service()
+        # atexit does not run in worker processes; this logs the OCR cache stats
+        close_ocr_service()
+        connection.close()
+
+
+class FileWorker:
+    """A child process running file jobs sent over a pipe, one at a time."""
+
+    def __init__(self, context, memory_limit: int):
+        self.connection, child_connection = context.Pipe()
+        # not a daemon, daemons can not start the PDF text workers
+        self.process = context.Process(
+            target=_worker_loop, args=(child_connection, memory_limit)
+        )
+        self.process.start()
+        child_connection.close()
+
+    def kill(self):
+        try:
+            os.killpg(self.process.pid, signal.SIGTERM)
+            self.process.join(KILL_GRACE)
+            os.killpg(self.process.pid, signal.SIGKILL)
+        except ProcessLookupError:
+            # exited, or killed before it had its own process group
+            self.process.kill()
+        self.process.join()
+        self.connection.close()
+
+    def stop(self):
+        try:
+            self.connection.send(None)
+            self.process.join(KILL_GRACE)
+        except OSError:
+            pass
+        self.kill()
+
+
+class FileWorkerPool:
+    """
+    Long-lived processes running the supplementary files of all articles of a
+    process, so the OCR, PDF text and LibreOffice services of every worker last
+    between files and no more than `size` files run at a time.
+
+    Workers start from a fork server, not from a parent with live threads, so
+    jobs, their arguments and their results must pickle, and scripts using the
+    pool need the `if __name__ == "__main__":` guard. A worker killed for a
+    time limit, one that exceeded `memory_limit` and one that died is replaced.
+    """
+
+    def __init__(self, size: int = FILE_WORKERS, memory_limit: int = FILE_MEMORY_LIMIT):
+        self.size = size
+        self.memory_limit = memory_limit
+        self.context = multiprocessing.get_context("forkserver")
+        self.idle = queue.Queue()
+        self.started = 0
+        self.replaced = 0
+        self.lock = threading.Lock()
+
+    def acquire(self, timeout: float = None) -> FileWorker | None:
+        """A free worker, None if none frees up within `timeout` seconds."""
+        with self.lock:
+            start = self.idle.empty() and self.started < self.size
+            if start:
+                self.started += 1
+        if start:
+            return FileWorker(self.context, self.memory_limit)
+        try:
+            worker = self.idle.get(timeout=timeout)
+        except queue.Empty:
+            return None
+        if not worker.process.is_alive():
+            worker = self.replace(worker)
+        return worker
+
+    def replace(self, worker: FileWorker) -> FileWorker:
+        worker.kill()
+        self.replaced += 1
+        return FileWorker(self.context, self.memory_limit)
+
+    def release(self, worker: FileWorker):
+        if not worker.process.is_alive():
+            worker = self.replace(worker)
+        self.idle.put(worker)
+
+    def close(self):
+        while True:
+            try:
+                self.idle.get_nowait().stop()
+            except queue.Empty:
+                return
+
+
+_shared_pool = None
+_shared_pool_lock = threading.Lock()
+
+
+def get_file_worker_pool() -> FileWorkerPool:
+    global _shared_pool
+    with _shared_pool_lock:
+        if _shared_pool is None:
+            _shared_pool = FileWorkerPool()
+            atexit.register(_shared_pool.close)
+        return _shared_pool
+
+
+def _forget_inherited_pool():
+    # workers of a forked parent are not children of this process
+    global _shared_pool, _shared_pool_lock
+    _shared_pool = None
+    _shared_pool_lock = threading.Lock()
+
+
+os.register_at_fork(after_in_child=_forget_inherited_pool)
+
+
+class ArticleExecutor:
+    """
+    Runs the supplementary files of one article concurrently on the shared
+    FileWorkerPool, with a time limit per file and per article.
+
+    At most `workers` files of the article run at a time. A file still running
+    after `file_timeout` is killed with its worker, together with the processes
+    it started. When `article_timeout` runs out the running files are killed
+    and the ones not started yet are cancelled. Failed, killed and cancelled
+    files are logged and left out of the results.
+    """
+
+    def __init__(
+        self,
+        workers: int = FILE_WORKERS,
+        file_timeout: float = FILE_TIMEOUT,
+        article_timeout: float = ARTICLE_TIMEOUT,
+        pool: FileWorkerPool = None,
+    ):
+        self.workers = workers
+        self.file_timeout = file_timeout
+        self.article_timeout = article_timeout
+        self.pool = pool or get_file_worker_pool()
+
+    def run(self, jobs: dict, source: str = "") -> dict:
+        """
+        Parameters
+        ----------
+        jobs : dict
+            {key: (function, args)}, every job is one file
+        source : str
+            Name used in the logs, e.g. the PMC ID
+
+        Returns
+        -------
+        dict
+            {key: result} for the jobs that finished without an error
+        """
+        results = {}
+        pending = list(jobs.items())
+        running = {}  # connection -> (key, worker, start time, deadline)
+        article_deadline = time.monotonic() + self.article_timeout
+        try:
+            while pending or running:
+                if pending and time.monotonic() >= article_deadline:
+                    supplementary_error_logger.error(
+                        "%s | article timeout after %d seconds, cancelled: %s",
+                        source,
+                        self.article_timeout,
+                        ", ".join(key for key, _ in pending),
+                    )
+                    pending = []
+                while pending and len(running) < self.workers:
+                    # wait for a free worker only while none of these files run
+                    timeout = 0 if running else max(0, article_deadline - time.monotonic())
+                    worker = self.pool.acquire(timeout)
+                    if worker is None:
+                        break
+                    key, (function, args) = pending.pop(0)
+                    try:
+                        worker.connection.send((function, args))
+                    except Exception:
+                        # e.g. a job that does not pickle
+                        self.pool.release(worker)
+                        supplementary_error_logger.error("%s | %s", key, traceback.format_exc())
+                        continue
+                    now = time.monotonic()
+                    deadline = min(now + self.file_timeout, article_deadline)
+                    running[worker.connection] = (key, worker, now, deadline)
+                if not running:
+                    continue
+                timeout = min(deadline for *_, deadline in running.values())
+                for connection in wait(list(running), max(0, timeout - time.monotonic())):
+                    key, worker, start_time, _ = running.pop(connection)
+                    try:
+                        kind, value = connection.recv()
+                    except (EOFError, OSError):
+                        worker.process.join()
+                        kind, value = "error", f"exited with code {worker.process.exitcode}"
+                    if kind == "memory":
+                        worker = self.pool.replace(worker)
+                    self.pool.release(worker)
+                    if kind == "result":
+                        results[key] = value
+                        supplementary_info_logger.info(
+                            "%s | done in %.2f seconds", key, time.monotonic() - start_time
+                        )
+                    else:
+                        supplementary_error_logger.error("%s | %s", key, value)
+                now = time.monotonic()
+                for connection, (key, worker, start_time, deadline) in list(running.items()):
+                    if deadline <= now:
+                        del running[connection]
+                        self.pool.release(self.pool.replace(worker))
+                        supplementary_error_logger.error(
+                            "%s | killed after %.0f seconds", key, now - start_time
+                        )
+        finally:
+            for key, worker, *_ in running.values():
+                self.pool.release(self.pool.replace(worker))
+        return results
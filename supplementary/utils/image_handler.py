@@ -1,10 +1,10 @@
 import io
 import re
 
-import pytesseract
 from PIL import Image
 from utils.logging.logging_setup import supplementary_error_logger
 import supplementary.utils.data_fetching as data_fetching
+from supplementary.utils.ocr_service import get_ocr_service
 
 Image.MAX_IMAGE_PIXELS = 933_120_000
 MAX_IMAGE_SIZE = 50_000_000  # 50 MB
@@ -16,9 +16,8 @@ def ocr_extract_text(image_file, source: str):
         supplementary_error_logger.error("%s | %s", source, error_message)
 
         return None
-    text = str(
-        pytesseract.image_to_string(Image.open(io.BytesIO(image_file)).convert("L"))
-    )
+    image = Image.open(io.BytesIO(image_file)).convert("L")
+    text = get_ocr_service().submit(image).result()
     text = text.replace("\n", " ")
     text = re.sub(" +", " ", text)
     return text
@@ -0,0 +1,299 @@
+import atexit
+import fcntl
+import importlib.util
+import os
+import queue
+import shutil
+import signal
+import socket
+import subprocess
+import tempfile
+import threading
+import time
+
+from utils.logging.logging_setup import (
+    supplementary_error_logger,
+    supplementary_info_logger,
+)
+
+try:
+    from unoserver.client import UnoClient
+except ImportError:  # in requirements.txt; without it every job starts soffice
+    UnoClient = None
+
+LIBREOFFICE_EXECUTABLE = os.getenv("LIBREOFFICE_EXECUTABLE", "libreoffice")
+LIBREOFFICE_INSTANCES = int(os.getenv("LIBREOFFICE_INSTANCES", 2))
+LIBREOFFICE_TIMEOUT = 60 * 5  # 5 minutes per conversion
+SERVER_START_TIMEOUT = 60  # seconds for a new soffice instance to accept jobs
+# profiles survive between runs, so LibreOffice initializes them only once
+LIBREOFFICE_PROFILES_DIR = os.getenv(
+    "LIBREOFFICE_PROFILES_DIR",
+    os.path.join(tempfile.gettempdir(), "libreoffice_profiles"),
+)
+
+
+class ConversionError(Exception):
+    pass
+
+
+class ConversionTimeout(ConversionError):
+    pass
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _kill_process_group(process: subprocess.Popen):
+    try:
+        os.killpg(process.pid, signal.SIGKILL)
+    except ProcessLookupError:
+        pass
+    process.wait()
+
+
+class LibreOfficeInstance:
+    """
+    One conversion slot with its own LibreOffice profile directory, so instances
+    never fight over a profile lock.
+
+    With unoserver installed the slot keeps a headless soffice running behind an
+    unoserver and sends jobs to it. The unoserver command also needs the
+    LibreOffice Python bindings (`uno`, e.g. the python3-uno package). Without
+    them, or when the server does not start, every job starts
+    `soffice --headless --convert-to` on the slot's profile.
+    """
+
+    def __init__(self, number: int, use_unoserver: bool):
+        self.number = number
+        self.use_unoserver = use_unoserver
+        self.profile_dir, self.profile_lock = self._lock_profile()
+        self.server = None
+        self.port = None
+        self.restarts = 0
+
+    @staticmethod
+    def _lock_profile():
+        # take the first profile no other live instance (in any process) holds
+        os.makedirs(LIBREOFFICE_PROFILES_DIR, exist_ok=True)
+        slot = 0
+        while True:
+            profile_dir = os.path.join(LIBREOFFICE_PROFILES_DIR, f"slot{slot}")
+            lock = open(f"{profile_dir}.lock", "w")
+            try:
+                fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                lock.close()
+                slot += 1
+                continue
+            os.makedirs(profile_dir, exist_ok=True)
+            return profile_dir, lock
+
+    def _start_server(self):
+        self.port = _free_port()
+        self.server = subprocess.Popen(
+            [
+                "unoserver",
+                "--port",
+                str(self.port),
+                "--uno-port",
+                str(_free_port()),
+                "--executable",
+                LIBREOFFICE_EXECUTABLE,
+                "--user-installation",
+                self.profile_dir,
+            ],
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+            start_new_session=True,
+        )
+        deadline = time.monotonic() + SERVER_START_TIMEOUT
+        while time.monotonic() < deadline:
+            if self.server.poll() is not None:
+                break
+            try:
+                with socket.create_connection(("127.0.0.1", self.port), timeout=1):
+                    return
+            except OSError:
+                time.sleep(0.5)
+        self.stop()
+        raise ConversionError(f"LibreOffice instance {self.number} did not start")
+
+    def _ensure_server(self):
+        if self.server is not None and self.server.poll() is None:
+            return
+        if self.server is not None:
+            self.restarts += 1
+            supplementary_info_logger.info(
+                "LibreOffice instance %d exited, restarting", self.number
+            )
+        self._start_server()
+
+    def stop(self):
+        if self.server is not None:
+            _kill_process_group(self.server)
+            self.server = None
+
+    def convert(self, byte_contents: bytes, file_name: str, convert_to: str, timeout: float) -> bytes:
+        if self.use_unoserver:
+            try:
+                self._ensure_server()
+            except ConversionError as e:
+                supplementary_error_logger.error(
+                    "LibreOffice instance %d: %s, converting with soffice from now on",
+                    self.number,
+                    str(e),
+                )
+                self.use_unoserver = False
+        if self.use_unoserver:
+            return self._convert_with_server(byte_contents, convert_to, timeout)
+        return self._convert_with_soffice(byte_contents, file_name, convert_to, timeout)
+
+    def _convert_with_server(self, byte_contents: bytes, convert_to: str, timeout: float) -> bytes:
+        result = {}
+
+        def run():
+            try:
+                result["data"] = UnoClient(port=str(self.port)).convert(
+                    indata=byte_contents, convert_to=convert_to
+                )
+            except Exception as e:
+                result["error"] = e
+
+        thread = threading.Thread(target=run, daemon=True)
+        thread.start()
+        thread.join(timeout)
+        if thread.is_alive():
+            # the job is stuck in soffice; a restart is the only way to stop it
+            self.stop()
+            raise ConversionTimeout(f"conversion to {convert_to} timed out")
+        if "error" in result:
+            if self.server.poll() is not None:
+                self.stop()
+            raise ConversionError(str(result["error"]))
+        return result["data"]
+
+    def _convert_with_soffice(
+        self, byte_contents: bytes, file_name: str, convert_to: str, timeout: float
+    ) -> bytes:
+        with tempfile.TemporaryDirectory() as tempdir:
+            input_path = os.path.join(tempdir, file_name)
+            with open(input_path, "wb") as f:
+                f.write(byte_contents)
+            process = subprocess.Popen(
+                [
+                    LIBREOFFICE_EXECUTABLE,
+                    f"-env:UserInstallation=file://{self.profile_dir}",
+                    "--headless",
+                    "--convert-to",
+                    convert_to,
+                    "--outdir",
+                    tempdir,
+                    input_path,
+                ],
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.DEVNULL,
+                start_new_session=True,
+            )
+            try:
+                process.wait(timeout)
+            except subprocess.TimeoutExpired:
+                _kill_process_group(process)
+                raise ConversionTimeout(f"conversion to {convert_to} timed out")
+            except BaseException:
+                # interrupted, e.g. by a timed out supplementary file job
+                _kill_process_group(process)
+                raise
+            output_path = os.path.join(
+                tempdir, f"{os.path.splitext(file_name)[0]}.{convert_to}"
+            )
+            if process.returncode != 0 or not os.path.exists(output_path):
+                raise ConversionError(
+                    f"LibreOffice exited with {process.returncode}, no {convert_to} written"
+                )
+            with open(output_path, "rb") as f:
+                return f.read()
+
+
+class LibreOfficeService:
+    """
+    Document conversions shared by the Word and PowerPoint readers, on a fixed
+    number of LibreOffice instances. A job waits for a free instance, so no more
+    than `instances` conversions run at a time.
+    """
+
+    def __init__(self, instances: int = LIBREOFFICE_INSTANCES, use_unoserver: bool = None):
+        if use_unoserver is None:
+            # the unoserver command runs in this environment and imports uno
+            use_unoserver = (
+                UnoClient is not None
+                and shutil.which("unoserver") is not None
+                and importlib.util.find_spec("uno") is not None
+            )
+        self.instances = [LibreOfficeInstance(i, use_unoserver) for i in range(instances)]
+        self.idle = queue.Queue()
+        for instance in self.instances:
+            self.idle.put(instance)
+
+    def convert(
+        self,
+        byte_contents: bytes,
+        file_name: str,
+        convert_to: str,
+        timeout: float = LIBREOFFICE_TIMEOUT,
+    ) -> bytes:
+        """
+        Convert a document, e.g. to "pdf" or "pptx", and return the converted bytes.
+        Raises ConversionTimeout or ConversionError.
+        """
+        instance = self.idle.get()
+        try:
+            start_time = time.perf_counter()
+            data = instance.convert(byte_contents, file_name, convert_to, timeout)
+            supplementary_info_logger.info(
+                "%s | converted to %s in %.2f seconds",
+                file_name,
+                convert_to,
+                time.perf_counter() - start_time,
+            )
+            return data
+        finally:
+            self.idle.put(instance)
+
+    def close(self):
+        for instance in self.instances:
+            instance.stop()
+
+
+_shared_service = None
+_shared_service_lock = threading.Lock()
+
+
+def get_libreoffice_service() -> LibreOfficeService:
+    global _shared_service
+    with _shared_service_lock:
+        if _shared_service is None:
+            _shared_service = LibreOfficeService()
+            atexit.register(_shared_service.close)
+        return _shared_service
+
+
+def close_libreoffice_service():
+    """Stop the shared instances now, for processes that exit without running atexit."""
+    global _shared_service
+    with _shared_service_lock:
+        if _shared_service is not None:
+            _shared_service.close()
+            _shared_service = None
+
+
+def _forget_inherited_service():
+    # the parent's instances keep serving the parent; the child starts its own
+    global _shared_service, _shared_service_lock
+    _shared_service = None
+    _shared_service_lock = threading.Lock()
+
+
+os.register_at_fork(after_in_child=_forget_inherited_service)
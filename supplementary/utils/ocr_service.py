@@ -0,0 +1,250 @@
+import atexit
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+
+import pytesseract
+from utils.logging.logging_setup import (
+    supplementary_error_logger,
+    supplementary_info_logger,
+)
+
+# Tesseract settings, used by every reader that runs OCR
+TESSERACT_LANG = os.getenv("TESSERACT_LANG", "eng")
+TESSERACT_CONFIG = os.getenv("TESSERACT_CONFIG", "")  # e.g. "--psm 3"
+OCR_WORKERS = int(os.getenv("OCR_WORKERS", os.cpu_count() or 1))
+OCR_TIMEOUT = int(os.getenv("OCR_TIMEOUT", 120))  # seconds per image
+# persistent OCR results, shared between runs and processes; disabled when unset
+OCR_CACHE_PATH = os.getenv("OCR_CACHE_PATH", None)
+OCR_CACHE_MAX_BYTES = int(os.getenv("OCR_CACHE_MAX_BYTES", 1_000_000_000))
+
+# Every job runs its own tesseract process, so one OpenMP thread each keeps
+# OCR_WORKERS jobs from oversubscribing the cores.
+os.environ.setdefault("OMP_THREAD_LIMIT", "1")
+
+
+def image_to_string(image, timeout: int = OCR_TIMEOUT) -> str:
+    """OCR one PIL image. Raises RuntimeError when tesseract runs past `timeout`."""
+    return str(
+        pytesseract.image_to_string(
+            image, lang=TESSERACT_LANG, config=TESSERACT_CONFIG, timeout=timeout
+        )
+    )
+
+
+class OcrCache:
+    """
+    OCR texts stored in SQLite under a hash of the image pixels, mode and size and
+    of the tesseract version and settings, so changing any of them misses.
+    When the stored texts outgrow `max_bytes` the least recently used ones are
+    evicted. The size is summed in the write transaction, so processes sharing
+    the file see each other's inserts.
+    """
+
+    def __init__(self, path: str, max_bytes: int = OCR_CACHE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.hits = self.misses = self.evicted = 0
+        self.lock = threading.Lock()
+        self.settings = (
+            f"{pytesseract.get_tesseract_version()}|{TESSERACT_LANG}|{TESSERACT_CONFIG}"
+        )
+        self.connection = sqlite3.connect(
+            path, isolation_level=None, check_same_thread=False, timeout=30
+        )
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS ocr_cache "
+            "(key TEXT PRIMARY KEY, text TEXT, size INTEGER, last_used REAL)"
+        )
+        self.connection.execute(
+            "CREATE INDEX IF NOT EXISTS ix_ocr_cache_last_used ON ocr_cache (last_used)"
+        )
+        self.size = 0
+        with self.lock:
+            self._write()
+
+    def key(self, image) -> str:
+        digest = hashlib.sha256(image.tobytes())
+        digest.update(f"|{image.mode}|{image.size}|{self.settings}".encode())
+        return digest.hexdigest()
+
+    def get(self, key: str) -> str | None:
+        with self.lock:
+            row = self.connection.execute(
+                "SELECT text FROM ocr_cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.connection.execute(
+                "UPDATE ocr_cache SET last_used = ? WHERE key = ?", (time.time(), key)
+            )
+            return row[0]
+
+    def put(self, key: str, text: str):
+        with self.lock:
+            # the same image may have been OCR'd twice at the same time
+            self._write(
+                "INSERT OR IGNORE INTO ocr_cache VALUES (?, ?, ?, ?)",
+                (key, text, len(text.encode()), time.time()),
+            )
+
+    def _write(self, sql: str = None, parameters: tuple = ()):
+        # IMMEDIATE takes the write lock first, so the sum is not stale
+        self.connection.execute("BEGIN IMMEDIATE")
+        try:
+            if sql:
+                self.connection.execute(sql, parameters)
+            self.size = self.connection.execute(
+                "SELECT COALESCE(SUM(size), 0) FROM ocr_cache"
+            ).fetchone()[0]
+            if self.size > self.max_bytes:
+                self._evict()
+        except BaseException:
+            self.connection.execute("ROLLBACK")
+            raise
+        self.connection.execute("COMMIT")
+
+    def _evict(self):
+        # down to 90% of the limit, so eviction does not run on every insert
+        target = self.max_bytes * 0.9
+        for key, size in self.connection.execute(
+            "SELECT key, size FROM ocr_cache ORDER BY last_used"
+        ).fetchall():
+            if self.size <= target:
+                break
+            self.connection.execute("DELETE FROM ocr_cache WHERE key = ?", (key,))
+            self.size -= size
+            self.evicted += 1
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def stats(self) -> str:
+        return (
+            f"OCR cache: hit rate {self.hit_rate:.1%} ({self.hits:_} hits, "
+            f"{self.misses:_} misses), {self.size:_} bytes, {self.evicted:_} evicted"
+        )
+
+    def close(self):
+        self.connection.close()
+
+
+class OcrService:
+    """
+    Bounded OCR executor shared by the PDF, PowerPoint and image readers.
+
+    Jobs run in threads: the work happens in the tesseract subprocess that
+    pytesseract starts, so `max_workers` bounds the number of tesseract processes
+    and a timed out job kills its process. Images submitted from several files
+    of an article, or from several readers at once, share the same queue.
+    """
+
+    def __init__(
+        self,
+        max_workers: int = OCR_WORKERS,
+        timeout: int = OCR_TIMEOUT,
+        cache: OcrCache = None,
+    ):
+        self.max_workers = max_workers
+        self.timeout = timeout
+        self.cache = cache
+        self.executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="ocr"
+        )
+
+    def submit(self, image):
+        if self.cache is None:
+            return self.executor.submit(image_to_string, image, self.timeout)
+        key = self.cache.key(image)
+        if (text := self.cache.get(key)) is not None:
+            future = Future()
+            future.set_result(text)
+            return future
+        return self.executor.submit(self._ocr_and_cache, image, key)
+
+    def _ocr_and_cache(self, image, key: str) -> str:
+        text = image_to_string(image, self.timeout)
+        self.cache.put(key, text)
+        return text
+
+    def map(self, images, source: str = "") -> list:
+        """
+        OCR a batch of images and return their texts in order. `images` can be a
+        generator; at most twice `max_workers` images are held at a time, so pages
+        can be rendered while earlier ones are recognised. Failed or timed out
+        images are logged and give an empty text.
+        """
+        texts = {}
+        in_flight = {}
+        images = enumerate(images)
+        while True:
+            for index, image in images:
+                in_flight[self.submit(image)] = index
+                if len(in_flight) >= self.max_workers * 2:
+                    break
+            if not in_flight:
+                break
+            done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in done:
+                index = in_flight.pop(future)
+                try:
+                    texts[index] = future.result()
+                except Exception as e:
+                    supplementary_error_logger.error(
+                        "%s | OCR of image %d failed: %s", source, index, str(e)
+                    )
+                    texts[index] = ""
+        return [texts[index] for index in range(len(texts))]
+
+    def close(self):
+        if self.cache:
+            supplementary_info_logger.info(self.cache.stats())
+        self.executor.shutdown(wait=True)
+        if self.cache:
+            self.cache.close()
+
+
+_shared_service = None
+_shared_service_lock = threading.Lock()
+
+
+def get_ocr_service() -> OcrService:
+    global _shared_service
+    with _shared_service_lock:
+        if _shared_service is None:
+            _shared_service = OcrService(
+                cache=OcrCache(OCR_CACHE_PATH) if OCR_CACHE_PATH else None
+            )
+            atexit.register(close_ocr_service)
+        return _shared_service
+
+
+def close_ocr_service():
+    """Log the cache statistics and stop the shared service."""
+    global _shared_service
+    with _shared_service_lock:
+        if _shared_service is not None:
+            _shared_service.close()
+            _shared_service = None
+
+
+def ocr_images(images, source: str = "") -> list:
+    """OCR a batch of PIL images on the shared service, see OcrService.map."""
+    return get_ocr_service().map(images, source)
+
+
+def _forget_inherited_service():
+    # the threads of a forked parent do not exist in the child
+    global _shared_service, _shared_service_lock
+    _shared_service = None
+    _shared_service_lock = threading.Lock()
+
+
+os.register_at_fork(after_in_child=_forget_inherited_service)
@@ -0,0 +1,212 @@
+import multiprocessing
+import os
+import queue
+import threading
+import time
+
+from utils.logging.logging_setup import supplementary_error_logger
+
+TIMEOUT_TEXT = "ERROR - TIMEOUT"
+PAGE_TIMEOUT = 15  # seconds for page.get_text() on one page
+DOCUMENT_TIMEOUT = 300  # seconds for all pages of one document
+POOL_SIZE = int(os.getenv("PDF_TEXT_WORKERS", 1))
+# restart workers now and then, MuPDF keeps some memory between documents
+MAX_DOCUMENTS_PER_WORKER = 200
+
+
+def _worker_loop(connection):
+    import fitz
+
+    while True:
+        request = connection.recv()
+        if request is None:
+            return
+        doc_bytes, page_numbers = request
+        try:
+            doc = fitz.open(stream=doc_bytes, filetype="pdf")
+        except Exception as e:
+            connection.send(("document", None, str(e)))
+            connection.send(("done", None, None))
+            continue
+        for page_number in page_numbers:
+            try:
+                connection.send(("page", page_number, doc.load_page(page_number).get_text()))
+            except Exception as e:
+                connection.send(("error", page_number, str(e)))
+        doc.close()
+        connection.send(("done", None, None))
+
+
+class PdfTextWorker:
+    """A child process extracting page text from PDF documents sent over a pipe."""
+
+    def __init__(self):
+        self.connection, child_connection = multiprocessing.Pipe()
+        self.process = multiprocessing.Process(
+            target=_worker_loop, args=(child_connection,), daemon=True
+        )
+        self.process.start()
+        child_connection.close()
+        self.documents = 0
+
+    def kill(self):
+        self.process.kill()
+        self.process.join()
+        self.connection.close()
+
+    def stop(self):
+        try:
+            self.connection.send(None)
+            self.process.join(1)
+        except (BrokenPipeError, OSError):
+            pass
+        if self.process.is_alive():
+            self.kill()
+        else:
+            self.connection.close()
+
+
+class PdfTextPool:
+    """
+    Persistent PDF text extraction workers.
+
+    A document is sent to a worker once, as bytes together with its page numbers,
+    and the worker streams back the text page by page. A page that does not finish
+    within `page_timeout` gets TIMEOUT_TEXT, the hung worker is replaced and the
+    remaining pages continue on the new one. A page whose worker dies (a MuPDF
+    crash, the OOM killer) gets an empty text the same way. Pages still left when
+    `document_timeout` runs out also get TIMEOUT_TEXT.
+    """
+
+    def __init__(
+        self,
+        size: int = POOL_SIZE,
+        page_timeout: float = PAGE_TIMEOUT,
+        document_timeout: float = DOCUMENT_TIMEOUT,
+    ):
+        self.size = size
+        self.page_timeout = page_timeout
+        self.document_timeout = document_timeout
+        self.idle = queue.Queue()
+        self.started = 0
+        self.lock = threading.Lock()
+        self.recycled = 0
+
+    def _acquire(self) -> PdfTextWorker:
+        with self.lock:
+            if self.idle.empty() and self.started < self.size:
+                self.started += 1
+                return PdfTextWorker()
+        worker = self.idle.get()
+        if not worker.process.is_alive():
+            # died while idle, e.g. killed from outside
+            worker = self._replace(worker)
+        return worker
+
+    def _replace(self, worker: PdfTextWorker) -> PdfTextWorker:
+        worker.kill()
+        self.recycled += 1
+        return PdfTextWorker()
+
+    def _release(self, worker: PdfTextWorker, clean: bool = True):
+        worker.documents += 1
+        if not clean or not worker.process.is_alive():
+            # mid document or dead, its pipe can not be trusted
+            worker = self._replace(worker)
+        elif worker.documents >= MAX_DOCUMENTS_PER_WORKER:
+            worker.stop()
+            worker = PdfTextWorker()
+        self.idle.put(worker)
+
+    def extract_pages(self, doc_bytes: bytes, page_count: int, source: str = "") -> dict:
+        """
+        Returns:
+            dict: {page number: text} for every page of the document
+        """
+        output = {}
+        deadline = time.monotonic() + self.document_timeout
+        remaining = list(range(page_count))
+        worker = self._acquire()
+        clean = False
+        try:
+            while remaining:
+                died = False
+                try:
+                    worker.connection.send((doc_bytes, remaining))
+                    while remaining:
+                        timeout = min(self.page_timeout, deadline - time.monotonic())
+                        if timeout <= 0 or not worker.connection.poll(timeout):
+                            break
+                        kind, page_number, text = worker.connection.recv()
+                        if kind == "document":
+                            supplementary_error_logger.error("%s | %s", source, text)
+                            output.update((page_number, "") for page_number in remaining)
+                            remaining = []
+                            break
+                        if kind == "error":
+                            supplementary_error_logger.error(
+                                "%s | page %s | %s", source, page_number, text
+                            )
+                            text = ""
+                        output[page_number] = text
+                        remaining.remove(page_number)
+                    if not remaining:
+                        worker.connection.recv()  # "done"
+                        clean = True
+                        break
+                except (EOFError, OSError):
+                    # poll() reports a closed pipe as readable, recv() then fails
+                    died = True
+                    if not remaining:
+                        break
+                # the worker is stuck on, or died at, remaining[0]
+                worker = self._replace(worker)
+                if time.monotonic() >= deadline:
+                    supplementary_error_logger.error(
+                        f"PDF - {source} | Document timeout after {self.document_timeout} seconds, "
+                        f"{len(remaining)} pages left"
+                    )
+                    for page_number in remaining:
+                        output[page_number] = TIMEOUT_TEXT
+                    break
+                page_number = remaining.pop(0)
+                if died:
+                    supplementary_error_logger.error(
+                        f"PDF - {source} | Function - extract_text | Worker died on page {page_number}"
+                    )
+                    output[page_number] = ""
+                    continue
+                supplementary_error_logger.error(
+                    f"PDF - {source} | Function - extract_text | Timeout occurred for page {page_number} after {self.page_timeout} seconds"
+                )
+                output[page_number] = TIMEOUT_TEXT
+        finally:
+            self._release(worker, clean)
+        return dict(sorted(output.items()))
+
+    def close(self):
+        while not self.idle.empty():
+            self.idle.get().stop()
+        self.started = 0
+
+
+_shared_pool = None
+_shared_pool_lock = threading.Lock()
+
+
+def get_pdf_text_pool() -> PdfTextPool:
+    global _shared_pool
+    with _shared_pool_lock:
+        if _shared_pool is None:
+            _shared_pool = PdfTextPool()
+        return _shared_pool
+
+
+def _forget_inherited_pool():
+    # workers of a forked parent are not children of this process
+    global _shared_pool, _shared_pool_lock
+    _shared_pool = None
+    _shared_pool_lock = threading.Lock()
+
+
+os.register_at_fork(after_in_child=_forget_inherited_pool)
@@ -0,0 +1,40 @@
+import os
+import sys
+import tempfile
+from contextlib import contextmanager
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+# the db/pubtator modules import each other as top-level modules
+sys.path.insert(0, os.path.join(ROOT, "db", "pubtator"))
+# utils.logging.logging_setup reads these on import; no config file means basicConfig
+os.environ.setdefault("LOGGING_CONFIG_PATH", os.path.join(ROOT, "tests", "no_logging.json"))
+os.environ.setdefault("LOGGING_OUTPUT_PATH", tempfile.gettempdir())
+# the supplementary readers read their download directories on import
+os.environ.setdefault("DOWNLOAD_DESTINATION_DIRECTORY", tempfile.gettempdir())
+os.environ.setdefault("SUPPLEMENTARY_DOWNLOAD_DIRECTORY", tempfile.gettempdir())
+
+
+@pytest.fixture
+def stage_session_factory(tmp_path):
+    """Session factory on a fresh SQLite database with the db.utils.model tables."""
+    from db.utils.model import Base
+
+    engine = create_engine(f"sqlite:///{tmp_path / 'stages.sqlite'}")
+    Base.metadata.create_all(engine)
+    Session = sessionmaker(bind=engine)
+
+    @contextmanager
+    def get_session():
+        session = Session()
+        try:
+            yield session
+        finally:
+            session.close()
+
+    yield get_session
+    engine.dispose()
@@ -0,0 +1,41 @@
+from annotation_cache import AnnotationCache
+
+
+def test_cache_reads_through_memory_and_disk(tmp_path):
+    calls = []
+
+    def loader(pmc_id):
+        calls.append(pmc_id)
+        return {"pmc_id": pmc_id}
+
+    cache = AnnotationCache(loader, release="r1", path=str(tmp_path / "cache.sqlite"))
+    assert cache.get("PMC1") == cache.get("PMC1") == {"pmc_id": "PMC1"}
+    cache.close()
+    # a new process finds the entry on disk
+    cache = AnnotationCache(loader, release="r1", path=str(tmp_path / "cache.sqlite"))
+    assert cache.get("PMC1") == {"pmc_id": "PMC1"}
+    assert calls == ["PMC1"]
+    assert (cache.memory_hits, cache.disk_hits, cache.misses) == (0, 1, 0)
+
+
+def test_empty_results_are_not_cached(tmp_path):
+    database = {}
+    cache = AnnotationCache(
+        lambda pmc_id: database.get(pmc_id, {}), path=str(tmp_path / "cache.sqlite")
+    )
+    assert cache.get("PMC1") == {}
+    # e.g. populate_articles_with_pmc_ids adds the article
+    database["PMC1"] = {"pmc_id": "PMC1"}
+    assert cache.get("PMC1") == {"pmc_id": "PMC1"}
+
+
+def test_invalidate_many_drops_only_the_given_articles(tmp_path):
+    cache = AnnotationCache(lambda pmc_id: {"pmc_id": pmc_id}, path=str(tmp_path / "c"))
+    for pmc_id in ("PMC1", "PMC2", "PMC3"):
+        cache.get(pmc_id)
+    cache.invalidate_many(["PMC1", "PMC3"])
+    cache.memory.clear()
+    for pmc_id in ("PMC1", "PMC2", "PMC3"):
+        cache.get(pmc_id)
+    assert cache.disk_hits == 1
+    assert cache.misses == 5
@@ -0,0 +1,104 @@
+import os
+import signal
+import time
+
+import fitz
+import pytest
+
+from supplementary.readers.supported_readers.pdf import PDFFormatReader, get_ocr_policy
+from supplementary.utils.article_executor import ArticleExecutor, FileWorkerPool
+
+# jobs run in the pool's worker processes, so they are module level functions
+
+
+def _echo(value):
+    return value
+
+
+def _fail():
+    raise ValueError("unreadable file")
+
+
+def _die():
+    os.kill(os.getpid(), signal.SIGKILL)
+
+
+def _touch(path):
+    open(path, "w").close()
+    return path
+
+
+def _skipped_ocr_pages():
+    return get_ocr_policy().skipped
+
+
+def _pdf_with_text_and_a_figure() -> bytes:
+    doc = fitz.open()
+    page = doc.new_page()
+    page.insert_textbox(fitz.Rect(72, 300, 520, 800), "text layer " * 200)
+    image = fitz.Pixmap(fitz.csGRAY, fitz.IRect(0, 0, 200, 200), False)
+    page.insert_image(fitz.Rect(72, 72, 272, 272), pixmap=image)
+    return doc.tobytes()
+
+
+@pytest.fixture
+def pool():
+    pool = FileWorkerPool(size=1, memory_limit=0)
+    yield pool
+    pool.close()
+
+
+def test_failed_killed_and_timed_out_files_are_left_out(pool):
+    executor = ArticleExecutor(workers=1, file_timeout=1, article_timeout=30, pool=pool)
+    results = executor.run(
+        {
+            "done": (_echo, (1,)),
+            "failed": (_fail, ()),
+            "killed": (_die, ()),
+            "timed_out": (time.sleep, (60,)),
+            "after": (_echo, (2,)),
+        },
+        "PMC1",
+    )
+    assert results == {"done": 1, "after": 2}
+    # the killed and the timed out worker were replaced, the failed one kept
+    assert pool.replaced == 2
+    assert pool.started == 1
+
+
+def test_article_timeout_cancels_files_not_started(pool, tmp_path):
+    executor = ArticleExecutor(workers=1, file_timeout=30, article_timeout=1, pool=pool)
+    start_time = time.monotonic()
+    results = executor.run(
+        {
+            "timed_out": (time.sleep, (60,)),
+            "cancelled": (_touch, (str(tmp_path / "cancelled"),)),
+        },
+        "PMC1",
+    )
+    assert results == {}
+    assert not (tmp_path / "cancelled").exists()
+    assert time.monotonic() - start_time < 10
+    # the pool keeps working for the next article
+    assert ArticleExecutor(workers=1, pool=pool).run({"next": (_echo, (3,))}) == {"next": 3}
+
+
+def test_workers_last_between_files(pool):
+    executor = ArticleExecutor(workers=1, pool=pool)
+    results = executor.run({key: (os.getpid, ()) for key in ("a", "b", "c")})
+    assert len(set(results.values())) == 1
+    assert pool.replaced == 0
+
+
+def test_ocr_totals_add_up_in_a_worker(pool):
+    data = _pdf_with_text_and_a_figure()
+    read_bytes = PDFFormatReader().read_bytes
+    results = ArticleExecutor(workers=1, pool=pool).run(
+        {
+            "first": (read_bytes, (data, "PMC1/first.pdf")),
+            "second": (read_bytes, (data, "PMC1/second.pdf")),
+            "skipped": (_skipped_ocr_pages, ()),
+        }
+    )
+    # the figure covers too little of a page with text to be OCRed
+    assert results["skipped"] == 2
@@ -0,0 +1,58 @@
+import pytest
+from sqlalchemy import func, select
+
+from db.utils.article_status import InvalidProcessingStageError, advance_stages
+from db.utils.enum_and_constants import ArticleProcessingStatusEnum as Status
+from db.utils.enum_and_constants import ProcessingStageEnum as Stage
+from db.utils.model import Article, ArticleProcessingStage, ProcessingStageHistory
+
+
+def add_articles(session, stages: dict):
+    for article_id, stage in stages.items():
+        session.add(Article(id=article_id, pm_id=str(article_id)))
+        session.add(ArticleProcessingStage(article_id=article_id, current_stage=stage))
+    session.commit()
+
+
+def test_advance_stages_moves_every_article_and_records_history(stage_session_factory):
+    with stage_session_factory() as session:
+        add_articles(session, {1: Stage.pending_download, 2: Stage.pending_download})
+        advance_stages(
+            session,
+            [
+                (1, Stage.pending_parse_text, Status.success, None),
+                (2, Stage.pending_parse_text, Status.error, "boom"),
+            ],
+        )
+        assert session.get(ArticleProcessingStage, 1).current_stage == Stage.pending_parse_text
+        assert session.get(ArticleProcessingStage, 2).last_error == "boom"
+        assert session.scalar(select(func.count()).select_from(ProcessingStageHistory)) == 2
+
+
+def test_advance_stages_rejects_a_skipped_stage_before_writing(stage_session_factory):
+    with stage_session_factory() as session:
+        add_articles(session, {1: Stage.pending_download, 2: Stage.pending_download})
+        with pytest.raises(InvalidProcessingStageError, match="expected 'pending_parse_text'"):
+            advance_stages(
+                session,
+                [
+                    (1, Stage.pending_parse_text, Status.success, None),
+                    (2, Stage.pending_parse_supplementary, Status.success, None),
+                ],
+            )
+        session.rollback()
+        assert session.get(ArticleProcessingStage, 1).current_stage == Stage.pending_download
+
+
+def test_advance_stages_rejects_the_first_stage(stage_session_factory):
+    with stage_session_factory() as session:
+        add_articles(session, {1: Stage.complete})
+        with pytest.raises(ValueError, match="no stage precedes 'pending_download'"):
+            advance_stages(session, [(1, Stage.pending_download, Status.success, None)])
+
+
+def test_advance_stages_rejects_a_transition_to_the_current_stage(stage_session_factory):
+    with stage_session_factory() as session:
+        add_articles(session, {1: Stage.complete})
+        with pytest.raises(InvalidProcessingStageError, match="already in 'complete'"):
+            advance_stages(session, [(1, Stage.complete, Status.success, None)])
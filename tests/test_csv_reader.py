@@ -0,0 +1,23 @@
+from supplementary.readers.supported_readers.csv import CSVFormatReader, iter_csv_records
+from variant_search.search import check_contents_table
+
+
+def _vcf_like_table(rows: int) -> bytes:
+    lines = ["chrom\tpos\tid\tref\talt\tgene"]
+    for number in range(rows):
+        lines.append(f"1\t{1000 + number}\trs{number}\tA\tG\tBRCA1")
+    # cells the variant search does match
+    lines.append("2\t5\trs77 A>G\tA\tG\tTP53")
+    lines.append("3\t6\t.\tC\tT\tCA1234567")
+    lines.append("4\t7\t.\tC\tT\tc.35 del G")
+    return "\n".join(lines).encode()
+
+
+def test_prefilter_keeps_the_search_results_and_few_rows():
+    table = _vcf_like_table(20_000)
+    kept = CSVFormatReader().read_bytes(table, "PMC1/variants.tsv")
+    everything = list(iter_csv_records(table))
+    assert check_contents_table(kept) == check_contents_table(everything)
+    assert check_contents_table(kept)["found_in_rows"]
+    # the first row for the headers and the three matching rows
+    assert len(kept) == 4
@@ -0,0 +1,34 @@
+from io import BytesIO
+
+import openpyxl
+
+from supplementary.readers.supported_readers.excel import EXCELFormatReader, iter_workbook_rows
+from variant_search.search import check_contents_paginated
+
+
+def _workbook(rows: int) -> bytes:
+    workbook = openpyxl.Workbook()
+    sheet = workbook.active
+    sheet.title = "variants"
+    sheet.append(["chrom", "pos", "id", "ref", "alt"])
+    for number in range(rows):
+        sheet.append([1, 1000 + number, ".", "A", "G"])
+    sheet.append([2, 5, "rs77 A>G", "A", "G"])
+    sheet.append(["CA1234567", 6, ".", "C", "T"])
+    workbook.create_sheet("notes").append(["c.35 del G in TP53"])
+    buffer = BytesIO()
+    workbook.save(buffer)
+    return buffer.getvalue()
+
+
+def test_kept_rows_give_the_search_the_same_matches():
+    workbook = _workbook(5_000)
+    kept = EXCELFormatReader().read_bytes(workbook, "PMC1/variants.xlsx")
+    whole = {}
+    for sheet_name, row in iter_workbook_rows(workbook, "PMC1/variants.xlsx"):
+        whole.setdefault(sheet_name, []).append(row)
+    whole = {sheet_name: "\n".join(rows) for sheet_name, rows in whole.items()}
+    assert check_contents_paginated(kept) == check_contents_paginated(whole)
+    assert check_contents_paginated(kept)["variants"]
+    # the header and the two matching rows
+    assert kept["variants"].count("\n") == 2
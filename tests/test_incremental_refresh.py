@@ -0,0 +1,112 @@
+from contextlib import contextmanager
+
+import pytest
+from sqlalchemy import create_engine, select
+from sqlalchemy.orm import sessionmaker
+
+import incremental_refresh as ir
+from annotation_cache import AnnotationCache
+from db_models import Article, Base, Disease, article_diseases
+
+PM_IDS = {"1", "2", "3"}
+
+
+@pytest.fixture
+def get_session(tmp_path, monkeypatch):
+    engine = create_engine(f"sqlite:///{tmp_path / 'pubtator.sqlite'}")
+    Base.metadata.create_all(engine)
+    Session = sessionmaker(bind=engine)
+
+    @contextmanager
+    def get_session():
+        session = Session()
+        try:
+            yield session
+        finally:
+            session.close()
+
+    monkeypatch.setattr(ir.var, "get_session", get_session)
+    monkeypatch.setattr(ir, "get_pm_id_index", lambda: PM_IDS)
+    monkeypatch.setattr(ir.pifidb, "get_human_gene_symbols", lambda: {})
+    cache = AnnotationCache(lambda pmc_id: {"pmc_id": pmc_id}, path=str(tmp_path / "cache"))
+    monkeypatch.setattr(ir, "get_annotation_cache", lambda: cache)
+    yield get_session
+    engine.dispose()
+
+
+def write_release(directory, diseases: list) -> dict:
+    """Dump files with the given (pm_id, disease id) lines and no genes or variants."""
+    directory.mkdir()
+    input_files = {kind: str(directory / kind) for kind in ir.KINDS}
+    for kind in ir.KINDS:
+        with open(input_files[kind], "w") as file:
+            if kind == "disease":
+                file.writelines(f"{pm_id}\tDisease\t{key}\tx\tx\n" for pm_id, key in diseases)
+    return input_files
+
+
+def disease_links(session) -> set:
+    return set(
+        session.execute(
+            select(Article.pm_id, Disease.original_ontology)
+            .join(article_diseases, article_diseases.c.article_id == Article.id)
+            .join(Disease, Disease.id == article_diseases.c.disease_id)
+        ).all()
+    )
+
+
+def test_apply_changes_is_idempotent(get_session):
+    desired = {"1": {"MESH:D1": "", "MESH:D2": ""}, "2": {"MESH:D1": ""}}
+    with get_session() as session:
+        assert ir.apply_changes(session, "disease", desired) == (3, 0)
+        session.commit()
+        assert ir.apply_changes(session, "disease", desired) == (0, 0)
+        session.commit()
+        assert disease_links(session) == {
+            ("1", "MESH:D1"),
+            ("1", "MESH:D2"),
+            ("2", "MESH:D1"),
+        }
+
+
+def test_apply_changes_replaces_and_removes_associations(get_session):
+    with get_session() as session:
+        ir.apply_changes(session, "disease", {"1": {"MESH:D1": ""}, "2": {"MESH:D1": ""}})
+        assert ir.apply_changes(session, "disease", {"1": {"MESH:D2": ""}, "2": {}}) == (1, 2)
+        session.commit()
+        assert disease_links(session) == {("1", "MESH:D2")}
+        # entities are kept, only the links change
+        assert sorted(session.scalars(select(Disease.original_ontology))) == ["MESH:D1", "MESH:D2"]
+
+
+def test_refresh_applies_only_changed_buckets(get_session, tmp_path):
+    cache = ir.get_annotation_cache()
+    fingerprint_dir = str(tmp_path / "fingerprint")
+    changed_path = str(tmp_path / "changed_pmc_ids")
+    ir.build_fingerprint(fingerprint_dir, write_release(tmp_path / "empty", []), 4)
+
+    first = write_release(tmp_path / "first", [("1", "MESH:D1"), ("2", "MESH:D2")])
+    totals = ir.refresh(fingerprint_dir, changed_path, first)
+    assert (totals["changed"], totals["inserted"], totals["deleted"]) == (2, 2, 0)
+    with get_session() as session:
+        session.execute(Article.__table__.update().values(pmc_id="PMC" + Article.pm_id))
+        session.commit()
+
+    # the same release again changes nothing
+    totals = ir.refresh(fingerprint_dir, changed_path, first)
+    assert (totals["changed"], totals["inserted"], totals["deleted"]) == (0, 0, 0)
+    assert open(changed_path).read() == ""
+
+    # only PMID 2 changed, in its bucket
+    cache.get("PMC1")
+    cache.get("PMC2")
+    second = write_release(tmp_path / "second", [("1", "MESH:D1"), ("2", "MESH:D3")])
+    totals = ir.refresh(fingerprint_dir, changed_path, second)
+    assert (totals["changed"], totals["inserted"], totals["deleted"]) == (1, 1, 1)
+    assert open(changed_path).read() == "PMC2\n"
+    cache.memory.clear()
+    cache.get("PMC1")
+    cache.get("PMC2")
+    assert (cache.disk_hits, cache.misses) == (1, 3)
+    with get_session() as session:
+        assert disease_links(session) == {("1", "MESH:D1"), ("2", "MESH:D3")}
@@ -0,0 +1,39 @@
+import os
+import stat
+
+from supplementary.utils import libreoffice_service
+from supplementary.utils.libreoffice_service import LibreOfficeService
+
+
+def _script(path, body: str) -> str:
+    path.write_text("#!/bin/sh\n" + body)
+    path.chmod(path.stat().st_mode | stat.S_IEXEC)
+    return str(path)
+
+
+def test_server_start_failure_falls_back_to_soffice(tmp_path, monkeypatch):
+    # unoserver without the uno bindings exits at once
+    _script(tmp_path / "unoserver", "exit 1\n")
+    # -env:UserInstallation=... --headless --convert-to X --outdir D input
+    soffice = _script(
+        tmp_path / "soffice",
+        'name=$(basename "$7"); cp "$7" "$6/${name%.*}.$4"\n',
+    )
+    monkeypatch.setenv("PATH", f"{tmp_path}{os.pathsep}{os.environ['PATH']}")
+    monkeypatch.setattr(libreoffice_service, "LIBREOFFICE_EXECUTABLE", soffice)
+    monkeypatch.setattr(libreoffice_service, "LIBREOFFICE_PROFILES_DIR", str(tmp_path / "profiles"))
+    service = LibreOfficeService(instances=1, use_unoserver=True)
+    try:
+        assert service.convert(b"document", "supp.doc", "pdf", timeout=30) == b"document"
+        assert not service.instances[0].use_unoserver
+    finally:
+        service.close()
+
+
+def test_server_needs_the_uno_bindings(tmp_path, monkeypatch):
+    _script(tmp_path / "unoserver", "exit 1\n")
+    monkeypatch.setenv("PATH", f"{tmp_path}{os.pathsep}{os.environ['PATH']}")
+    monkeypatch.setattr(libreoffice_service, "UnoClient", object)
+    monkeypatch.setattr(libreoffice_service, "LIBREOFFICE_PROFILES_DIR", str(tmp_path / "profiles"))
+    monkeypatch.setattr(libreoffice_service.importlib.util, "find_spec", lambda name: None)
+    assert not LibreOfficeService(instances=1).instances[0].use_unoserver
@@ -0,0 +1,115 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from utils import oa_downloader
+from utils.oa_downloader import OaDownloader
+
+PACKAGE = b"package bytes" * 1000
+
+
+class StandIn(BaseHTTPRequestHandler):
+    """Local stand-in for oa.fcgi and the package host."""
+
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def reply(self, status: int, body: bytes = b"", length: int = None):
+        self.send_response(status)
+        self.send_header("Content-Length", str(len(body) if length is None else length))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        server = self.server
+        with server.lock:
+            server.hits.append((time.monotonic(), self.path))
+            server.running += 1
+            server.most_running = max(server.most_running, server.running)
+        try:
+            if self.path.startswith("/oa.fcgi"):
+                # the first lookup is refused, as NCBI does under load
+                if server.unavailable:
+                    server.unavailable -= 1
+                    return self.reply(503)
+                href = "ftp://ftp.ncbi.nlm.nih.gov/pub/pmc/PMC1.tar.gz"
+                self.reply(200, f'<OA><records><record id="PMC1"><link format="tgz" href="{href}"/></record></records></OA>'.encode())
+            elif self.path == "/pub/pmc/PMC1.tar.gz":
+                self.reply(200, PACKAGE)
+            elif self.path == "/slow":
+                time.sleep(0.3)
+                self.reply(200)
+            elif self.path == "/broken":
+                # the connection drops before the announced body is sent
+                self.reply(200, PACKAGE[:100], length=len(PACKAGE))
+                self.close_connection = True
+            else:
+                self.reply(404)
+        finally:
+            with server.lock:
+                server.running -= 1
+
+
+@pytest.fixture
+def server():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StandIn)
+    server.lock = threading.Lock()
+    server.hits = []
+    server.running = server.most_running = 0
+    server.unavailable = 1
+    server.url = f"http://127.0.0.1:{server.server_port}"
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def _downloader(server, monkeypatch, **kwargs):
+    # create_session reads the backoff when the downloader is created
+    monkeypatch.setattr(oa_downloader, "OA_BACKOFF_FACTOR", 0.01)
+    # the OA_SERVICE_URL and OA_PACKAGE_HOST_URL a deployment would set
+    return OaDownloader(
+        service_url=server.url + "/oa.fcgi", package_host_url=server.url, **kwargs
+    )
+
+
+def test_lookup_is_retried_after_503(server, monkeypatch, tmp_path):
+    downloader = _downloader(server, monkeypatch, requests_per_second=0)
+    path = downloader.download_tgz("PMC1", str(tmp_path))
+    assert path == str(tmp_path / "PMC1.tar.gz")
+    assert (tmp_path / "PMC1.tar.gz").read_bytes() == PACKAGE
+    assert [hit for _, hit in server.hits] == [
+        "/oa.fcgi?id=PMC1",
+        "/oa.fcgi?id=PMC1",
+        "/pub/pmc/PMC1.tar.gz",
+    ]
+
+
+def test_requests_to_a_host_are_spaced(server, monkeypatch):
+    downloader = _downloader(server, monkeypatch, max_concurrency=4, requests_per_second=10)
+    with ThreadPoolExecutor(4) as executor:
+        list(executor.map(lambda _: downloader.get(server.url + "/missing"), range(4)))
+    times = sorted(hit_time for hit_time, _ in server.hits)
+    assert len(times) == 4
+    assert min(b - a for a, b in zip(times, times[1:])) >= 0.09
+
+
+def test_requests_in_flight_are_capped(server, monkeypatch):
+    downloader = _downloader(server, monkeypatch, max_concurrency=2, requests_per_second=0)
+    with ThreadPoolExecutor(6) as executor:
+        list(executor.map(lambda _: downloader.get(server.url + "/slow"), range(6)))
+    assert len(server.hits) == 6
+    assert server.most_running == 2
+
+
+def test_failed_download_leaves_no_file(server, monkeypatch, tmp_path):
+    downloader = _downloader(server, monkeypatch, requests_per_second=0)
+    file_path = str(tmp_path / "PMC1.tar.gz")
+    assert not downloader.download(server.url + "/broken", file_path)
+    assert list(tmp_path.iterdir()) == []
@@ -0,0 +1,43 @@
+import requests
+
+from utils.oa_links import OaLinkResolver
+
+
+class FakeDownloader:
+    """Answers oa.fcgi lookups from `packages`; IDs in `failing` fail once."""
+
+    max_concurrency = 1
+
+    def __init__(self, packages, failing=()):
+        self.packages = packages
+        self.failing = set(failing)
+        self.requests = []
+
+    def lookup(self, id):
+        pmc_ids = id.split(",")
+        self.requests.append(pmc_ids)
+        if len(pmc_ids) > 1:
+            raise requests.ConnectionError("batch failed")
+        (pmc_id,) = pmc_ids
+        if pmc_id in self.failing:
+            self.failing.discard(pmc_id)
+            raise requests.Timeout("timed out")
+        links = {pmc_id: self.packages[pmc_id]} if self.packages.get(pmc_id) else {}
+        errors = {} if pmc_id in self.packages else {pmc_id: "idDoesNotExist"}
+        return links, errors, None
+
+
+def test_failed_lookups_are_not_cached():
+    downloader = FakeDownloader({"PMC1": "https://x/PMC1.tar.gz", "PMC2": None}, ["PMC3"])
+    resolver = OaLinkResolver(downloader=downloader)
+    assert resolver.resolve_many(["PMC1", "PMC2", "PMC3"]) == {
+        "PMC1": "https://x/PMC1.tar.gz",
+        "PMC2": None,
+        "PMC3": None,
+    }
+    downloader.packages["PMC3"] = "https://x/PMC3.tar.gz"
+    downloader.requests.clear()
+    # only the failed lookup is repeated
+    assert resolver.resolve_many(["PMC1", "PMC2", "PMC3"])["PMC3"] == "https://x/PMC3.tar.gz"
+    assert downloader.requests == [["PMC3"]]
+    resolver.close()
@@ -0,0 +1,32 @@
+import pytest
+
+from supplementary.utils import ocr_service
+from supplementary.utils.ocr_service import OcrCache
+
+
+@pytest.fixture(autouse=True)
+def tesseract_version(monkeypatch):
+    # only part of the cache key
+    monkeypatch.setattr(ocr_service.pytesseract, "get_tesseract_version", lambda: "5.3.0")
+
+
+def test_processes_sharing_a_cache_evict_together(tmp_path):
+    path = str(tmp_path / "ocr.sqlite")
+    # one cache per file worker process
+    caches = [OcrCache(path, max_bytes=1000) for _ in range(3)]
+    for number in range(60):
+        caches[number % 3].put(f"key{number}", "x" * 100)
+    total = caches[0].connection.execute("SELECT SUM(size) FROM ocr_cache").fetchone()[0]
+    assert total <= 1000
+    assert sum(cache.evicted for cache in caches) == 60 - total // 100
+    for cache in caches:
+        cache.close()
+
+
+def test_stats_report_the_hit_rate(tmp_path):
+    cache = OcrCache(str(tmp_path / "ocr.sqlite"))
+    cache.put("key", "text")
+    assert cache.get("key") == "text"
+    assert cache.get("other") is None
+    assert "hit rate 50.0% (1 hits, 1 misses)" in cache.stats()
+    cache.close()
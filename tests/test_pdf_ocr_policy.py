@@ -0,0 +1,33 @@
+import fitz
+
+from supplementary.readers.supported_readers.pdf import OcrPolicy, image_coverage
+
+
+def _page_with_images(rects, pixels=(200, 4)):
+    doc = fitz.open()
+    page = doc.new_page()
+    image = fitz.Pixmap(fitz.csGRAY, fitz.IRect(0, 0, *pixels), False)
+    for rect in rects:
+        page.insert_image(rect, pixmap=image, keep_proportion=False)
+    return doc, page
+
+
+def test_page_scanned_as_strips_is_covered():
+    width, height = fitz.paper_size("a4")
+    strips = [fitz.Rect(0, top, width, top + 10) for top in range(0, int(height) - 10, 10)]
+    doc, page = _page_with_images(strips)
+    assert image_coverage(page) > 0.9
+
+
+def test_small_images_count_as_none():
+    doc, page = _page_with_images([fitz.Rect(10, 10, 40, 40), fitz.Rect(50, 800, 550, 802)])
+    assert image_coverage(page) == 0.0
+
+
+def test_policy_counts_its_own_decisions():
+    doc, page = _page_with_images([fitz.Rect(0, 0, 200, 200)], pixels=(200, 200))
+    first, second = OcrPolicy(), OcrPolicy()
+    pages, skipped = first.select_pages(doc, {0: ""})
+    assert ([page.number for page in pages], skipped) == ([0], 0)
+    assert second.select_pages(doc, {0: "x" * 1000}) == ([], 1)
+    assert (first.skipped, second.skipped) == (0, 1)
@@ -0,0 +1,47 @@
+import os
+
+from supplementary.utils import pdf_text_pool
+from supplementary.utils.pdf_text_pool import PdfTextPool
+
+
+def _dies_on_page_1(connection):
+    # stands in for a MuPDF crash or the OOM killer
+    while True:
+        request = connection.recv()
+        if request is None:
+            return
+        _, page_numbers = request
+        for page_number in page_numbers:
+            if page_number == 1:
+                os._exit(1)
+            connection.send(("page", page_number, f"text {page_number}"))
+        connection.send(("done", None, None))
+
+
+def test_dead_worker_is_replaced(monkeypatch):
+    monkeypatch.setattr(pdf_text_pool, "_worker_loop", _dies_on_page_1)
+    pool = PdfTextPool(size=1, page_timeout=5)
+    try:
+        assert pool.extract_pages(b"", 4, "crash.pdf") == {
+            0: "text 0",
+            1: "",
+            2: "text 2",
+            3: "text 3",
+        }
+        assert pool.recycled == 1
+        assert pool.extract_pages(b"", 1, "next.pdf") == {0: "text 0"}
+    finally:
+        pool.close()
+
+
+def test_worker_dead_while_idle_is_not_reused(monkeypatch):
+    monkeypatch.setattr(pdf_text_pool, "_worker_loop", _dies_on_page_1)
+    pool = PdfTextPool(size=1, page_timeout=5)
+    try:
+        pool.extract_pages(b"", 1, "first.pdf")
+        worker = pool.idle.queue[0]
+        worker.process.kill()
+        worker.process.join()
+        assert pool.extract_pages(b"", 1, "second.pdf") == {0: "text 0"}
+    finally:
+        pool.close()
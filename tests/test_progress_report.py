@@ -0,0 +1,128 @@
+from datetime import timedelta
+
+import pytest
+from sqlalchemy import func, select
+
+from db.utils import progress_report
+from db.utils.article_status import advance_stage, advance_stages, mark_downloaded
+from db.utils.enum_and_constants import ArticleProcessingStatusEnum as Status
+from db.utils.enum_and_constants import ProcessingStageEnum as Stage
+from db.utils.model import (
+    Article,
+    ArticleProcessingStage,
+    ProgressCount,
+    ReportWatermark,
+    StageHistoryRollup,
+)
+
+
+@pytest.fixture(autouse=True)
+def no_settle_delay(monkeypatch):
+    monkeypatch.setattr(progress_report, "SETTLE_DELAY", timedelta(0))
+
+
+def progress_counts(session) -> dict:
+    return {
+        name: count
+        for name, count in session.execute(select(ProgressCount.name, ProgressCount.count))
+        if count
+    }
+
+
+def recount(session) -> dict:
+    """The counts progress_counts should hold, from full scans."""
+    counts = {
+        f"stage.{stage.name}": count
+        for stage, count in session.execute(
+            select(ArticleProcessingStage.current_stage, func.count()).group_by(
+                ArticleProcessingStage.current_stage
+            )
+        )
+    }
+    for flag in progress_report.STATUS_FLAGS:
+        if count := session.scalar(select(func.count()).where(flag.is_(True))):
+            counts[f"{flag.table.name}.{flag.name}"] = count
+    return counts
+
+
+def test_refresh_applies_only_new_history(stage_session_factory):
+    with stage_session_factory() as session:
+        articles = [Article(id=i, pm_id=str(i)) for i in range(1, 11)]
+        session.add_all(articles)
+        session.commit()
+        for article in articles:
+            advance_stage(article, session, Stage.pending_download)
+        for article in articles[:6]:
+            mark_downloaded(article, session)
+        progress_report.refresh_progress_report(session)
+        assert progress_counts(session) == recount(session) == {
+            "stage.pending_download": 4,
+            "stage.pending_parse_text": 6,
+            "download_statuses.is_downloaded": 6,
+        }
+
+        # a refresh without new history changes nothing
+        progress_report.refresh_progress_report(session)
+        assert progress_counts(session) == recount(session)
+
+        advance_stages(
+            session,
+            [
+                (1, Stage.pending_parse_supplementary, Status.success, None),
+                (2, Stage.pending_parse_supplementary, Status.error, "boom"),
+            ],
+        )
+        progress_report.refresh_progress_report(session)
+        assert progress_counts(session) == {
+            **recount(session),
+            # advance_stages moves stages without setting the text parse flag
+            "text_parse_statuses.is_parsed": 1,
+        }
+        assert session.scalar(select(func.sum(StageHistoryRollup.count))) == 18
+        assert session.get(ReportWatermark, progress_report.ROLLUP_WATERMARK).last_id == 18
+
+
+def test_refresh_leaves_recent_history_for_the_next_refresh(
+    stage_session_factory, monkeypatch
+):
+    monkeypatch.setattr(progress_report, "SETTLE_DELAY", timedelta(hours=1))
+    with stage_session_factory() as session:
+        session.add(Article(id=1, pm_id="1"))
+        session.commit()
+        advance_stage(session.get(Article, 1), session, Stage.pending_download)
+        progress_report.refresh_progress_report(session)
+        assert progress_counts(session) == {}
+
+
+def test_rebuild_matches_incremental_refreshes(stage_session_factory):
+    with stage_session_factory() as session:
+        articles = [Article(id=i, pm_id=str(i)) for i in range(1, 6)]
+        session.add_all(articles)
+        session.commit()
+        for article in articles:
+            advance_stage(article, session, Stage.pending_download)
+            progress_report.refresh_progress_report(session)
+        mark_downloaded(articles[0], session)
+        progress_report.refresh_progress_report(session)
+        incremental = progress_counts(session)
+        progress_report.rebuild_progress_report(session)
+        assert progress_counts(session) == incremental == recount(session)
+
+
+def test_refresh_locks_the_watermark(stage_session_factory):
+    from sqlalchemy import event
+    from sqlalchemy.dialects import postgresql
+
+    statements = []
+    with stage_session_factory() as session:
+        event.listen(
+            session, "do_orm_execute", lambda state: statements.append(state.statement)
+        )
+        progress_report.refresh_stage_history_rollup(session)
+    locking = [
+        statement
+        for statement in statements
+        if statement.is_select
+        and ReportWatermark.__table__ in statement.get_final_froms()
+    ]
+    assert "FOR UPDATE" in str(locking[0].compile(dialect=postgresql.dialect()))
@@ -0,0 +1,93 @@
+from sqlalchemy import event, func, select
+from sqlalchemy.dialects import postgresql
+
+from db.utils import scheduler
+from db.utils.enum_and_constants import ArticleProcessingStatusEnum as Status
+from db.utils.enum_and_constants import ProcessingStageEnum as Stage
+from db.utils.model import Article, ArticleProcessingStage, ProcessingStageHistory
+
+
+def add_articles(get_session, stages: dict):
+    with get_session() as session:
+        for article_id, stage in stages.items():
+            session.add(Article(id=article_id, pm_id=str(article_id)))
+            session.add(ArticleProcessingStage(article_id=article_id, current_stage=stage))
+        session.commit()
+
+
+def stage_counts(session) -> dict:
+    return dict(
+        session.execute(
+            select(ArticleProcessingStage.current_stage, func.count()).group_by(
+                ArticleProcessingStage.current_stage
+            )
+        ).all()
+    )
+
+
+def test_claim_batch_takes_only_pending_articles_in_order(stage_session_factory):
+    add_articles(
+        stage_session_factory,
+        {i: Stage.pending_download if i % 2 else Stage.pending_parse_text for i in range(1, 11)},
+    )
+    with stage_session_factory() as session:
+        claimed = scheduler.claim_batch(session, Stage.pending_download, batch_size=3)
+        assert [row.article_id for row in claimed] == [1, 3, 5]
+
+
+def test_claim_batch_skips_rows_locked_by_other_workers(stage_session_factory):
+    statements = []
+    with stage_session_factory() as session:
+        event.listen(
+            session, "do_orm_execute", lambda state: statements.append(state.statement)
+        )
+        scheduler.claim_batch(session, Stage.pending_download)
+    sql = str(statements[0].compile(dialect=postgresql.dialect()))
+    assert "FOR UPDATE SKIP LOCKED" in sql
+
+
+def test_process_batch_advances_failed_articles_with_their_error(stage_session_factory):
+    add_articles(stage_session_factory, {i: Stage.pending_download for i in range(1, 6)})
+
+    def handler(article, session):
+        article.pmc_id = f"PMC{article.id}"
+        if article.id == 3:
+            raise RuntimeError("boom")
+
+    with stage_session_factory() as session:
+        assert scheduler.process_batch(session, Stage.pending_download, handler, 10) == 5
+    with stage_session_factory() as session:
+        assert stage_counts(session) == {Stage.pending_parse_text: 5}
+        assert session.get(ArticleProcessingStage, 3).last_error == "boom"
+        # the failed article's own changes were rolled back with its savepoint
+        assert session.get(Article, 3).pmc_id is None
+        assert session.get(Article, 2).pmc_id == "PMC2"
+        statuses = dict(
+            session.execute(
+                select(ProcessingStageHistory.article_id, ProcessingStageHistory.status)
+            ).all()
+        )
+        assert statuses[3] == Status.error.value
+        assert statuses[2] == Status.success.value
+
+
+def test_run_stage_worker_processes_everything_once(stage_session_factory):
+    add_articles(
+        stage_session_factory,
+        {**{i: Stage.pending_download for i in range(1, 251)}, 251: Stage.complete},
+    )
+    handled = []
+    processed = scheduler.run_stage_worker(
+        stage_session_factory,
+        Stage.pending_download,
+        lambda article, session: handled.append(article.id),
+        batch_size=100,
+    )
+    assert processed == 250
+    assert sorted(handled) == list(range(1, 251))
+    # nothing is left pending, so another run claims nothing
+    assert scheduler.run_stage_worker(
+        stage_session_factory, Stage.pending_download, handled.append
+    ) == 0
+    with stage_session_factory() as session:
+        assert stage_counts(session) == {Stage.pending_parse_text: 250, Stage.complete: 1}
@@ -0,0 +1,230 @@
+import os
+import re
+import threading
+import time
+import xml.etree.ElementTree as ET
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from urllib.parse import urlsplit
+
+import requests
+from dotenv import load_dotenv
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from utils.logging.logging_setup import (
+    supplementary_error_logger,
+    supplementary_info_logger,
+)
+
+load_dotenv()
+
+# base URLs, overridable e.g. to point at a local stand-in
+OA_SERVICE_URL = os.getenv(
+    "OA_SERVICE_URL", "https://www.ncbi.nlm.nih.gov/pmc/utils/oa/oa.fcgi"
+)
+# oa.fcgi links packages on the NCBI FTP server, which also serves them over https
+OA_PACKAGE_HOST_URL = os.getenv("OA_PACKAGE_HOST_URL", "https://ftp.ncbi.nlm.nih.gov")
+NCBI_FTP_URL = "ftp://ftp.ncbi.nlm.nih.gov"
+
+OA_MAX_CONCURRENCY = int(os.getenv("OA_MAX_CONCURRENCY", 4))  # requests in flight
+# NCBI asks for at most 3 requests per second per client without an API key
+OA_REQUESTS_PER_SECOND = float(os.getenv("OA_REQUESTS_PER_SECOND", 3))
+OA_RETRIES = int(os.getenv("OA_RETRIES", 5))
+OA_BACKOFF_FACTOR = float(os.getenv("OA_BACKOFF_FACTOR", 2))  # 2, 4, 8 ... seconds
+OA_BACKOFF_MAX = float(os.getenv("OA_BACKOFF_MAX", 60))  # seconds between retries
+OA_TIMEOUT = (10, 60)  # seconds to connect, seconds between received bytes
+CHUNK_SIZE = 1024 * 1024
+
+
+PMC_ID_PATTERN = re.compile(r"PMC[0-9]+")
+
+
+def parse_oa_response(text: str) -> tuple:
+    """
+    Parse an oa.fcgi response.
+    Returns:
+        tuple: ({pmc_id: tgz href}, {pmc_id: error code},
+                resumption token of the next page or None)
+    """
+    root = ET.fromstring(text)
+    links = {}
+    for record in root.iter("record"):
+        link = record.find("link[@format='tgz']")
+        if link is not None:
+            links[record.get("id")] = link.get("href")
+    # e.g. <error code="idIsNotOpenAccess">identifier 'PMC1' is not Open Access</error>
+    errors = {
+        pmc_id: error.get("code")
+        for error in root.iter("error")
+        for pmc_id in PMC_ID_PATTERN.findall(error.text or "")
+    }
+    resumption = root.find(".//resumption/link")
+    token = resumption.get("token") if resumption is not None else None
+    return links, errors, token
+
+
+class HostRateLimiter:
+    """Spaces the requests to every host at least 1 / `requests_per_second` apart."""
+
+    def __init__(self, requests_per_second: float = OA_REQUESTS_PER_SECOND):
+        self.interval = 1 / requests_per_second if requests_per_second > 0 else 0
+        self.next_slot = {}
+        self.lock = threading.Lock()
+
+    def wait(self, host: str):
+        with self.lock:
+            now = time.monotonic()
+            slot = max(now, self.next_slot.get(host, now))
+            self.next_slot[host] = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+
+def create_session(max_concurrency: int = OA_MAX_CONCURRENCY) -> requests.Session:
+    retries = Retry(
+        total=OA_RETRIES,
+        backoff_factor=OA_BACKOFF_FACTOR,
+        backoff_max=OA_BACKOFF_MAX,
+        status_forcelist=[429, 500, 502, 503, 504],
+        allowed_methods=["GET"],
+    )
+    # keep-alive connections, one per request that may be in flight
+    adapter = HTTPAdapter(
+        pool_connections=4, pool_maxsize=max_concurrency, max_retries=retries
+    )
+    session = requests.Session()
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+class OaDownloader:
+    """
+    Client for the PMC OA web service and the OA packages it links to.
+
+    All requests go through one pooled session, at most `max_concurrency` at a
+    time (a streamed download holds its slot until it is read) and rate limited
+    per host. Failed requests are retried with exponential backoff capped at
+    OA_BACKOFF_MAX seconds.
+    """
+
+    def __init__(
+        self,
+        service_url: str = OA_SERVICE_URL,
+        package_host_url: str = OA_PACKAGE_HOST_URL,
+        max_concurrency: int = OA_MAX_CONCURRENCY,
+        requests_per_second: float = OA_REQUESTS_PER_SECOND,
+    ):
+        self.service_url = service_url
+        self.package_host_url = package_host_url
+        self.max_concurrency = max_concurrency
+        self.session = create_session(max_concurrency)
+        self.slots = threading.BoundedSemaphore(max_concurrency)
+        self.rate_limiter = HostRateLimiter(requests_per_second)
+
+    @contextmanager
+    def stream(self, url: str, **params):
+        """Open a GET request whose body is read from the yielded response."""
+        with self.slots:
+            self.rate_limiter.wait(urlsplit(url).netloc)
+            with self.session.get(
+                url, params=params or None, stream=True, timeout=OA_TIMEOUT
+            ) as response:
+                yield response
+
+    def get(self, url: str, **params) -> requests.Response:
+        with self.stream(url, **params) as response:
+            response.content  # read the body while holding the slot
+            return response
+
+    def package_url(self, href: str) -> str:
+        if href.startswith(NCBI_FTP_URL):
+            return self.package_host_url + href[len(NCBI_FTP_URL) :]
+        return href.replace("ftp://", "https://")
+
+    def lookup(self, **params) -> tuple:
+        """
+        One oa.fcgi request, e.g. lookup(id="PMC1,PMC2") or lookup(**{"from": ...}).
+        Returns:
+            tuple: ({pmc_id: package URL}, {pmc_id: OA service error code},
+                    resumption token of the next page or None), see parse_oa_response
+        """
+        response = self.get(self.service_url, **params)
+        response.raise_for_status()
+        links, errors, token = parse_oa_response(response.text)
+        links = {pmc_id: self.package_url(href) for pmc_id, href in links.items()}
+        return links, errors, token
+
+    def tgz_link(self, pmc_id: str) -> str | None:
+        """The URL of the OA package of an article, None if it has none."""
+        try:
+            links, errors, _ = self.lookup(id=pmc_id)
+        except (requests.RequestException, ET.ParseError) as e:
+            supplementary_error_logger.error("%s | OA service: %s", pmc_id, str(e))
+            return None
+        if pmc_id not in links:
+            supplementary_info_logger.info(
+                "%s | no OA package (%s)", pmc_id, errors.get(pmc_id, "no tgz link")
+            )
+        return links.get(pmc_id)
+
+    def download(self, url: str, file_path: str) -> bool:
+        """Stream `url` to `file_path`; nothing is left at `file_path` on failure."""
+        partial_path = file_path + ".part"
+        try:
+            with self.stream(url) as response:
+                response.raise_for_status()
+                with open(partial_path, "wb") as f:
+                    for chunk in response.iter_content(CHUNK_SIZE):
+                        f.write(chunk)
+            os.replace(partial_path, file_path)
+            return True
+        except (requests.RequestException, OSError) as e:
+            supplementary_error_logger.error("%s | download failed: %s", url, str(e))
+            if os.path.exists(partial_path):
+                os.remove(partial_path)
+            return False
+
+    def download_tgz(self, pmc_id: str, directory: str) -> str | None:
+        """Download the OA package of an article to `directory`/`pmc_id`.tar.gz."""
+        tgz_link = self.tgz_link(pmc_id)
+        if not tgz_link:
+            return None
+        file_path = os.path.join(directory, f"{pmc_id}.tar.gz")
+        return file_path if self.download(tgz_link, file_path) else None
+
+    def download_many(self, pmc_ids: list[str], directory: str) -> dict:
+        """
+        Download the OA packages of many articles concurrently.
+        Returns:
+            dict: {pmc_id: path of the package, None if it was not downloaded}
+        """
+        os.makedirs(directory, exist_ok=True)
+        with ThreadPoolExecutor(max_workers=self.max_concurrency) as executor:
+            paths = executor.map(
+                lambda pmc_id: self.download_tgz(pmc_id, directory), pmc_ids
+            )
+            return dict(zip(pmc_ids, paths))
+
+
+_shared_downloader = None
+_shared_downloader_lock = threading.Lock()
+
+
+def get_oa_downloader() -> OaDownloader:
+    global _shared_downloader
+    with _shared_downloader_lock:
+        if _shared_downloader is None:
+            _shared_downloader = OaDownloader()
+        return _shared_downloader
+
+
+def _forget_inherited_downloader():
+    # pooled connections must not be shared with the parent
+    global _shared_downloader, _shared_downloader_lock
+    _shared_downloader = None
+    _shared_downloader_lock = threading.Lock()
+
+
+os.register_at_fork(after_in_child=_forget_inherited_downloader)
@@ -0,0 +1,230 @@
+import os
+import sqlite3
+import sys
+import threading
+import time
+import xml.etree.ElementTree as ET
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+import requests
+from dotenv import load_dotenv
+
+from utils.logging.logging_setup import (
+    supplementary_error_logger,
+    supplementary_info_logger,
+)
+from utils.oa_downloader import OaDownloader, get_oa_downloader
+
+load_dotenv()
+
+# resolved links, shared between runs; kept in memory only when unset
+OA_LINK_CACHE_PATH = os.getenv("OA_LINK_CACHE_PATH", None)
+OA_LOOKUP_BATCH_SIZE = int(os.getenv("OA_LOOKUP_BATCH_SIZE", 100))  # IDs per oa.fcgi request
+# articles without a package are looked up again after this many seconds
+OA_NO_LINK_TTL = int(os.getenv("OA_NO_LINK_TTL", 7 * 24 * 60 * 60))
+# lists every OA package with its PMC ID: File, Article Citation, Accession ID, ...
+OA_FILE_LIST_URL = os.getenv(
+    "OA_FILE_LIST_URL", "https://ftp.ncbi.nlm.nih.gov/pub/pmc/oa_file_list.csv"
+)
+SQL_BATCH_SIZE = 500  # host parameters per cache query
+
+
+class OaLinkResolver:
+    """
+    Resolves the OA package URLs of PMC IDs in bulk.
+
+    Links come from a SQLite cache first. The misses are looked up in oa.fcgi
+    requests of `batch_size` IDs each, and only the IDs such a request neither
+    links nor reports an error for are looked up one by one. Articles without
+    a package are cached too, for OA_NO_LINK_TTL seconds; IDs whose lookups
+    failed are not cached and resolve to None until the next call. The cache
+    can be filled ahead of time from the OA file list or from oa.fcgi pages by
+    date.
+    """
+
+    def __init__(
+        self,
+        downloader: OaDownloader = None,
+        path: str = None,
+        batch_size: int = OA_LOOKUP_BATCH_SIZE,
+        no_link_ttl: int = OA_NO_LINK_TTL,
+    ):
+        self.downloader = downloader or get_oa_downloader()
+        self.batch_size = batch_size
+        self.no_link_ttl = no_link_ttl
+        self.hits = self.batch_resolved = self.single_lookups = 0
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(
+            path or ":memory:", isolation_level=None, check_same_thread=False, timeout=30
+        )
+        if path:
+            self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS oa_links "
+            "(pmc_id TEXT PRIMARY KEY, link TEXT, resolved_at REAL)"
+        )
+
+    def _cached(self, pmc_ids: list) -> dict:
+        found = {}
+        expired = time.time() - self.no_link_ttl
+        with self.lock:
+            for start in range(0, len(pmc_ids), SQL_BATCH_SIZE):
+                batch = pmc_ids[start : start + SQL_BATCH_SIZE]
+                found.update(
+                    self.connection.execute(
+                        "SELECT pmc_id, link FROM oa_links WHERE pmc_id IN "
+                        f"({', '.join('?' * len(batch))}) "
+                        "AND (link IS NOT NULL OR resolved_at > ?)",
+                        (*batch, expired),
+                    ).fetchall()
+                )
+        return found
+
+    def _store(self, links: dict):
+        now = time.time()
+        with self.lock:
+            self.connection.execute("BEGIN")
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO oa_links VALUES (?, ?, ?)",
+                ((pmc_id, link, now) for pmc_id, link in links.items()),
+            )
+            self.connection.execute("COMMIT")
+
+    def _lookup_batch(self, pmc_ids: list) -> dict:
+        try:
+            links, errors, _ = self.downloader.lookup(id=",".join(pmc_ids))
+        except (requests.RequestException, ET.ParseError) as e:
+            # retry these IDs one by one
+            supplementary_error_logger.error(
+                "OA batch lookup of %d IDs failed: %s", len(pmc_ids), str(e)
+            )
+            links, errors = {}, {}
+        resolved = {pmc_id: links[pmc_id] for pmc_id in pmc_ids if pmc_id in links}
+        self.batch_resolved += len(resolved)
+        resolved.update((pmc_id, None) for pmc_id in pmc_ids if pmc_id in errors)
+        for pmc_id in pmc_ids:
+            if pmc_id not in resolved:
+                self.single_lookups += 1
+                try:
+                    links, _, _ = self.downloader.lookup(id=pmc_id)
+                except (requests.RequestException, ET.ParseError) as e:
+                    supplementary_error_logger.error("%s | OA service: %s", pmc_id, str(e))
+                    continue
+                resolved[pmc_id] = links.get(pmc_id)
+        # failed lookups stay out of the cache and are tried again next time
+        self._store(resolved)
+        return {pmc_id: resolved.get(pmc_id) for pmc_id in pmc_ids}
+
+    def resolve_many(self, pmc_ids: list) -> dict:
+        """
+        Returns:
+            dict: {pmc_id: package URL, None if the article has no OA package}
+        """
+        pmc_ids = list(dict.fromkeys(pmc_ids))
+        links = self._cached(pmc_ids)
+        self.hits += len(links)
+        misses = [pmc_id for pmc_id in pmc_ids if pmc_id not in links]
+        batches = [
+            misses[start : start + self.batch_size]
+            for start in range(0, len(misses), self.batch_size)
+        ]
+        # the downloader bounds the requests in flight and their rate
+        with ThreadPoolExecutor(max_workers=self.downloader.max_concurrency) as executor:
+            for resolved in executor.map(self._lookup_batch, batches):
+                links.update(resolved)
+        return {pmc_id: links[pmc_id] for pmc_id in pmc_ids}
+
+    def resolve(self, pmc_id: str) -> str | None:
+        return self.resolve_many([pmc_id])[pmc_id]
+
+    def invalidate(self, pmc_id: str):
+        """Forget a link, e.g. one that no longer downloads."""
+        with self.lock:
+            self.connection.execute("DELETE FROM oa_links WHERE pmc_id = ?", (pmc_id,))
+
+    def seed_from_file_list(self, csv_path: str, chunk_size: int = 200_000) -> int:
+        """
+        Cache the links of every package in an OA file list CSV (oa_file_list.csv,
+        see OA_FILE_LIST_URL). Returns the number of links read.
+        """
+        number_of_links = 0
+        for chunk in pd.read_csv(
+            csv_path, usecols=["File", "Accession ID"], dtype=str, chunksize=chunk_size
+        ):
+            chunk = chunk.dropna()
+            self._store(
+                {
+                    pmc_id: self.downloader.package_url(
+                        f"ftp://ftp.ncbi.nlm.nih.gov/pub/pmc/{file}"
+                    )
+                    for file, pmc_id in zip(chunk["File"], chunk["Accession ID"])
+                }
+            )
+            number_of_links += len(chunk)
+        return number_of_links
+
+    def seed_from_service(self, from_date: str, until_date: str = None) -> int:
+        """
+        Cache the links of the packages oa.fcgi lists as updated between the
+        dates (YYYY-MM-DD), following its resumption tokens.
+        Returns the number of links read.
+        """
+        params = {"from": from_date, "format": "tgz"}
+        if until_date:
+            params["until"] = until_date
+        number_of_links = 0
+        while params:
+            links, _, token = self.downloader.lookup(**params)
+            self._store(links)
+            number_of_links += len(links)
+            params = {"resumptionToken": token} if token else None
+        return number_of_links
+
+    def stats(self) -> str:
+        return (
+            f"OA links: {self.hits:_} cached, {self.batch_resolved:_} from batch "
+            f"lookups, {self.single_lookups:_} single lookups"
+        )
+
+    def close(self):
+        self.connection.close()
+
+
+_shared_resolver = None
+_shared_resolver_lock = threading.Lock()
+
+
+def get_oa_link_resolver() -> OaLinkResolver:
+    global _shared_resolver
+    with _shared_resolver_lock:
+        if _shared_resolver is None:
+            _shared_resolver = OaLinkResolver(path=OA_LINK_CACHE_PATH)
+        return _shared_resolver
+
+
+def _forget_inherited_resolver():
+    # SQLite connections must not be used across a fork
+    global _shared_resolver, _shared_resolver_lock
+    _shared_resolver = None
+    _shared_resolver_lock = threading.Lock()
+
+
+os.register_at_fork(after_in_child=_forget_inherited_resolver)
+
+
+if __name__ == "__main__":
+    # python -m utils.oa_links file_list [csv_path]
+    # python -m utils.oa_links service <from YYYY-MM-DD> [until YYYY-MM-DD]
+    resolver = get_oa_link_resolver()
+    start_time = time.time()
+    if sys.argv[1] == "file_list":
+        csv_path = sys.argv[2] if len(sys.argv) > 2 else "oa_file_list.csv"
+        if not os.path.exists(csv_path):
+            resolver.downloader.download(OA_FILE_LIST_URL, csv_path)
+        number_of_links = resolver.seed_from_file_list(csv_path)
+    else:
+        number_of_links = resolver.seed_from_service(*sys.argv[2:4])
+    supplementary_info_logger.info(
+        "Cached %d OA links in %.2f seconds", number_of_links, time.time() - start_time
+    )